@@ -2,7 +2,8 @@
 
 from flask import Blueprint, jsonify, request
 
-from ia_ml.src.api.main import find_ai_route, find_route_with_astar
+from ia_ml.src.api.main import get_routing_service
+from ia_ml.src.api.routing_service import OffNetworkError
 
 paths_bp = Blueprint("paths", __name__)
 
@@ -89,14 +90,19 @@ def get_path():
         except (ValueError, TypeError) as e:
             return jsonify({"error": str(e)}), 400
 
-    # Call AI route finder (with A* fallback)
+    # Call the process-wide routing service (AI model with A* fallback)
     try:
-        route_data = find_ai_route(start_node, waypoints, end_node, use_astar_fallback=True)
-        if not route_data:
-            route_data = find_route_with_astar(start_node, waypoints, end_node)
-    except Exception as e:
+        service = get_routing_service()
+    except Exception:
+        return jsonify({"error": "Routing service unavailable"}), 500
+    try:
+        route_data = service.route(start_node, waypoints, end_node)
+    except OffNetworkError as e:
+        # a point is too far from the road network
+        return jsonify({"error": str(e)}), 400
+    except Exception:
         try:
-            route_data = find_route_with_astar(start_node, waypoints, end_node)
+            route_data = service.route_astar(start_node, waypoints, end_node)
         except Exception:
             return jsonify({"error": "Error calculating route"}), 500
 
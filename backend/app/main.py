@@ -4,6 +4,7 @@ from flask import Flask
 from flask_cors import CORS
 from app.api.users import bp as users_bp
 from app.api.paths import paths_bp
+from ia_ml.src.api.main import init_routing_service
 from app.core.database import create_tables  # import de función para crear tablas
 
 
@@ -13,6 +14,8 @@ def create_app():
     - Enables CORS for all origins (development mode).
     - Registers blueprints with their respective URL prefixes.
     - Creates all database tables.
+    - Loads and warms up the routing service (graph, context and policy are
+      kept in memory so route requests do not reload them).
     """
     app = Flask(__name__)
     CORS(app, origins="*")  # Allow all origins (use more restrictive config in production)
@@ -22,6 +25,12 @@ def create_app():
 
     create_tables()
 
+    try:
+        init_routing_service(warm_up=True)
+    except Exception as e:
+        # the users API keeps working; /paths retries loading on the first request
+        print(f"[Warning] Routing service not loaded at startup: {e}")
+
     return app
 
 
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """
-Genera y guarda *_distances.pkl en ia_ml/src/data para una localidad o un graphml local.
+Genera y guarda *_distances.npy (matriz float32 N x N, abrible con np.memmap)
+en ia_ml/src/data para una localidad o un graphml local.
 """
 import os
 import sys
@@ -16,22 +17,27 @@ from src.data.download_graph import (
     load_graph_from_graphml,
     precompute_and_save_distances,
 )
+from src.utils.distances import distance_matrix_manifest_path, is_distance_matrix_complete
 
 def safe_name_from_locality(locality: str) -> str:
     return locality.replace(",", "").replace(" ", "_")
 
 def main():
-    parser = argparse.ArgumentParser(description="Precompute all-pairs distances and save as *_distances.pkl",
+    parser = argparse.ArgumentParser(description="Precompute all-pairs distances and save as *_distances.npy",
                                      formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog="""
     Ejemplos:
     python3 scripts/generate_distances.py --locality "Río Cuarto, Córdoba, Argentina"
     python3 scripts/generate_distances.py --graph-file /path/to/graph.graphml
+    python3 scripts/generate_distances.py --graph-file scripts/subgraph.graphml --workers 8 --chunk-size 512
         """)
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument("--locality", "-l", type=str, help="Locality name to download via OSMnx (e.g. 'Río Cuarto, Córdoba, Argentina')")
     group.add_argument("--graph-file", "-g", type=str, help="Path to existing .graphml file")
     parser.add_argument("--weight", "-w", default="length", help="Edge attribute to use as weight (default: length)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes for Dijkstra (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=256, help="Source rows per Dijkstra task (default: 256)")
+    parser.add_argument("--restart", action="store_true", help="Discard a partial run instead of resuming it")
     args = parser.parse_args()
 
     SCRIPTDIR = Path(__file__).parent.resolve()
@@ -57,16 +63,29 @@ def main():
             print(f"[INFO] Loading existing graph from '{graph_path}' ...")
             G = load_graph_from_graphml(str(graph_path))
 
-    out_path = DATA_DIR / f"{safe_name}_distances.pkl"
-    if out_path.exists():
+    out_path = DATA_DIR / f"{safe_name}_distances.npy"
+    if is_distance_matrix_complete(str(out_path)):
         print(f"[WARN] Output file already exists: {out_path}")
         resp = input("Overwrite? [y/N]: ").strip().lower()
         if resp != "y":
             print("Aborting.")
             return
+        resume = False
+    elif out_path.exists() and not args.restart:
+        print(f"[INFO] Found partial run ({distance_matrix_manifest_path(str(out_path))}), resuming.")
+        resume = True
+    else:
+        resume = False
 
     print(f"[INFO] Computing all-pairs shortest path lengths (weight='{args.weight}').")
-    precompute_and_save_distances(G, str(out_path), weight=args.weight)
+    precompute_and_save_distances(
+        G,
+        str(out_path),
+        weight=args.weight,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        resume=resume,
+    )
     print("[OK] Distances saved to:", out_path)
 
 if __name__ == "__main__":
@@ -0,0 +1,321 @@
+"""Servicio de rutas residente en el proceso del backend.
+
+Carga una sola vez el subgrafo, su GraphContext (arrays CSR, embeddings,
+distancias, índices espaciales) y la política entrenada; cada request sólo
+ubica los puntos sobre la red y corre la búsqueda o un episodio sobre un
+entorno que se redirige con ``reset(options=...)``.
+
+La búsqueda clásica (A* sobre el CSR, ver ``src.utils.routing``) parte del
+punto proyectado sobre la calle más cercana (nodo virtual): sale hacia los
+extremos de esa arista con el costo parcial del tramo que falta recorrer, y
+llega al siguiente punto de la misma forma. La política, que decide de nodo
+en nodo, usa el nodo más cercano. En ambos casos distancia y duración son
+las sumas reales de ``length`` y ``travel_time`` de las aristas recorridas.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+
+# Habilitar imports de src.* cuando se importa desde el backend
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from src.envs import GraphContext, create_masked_waypoint_env
+from src.data.download_graph import load_subgraph_from_file
+from src.training.main import get_config_path
+from src.training.run_inference import load_policy, play_episode
+from src.utils.config_loader import load_config
+from src.utils.routing import path_edges
+from src.utils.spatial_index import EdgeSnap
+
+IA_ML_ROOT = Path(__file__).resolve().parent.parent.parent
+SUBGRAPH_PATH = IA_ML_ROOT / "scripts" / "subgraph.graphml"
+MODEL_PATH = IA_ML_ROOT / "logs" / "best_model_masked" / "best_model.zip"
+# puntos más lejos que esto del nodo más cercano se consideran fuera de la red
+MAX_SNAP_DISTANCE_M = 250.0
+
+
+class OffNetworkError(ValueError):
+    """Un punto de la consulta queda a más de max_snap_distance_m de la red."""
+
+
+class RoutingService:
+    """Grafo, contexto y política cargados una vez y reutilizados entre requests.
+
+    Un único entorno de inferencia atiende los episodios del modelo; un lock
+    serializa su uso cuando el servidor atiende requests en varios hilos.
+    """
+
+    def __init__(
+        self,
+        graph: nx.MultiDiGraph,
+        node_to_idx: Dict,
+        idx_to_node: Dict,
+        model_path: Optional[str] = None,
+        environment_cfg: Optional[Dict] = None,
+        rewards_cfg: Optional[Dict] = None,
+        max_snap_distance_m: float = MAX_SNAP_DISTANCE_M,
+    ) -> None:
+        if environment_cfg is None or rewards_cfg is None:
+            cfg = load_config(get_config_path())
+            environment_cfg = cfg["environment"] if environment_cfg is None else environment_cfg
+            rewards_cfg = cfg["rewards"] if rewards_cfg is None else rewards_cfg
+        self.graph = graph
+        self.node_to_idx = node_to_idx
+        self.idx_to_node = idx_to_node
+        self.environment_cfg = environment_cfg
+        self.rewards_cfg = rewards_cfg
+
+        self.context = GraphContext.from_config(graph, environment_cfg)
+        self.arrays = self.context.arrays
+        self.snapper = self.context.node_snapper()
+        self.edge_snapper = self.context.edge_snapper()
+        self.max_snap_distance_m = float(max_snap_distance_m)
+        self.weight = "travel_time" if np.isfinite(self._edge_column("travel_time")).any() else "length"
+        self.router = self.context.router(self.weight)
+        self._cheapest = self._cheapest_parallel()
+
+        self.model = None
+        self.env = None
+        self.max_steps = int(max(1, self.arrays.n_nodes * 0.8))
+        self._lock = threading.Lock()
+        if model_path is not None and os.path.exists(model_path):
+            try:
+                self._load_policy(str(model_path))
+            except Exception as e:
+                # p. ej. modelo entrenado sobre otro grafo: se sirve sólo A*
+                print(f"[Warning] No se pudo cargar el modelo {model_path}: {e}")
+                self.model, self.env = None, None
+
+    @classmethod
+    def from_files(
+        cls,
+        subgraph_path: os.PathLike = SUBGRAPH_PATH,
+        model_path: Optional[os.PathLike] = MODEL_PATH,
+    ) -> "RoutingService":
+        """Servicio sobre el subgrafo .graphml (y sus distancias) y el modelo entrenado."""
+        if not Path(subgraph_path).exists():
+            raise FileNotFoundError(f"Subgrafo no encontrado en {subgraph_path}")
+        graph, node_to_idx, idx_to_node = load_subgraph_from_file(str(subgraph_path))
+        return cls(graph, node_to_idx, idx_to_node, model_path=model_path)
+
+    def _load_policy(self, model_path: str) -> None:
+        # entorno de inferencia persistente: cada episodio lo redirige con reset(options=...)
+        node = self.arrays.nodes[0]
+        env = create_masked_waypoint_env(
+            self.graph, [], node, node, self.environment_cfg, self.rewards_cfg, context=self.context
+        )
+        self.model, self.env = load_policy(model_path, env)
+
+    @property
+    def has_model(self) -> bool:
+        return self.model is not None
+
+    def warm_up(self) -> None:
+        """Corre una consulta completa para pagar costos diferidos antes del primer request.
+
+        Inicializa torch, la máscara de acciones y las cachés de caminos, de
+        modo que el primer usuario no pague esa latencia.
+        """
+        first, last = 0, self.arrays.n_nodes - 1
+        start = [float(self.arrays.x[first]), float(self.arrays.y[first])]
+        end = [float(self.arrays.x[last]), float(self.arrays.y[last])]
+        self.route_astar(start, [], end)
+        if self.has_model:
+            self.route_ai(start, [], end, use_astar_fallback=False)
+
+    def _edge_column(self, name: str) -> np.ndarray:
+        """Atributo por arista del CSR (nan donde falta)."""
+        try:
+            return self.arrays.edge_features.raw(name)
+        except KeyError:
+            return np.full(self.arrays.n_edges, np.nan)
+
+    def _cheapest_parallel(self) -> np.ndarray:
+        """Para cada arista, la de menor peso entre sus paralelas con la misma geometría.
+
+        Así el costo parcial no depende de cuál de las aristas superpuestas
+        devuelva el STRtree. Las paralelas con otra geometría son otra calle
+        y el tramo se cobra sobre la arista proyectada.
+        """
+        keys = self.edge_snapper.coincident
+        order = np.lexsort((self.router.weights, keys))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = keys[order][1:] != keys[order][:-1]
+        cheapest = np.empty_like(order)
+        cheapest[order] = order[first][np.cumsum(first) - 1]
+        return cheapest
+
+    def _totals(self, edges, partial=()) -> Dict[str, Optional[float]]:
+        """distance (m) y duration (s) sumando aristas completas y tramos (arista, fracción)."""
+        totals = {}
+        for key, column in (("distance", "length"), ("duration", "travel_time")):
+            values = self._edge_column(column)
+            total = float(values[np.asarray(edges, dtype=np.int64)].sum())
+            total += sum(fraction * float(values[e]) for e, fraction in partial)
+            totals[key] = None if np.isnan(total) else total
+        return totals
+
+    def _check_snap_distance(self, dist_m: np.ndarray) -> None:
+        far = np.flatnonzero(dist_m > self.max_snap_distance_m)
+        if far.size:
+            i = int(far[0])
+            raise OffNetworkError(
+                f"Punto {i} a {dist_m[i]:.0f} m de la red (máximo {self.max_snap_distance_m:.0f} m)"
+            )
+
+    def snap_points(self, coords) -> EdgeSnap:
+        """Proyección de todos los puntos sobre sus calles en una sola consulta al STRtree.
+
+        Lanza OffNetworkError si algún punto queda a más de max_snap_distance_m de la red.
+        """
+        snap = self.edge_snapper.snap(coords)
+        self._check_snap_distance(snap.dist_m)
+        return snap
+
+    def snap_task(
+        self,
+        start_node_coord: List[float],
+        waypoints_coords: List[List[float]],
+        end_node_coord: List[float],
+    ) -> Tuple[object, List, object]:
+        """(start, waypoints, end) como nodos, ubicados en una sola consulta al KD-tree.
+
+        Lanza OffNetworkError si algún punto queda a más de max_snap_distance_m de la red.
+        """
+        nodes, dist_m = self.snapper.snap([start_node_coord, *waypoints_coords, end_node_coord])
+        self._check_snap_distance(dist_m)
+        return nodes[0], nodes[1:-1], nodes[-1]
+
+    def _coordinates(self, path_nodes: List) -> List[List[float]]:
+        return [[self.graph.nodes[n]["x"], self.graph.nodes[n]["y"]] for n in path_nodes]
+
+    def route(
+        self,
+        start_node_coord: List[float],
+        waypoints_coords: List[List[float]],
+        end_node_coord: List[float],
+    ) -> Optional[Dict]:
+        """Ruta del modelo si está cargado, con A* como fallback."""
+        if self.has_model:
+            return self.route_ai(start_node_coord, waypoints_coords, end_node_coord)
+        return self.route_astar(start_node_coord, waypoints_coords, end_node_coord)
+
+    def route_astar(
+        self,
+        start_node_coord: List[float],
+        waypoints_coords: List[List[float]],
+        end_node_coord: List[float],
+    ) -> Optional[Dict]:
+        """Ruta start -> waypoints (en orden) -> end entre los puntos proyectados; None si no hay camino."""
+        snap = self.snap_points([start_node_coord, *waypoints_coords, end_node_coord])
+
+        x, y = self.arrays.x, self.arrays.y
+        coordinates = [[float(snap.lon[0]), float(snap.lat[0])]]
+        edges: List[int] = []
+        partial: List[Tuple[int, float]] = []
+        for i in range(len(snap.edge) - 1):
+            leg = self._leg(snap, i, i + 1)
+            if leg is None:
+                print(f"[A*] No hay camino entre los puntos {i} y {i + 1}")
+                return None
+            nodes, leg_edges, leg_partial = leg
+            edges.extend(leg_edges)
+            partial.extend(leg_partial)
+            points = [[float(x[n]), float(y[n])] for n in nodes]
+            points.append([float(snap.lon[i + 1]), float(snap.lat[i + 1])])
+            # un punto proyectado sobre un nodo coincide con él: no repetirlo
+            coordinates.extend(p for p, prev in zip(points, [coordinates[-1], *points]) if p != prev)
+
+        return {"coordinates": coordinates, **self._totals(edges, partial)}
+
+    def _sides(self, snap: EdgeSnap, i: int):
+        """(arista, fracción) del punto i en cada sentido de circulación de su calle."""
+        yield int(self._cheapest[snap.edge[i]]), float(snap.fraction[i])
+        if snap.reverse_edge[i] >= 0:
+            yield int(self._cheapest[snap.reverse_edge[i]]), 1.0 - float(snap.fraction[i])
+
+    def _ends(self, snap: EdgeSnap, i: int, departing: bool) -> Dict[int, Tuple[int, float]]:
+        """Nodo -> (arista, fracción a pagar) para salir del punto i (o llegar a él).
+
+        Se sale por la cabeza de la arista pagando el tramo restante y se llega
+        por la cola pagando el recorrido. Un punto sobre un extremo de su
+        arista está en ese nodo: por ahí se sale o se llega sin costo.
+        """
+        w, tails, heads = self.router.weights, self.edge_snapper.tails, self.edge_snapper.heads
+        ends: Dict[int, Tuple[int, float]] = {}
+        for e, t in self._sides(snap, i):
+            if departing:
+                options = [(int(heads[e]), 1.0 - t)] + ([(int(tails[e]), 0.0)] if np.isclose(t, 0.0) else [])
+            else:
+                options = [(int(tails[e]), t)] + ([(int(heads[e]), 0.0)] if np.isclose(t, 1.0) else [])
+            for node, frac in options:
+                if node not in ends or frac * w[e] < ends[node][1] * w[ends[node][0]]:
+                    ends[node] = (e, frac)
+        return ends
+
+    def _leg(self, snap: EdgeSnap, a: int, b: int) -> Optional[Tuple[List[int], List[int], List[Tuple[int, float]]]]:
+        """(nodos, aristas completas, tramos parciales) del camino más corto del punto a al b.
+
+        Una sola búsqueda A* con los costos inicial y final de ``_ends``. Si
+        ambos están sobre la misma arista y b queda adelante, se va directo.
+        """
+        w = self.router.weights
+        departs = self._ends(snap, a, departing=True)
+        arrives = self._ends(snap, b, departing=False)
+
+        direct = None
+        for edge_a, t_a in self._sides(snap, a):
+            for edge_b, t_b in self._sides(snap, b):
+                if edge_a == edge_b and t_b >= t_a and (direct is None or t_b - t_a < direct[1]):
+                    direct = (edge_a, t_b - t_a)
+
+        path = self.router.search(
+            {node: frac * w[e] for node, (e, frac) in departs.items()},
+            {node: frac * w[e] for node, (e, frac) in arrives.items()},
+        )
+        if direct is not None and (path is None or direct[1] * w[direct[0]] <= path.cost):
+            return [], [], [direct]
+        if path is None:
+            return None
+        return path.nodes, path.edges, [departs[path.nodes[0]], arrives[path.nodes[-1]]]
+
+    def route_ai(
+        self,
+        start_node_coord: List[float],
+        waypoints_coords: List[List[float]],
+        end_node_coord: List[float],
+        use_astar_fallback: bool = True,
+    ) -> Optional[Dict]:
+        """Ruta del modelo entrenado; A* si no hay modelo o no llega al destino."""
+        if not self.has_model:
+            if use_astar_fallback:
+                print("[Info] Modelo no disponible, usando A* como fallback")
+                return self.route_astar(start_node_coord, waypoints_coords, end_node_coord)
+            print("[Error] Modelo no encontrado y fallback deshabilitado")
+            return None
+
+        start, waypoints, destination = self.snap_task(start_node_coord, waypoints_coords, end_node_coord)
+        options = {"start": start, "waypoints": waypoints, "destination": destination}
+        with self._lock:
+            result = play_episode(
+                self.model, self.env, max_steps=self.max_steps, deterministic=True, options=options
+            )
+
+        # Si no llegó al destino, devolver None
+        if not result.get("done", False):
+            if use_astar_fallback:
+                print("[Info] Modelo no encontró ruta, usando A* como fallback")
+                return self.route_astar(start_node_coord, waypoints_coords, end_node_coord)
+            return None
+
+        path_nodes = result.get("path", [])
+        edges = path_edges(self.arrays, [self.arrays.node_index[n] for n in path_nodes])
+        return {"coordinates": self._coordinates(path_nodes), **self._totals(edges)}
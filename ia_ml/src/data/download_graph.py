@@ -2,7 +2,15 @@ import os
 import osmnx as ox
 import networkx as nx 
 import pickle
-from typing import Dict, Optional
+from typing import Dict, Optional, Union
+
+import numpy as np
+
+from src.utils.distances import (
+    compute_distance_matrix_to_file,
+    distances_dict_to_matrix,
+    load_distance_matrix,
+)
 
 
 def _configure_osmnx():
@@ -37,52 +45,76 @@ def relabel_nodes_to_indices(G: nx.Graph):
     G_relabeled = nx.relabel_nodes(G, node_to_idx, copy=True)
     return G_relabeled, node_to_idx, idx_to_node
 
-def precompute_and_save_distances(G: nx.Graph, out_path: str, weight: str = "length") -> Dict:
-    """Compute all-pairs shortest path lengths and save to out_path (pickle)."""
-    print(f"[INFO] Precomputing all-pairs shortest path lengths (weight={weight}) ...")
-    lengths = dict(nx.all_pairs_dijkstra_path_length(G, weight=weight))
-    with open(out_path, "wb") as fh:
-        pickle.dump(lengths, fh, protocol=pickle.HIGHEST_PROTOCOL)
+def precompute_and_save_distances(
+    G: nx.Graph,
+    out_path: str,
+    weight: str = "length",
+    workers: int = 1,
+    chunk_size: int = 256,
+    resume: bool = True,
+) -> np.ndarray:
+    """Compute all-pairs shortest path lengths and save to out_path as a float32 .npy matrix.
+
+    Uses scipy's C Dijkstra over source-row chunks spread across `workers` processes.
+    Finished chunks are streamed to disk, so an interrupted run resumes where it stopped.
+    """
+    print(f"[INFO] Precomputing all-pairs shortest path lengths (weight={weight}, workers={workers}) ...")
+    matrix = compute_distance_matrix_to_file(
+        G, out_path, weight=weight, workers=workers, chunk_size=chunk_size, resume=resume
+    )
     print(f"[INFO] Distances saved to {out_path}")
-    return lengths
+    return matrix
 
-def load_distances_if_present(path: str) -> Optional[Dict]:
+def load_distances_if_present(path: str, nodes: Optional[list] = None) -> Optional[Union[np.ndarray, Dict]]:
+    """Carga distancias precalculadas: .npy como memmap (N x N) o .pkl legacy (dict-of-dicts).
+
+    Si se pasa `nodes` (orden original del grafo) se valida contra la matriz.
+    """
     if os.path.exists(path):
+        if str(path).endswith(".npy"):
+            return load_distance_matrix(path, nodes)
         with open(path, "rb") as fh:
             return pickle.load(fh)
     return None
 
+def find_distances_path(base_path: str) -> str:
+    """Devuelve `<base>_distances.npy` si existe; si no, el `.pkl` legacy."""
+    npy_path = f"{base_path}_distances.npy"
+    if os.path.exists(npy_path):
+        return npy_path
+    return f"{base_path}_distances.pkl"
+
+def attach_distances(G_relabel: nx.Graph, distances, node_to_idx: Dict) -> None:
+    """Adjunta distancias al grafo relabelado como matriz densa en orden de índice.
+
+    Una matriz (.npy) ya está en el orden de `relabel_nodes_to_indices` y se
+    adjunta sin copiar; un dict legacy con ids OSM se convierte una vez.
+    """
+    if distances is None:
+        return
+    if isinstance(distances, np.ndarray):
+        n = G_relabel.number_of_nodes()
+        if distances.shape != (n, n):
+            raise ValueError(f"Matriz de distancias {distances.shape} no coincide con el grafo ({n} nodos)")
+        G_relabel.graph["distances"] = distances
+        return
+    idx_to_node = {idx: node for node, idx in node_to_idx.items()}
+    original_order = [idx_to_node[i] for i in range(len(idx_to_node))]
+    G_relabel.graph["distances"] = distances_dict_to_matrix(distances, original_order)
+
 def get_graph_relabel(locality: str, *, return_original: bool = False):
     safe_name = locality.replace(",", "").replace(" ", "_")
     graph_path = f"ia_ml/src/data/{safe_name}.graphml"
-    distances_path = f"ia_ml/src/data/{safe_name}_distances.pkl"
+    distances_path = find_distances_path(f"ia_ml/src/data/{safe_name}")
 
     if not os.path.exists(graph_path):
         G = download_and_save_graph(locality, graph_path)
     else:
         G = load_graph_from_graphml(graph_path)
 
-    # Try load distances if present; attach to original graph (OSM IDs)
-    distances = load_distances_if_present(distances_path)
-    if distances is not None:
-        G.graph["distances"] = distances
-
     G_relabel, node_to_idx, idx_to_node = relabel_nodes_to_indices(G)
-    # If distances exist on original, convert to relabeled ids for faster lookup
-    if "distances" in G.graph:
-        # Convert keys from original OSM node ids to relabeled indices
-        converted = {}
-        for orig_u, dist_dict in G.graph["distances"].items():
-            u_idx = node_to_idx.get(orig_u)
-            if u_idx is None:
-                continue
-            converted[u_idx] = {}
-            for orig_v, d in dist_dict.items():
-                v_idx = node_to_idx.get(orig_v)
-                if v_idx is None:
-                    continue
-                converted[u_idx][v_idx] = float(d)
-        G_relabel.graph["distances"] = converted
+    # Try load distances if present; the dense matrix is already in index order
+    attach_distances(G_relabel, load_distances_if_present(distances_path, list(G.nodes())), node_to_idx)
 
     if return_original:
         return G_relabel, node_to_idx, idx_to_node, G
@@ -110,28 +142,11 @@ def load_subgraph_from_file(graphml_path: str):
     """
     G = load_graph_from_graphml(graphml_path)
     
-    # Intentar cargar distancias si existen (mismo nombre pero .pkl)
-    distances_path = graphml_path.replace('.graphml', '_distances.pkl')
-    distances = load_distances_if_present(distances_path)
-    if distances is not None:
-        G.graph["distances"] = distances
-    
     G_relabel, node_to_idx, idx_to_node = relabel_nodes_to_indices(G)
     
-    # Convertir distancias de IDs originales a índices relabeled
-    if "distances" in G.graph:
-        converted = {}
-        for orig_u, dist_dict in G.graph["distances"].items():
-            u_idx = node_to_idx.get(orig_u)
-            if u_idx is None:
-                continue
-            converted[u_idx] = {}
-            for orig_v, d in dist_dict.items():
-                v_idx = node_to_idx.get(orig_v)
-                if v_idx is None:
-                    continue
-                converted[u_idx][v_idx] = float(d)
-        G_relabel.graph["distances"] = converted
+    # Intentar cargar distancias si existen (mismo nombre, _distances.npy o .pkl legacy)
+    distances_path = find_distances_path(graphml_path.replace('.graphml', ''))
+    attach_distances(G_relabel, load_distances_if_present(distances_path, list(G.nodes())), node_to_idx)
     
     return G_relabel, node_to_idx, idx_to_node
 
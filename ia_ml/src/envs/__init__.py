@@ -1,5 +1,19 @@
 # Expose WaypointNavigationEnv for easier imports
+from .graph_context import GraphContext
 from .waypoint_navigation import WaypointNavigationEnv
 from .action_masking import ActionMaskingWrapper, create_masked_waypoint_env
+from .shared_context import SharedGraphContext, SharedGraphContextHandle
+from .batched_navigation import BatchedWaypointNavigationEnv
+from .task_sampler import TaskSampler, TaskSamplingWrapper
 
-__all__ = ["WaypointNavigationEnv", "ActionMaskingWrapper", "create_masked_waypoint_env"]
+__all__ = [
+    "GraphContext",
+    "WaypointNavigationEnv",
+    "ActionMaskingWrapper",
+    "create_masked_waypoint_env",
+    "SharedGraphContext",
+    "SharedGraphContextHandle",
+    "BatchedWaypointNavigationEnv",
+    "TaskSampler",
+    "TaskSamplingWrapper",
+]
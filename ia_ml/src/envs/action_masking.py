@@ -1,8 +1,14 @@
 import gymnasium as gym
 import numpy as np
-from collections import deque, defaultdict
+import os
+from collections import defaultdict
+from src.utils.distances import distances_dict_to_matrix
+from src.utils.sp_cache import ShortestPathCache
 from .waypoint_navigation import WaypointNavigationEnv
 
+# tamaño de la ventana de nodos recientes bloqueados por ciclos
+RECENT_WINDOW = 10
+
 
 class ActionMaskingWrapper(gym.Wrapper):
     """wrapper para action masking y detección de ciclos"""
@@ -11,92 +17,89 @@ class ActionMaskingWrapper(gym.Wrapper):
         self,
         env,
         debug: bool = False,
-        distances: dict | None = None,
+        distances: np.ndarray | dict | None = None,
         distances_path: str | None = None,
         action_masking_cfg: dict | None = None,
+        sp_cache: ShortestPathCache | None = None,
     ):
         super().__init__(env)
         self.env = env
         self.debug = debug
 
-        self.recent_nodes = deque(maxlen=10)
-        self.recent_nodes_set = set()
+        # ventana de nodos recientes (índices) como buffer circular
+        self._recent = np.full(RECENT_WINDOW, -1, dtype=np.int64)
+        self._recent_pos = 0
         self.visit_counter = defaultdict(int)
 
         self.action_mask = np.zeros(self.env.max_actions, dtype=bool)
+        # matriz N x N en orden de índice (un dict legacy se convierte una vez)
+        if isinstance(distances, dict):
+            distances = distances_dict_to_matrix(distances, self.env.arrays.nodes)
         self._distances = distances
 
-        self._sp_cache = {}
-        self._sp_cache_max = 20000
+        # caché LRU de caminos del env (por defecto la del contexto, compartida en el proceso)
+        if sp_cache is not None:
+            self.env.sp_cache = sp_cache
 
     def _neighbors(self):
-        return list(self.env.graph.neighbors(self.env.current_node))
+        return self.env._neighbors(self.env.current_node)
 
     def _update_action_mask_with_cycles(self):
-        # aplicar masking de acciones y evitar ciclos
-        neighbors = self._neighbors()
-        n_actions = self.env.max_actions
+        """Máscara de acciones y ciclos en una expresión sobre la tabla de vecinos.
 
-        # resetear máscara
+        Un vecino es válido si no está en la ventana de recientes y es un
+        objetivo pendiente o no aleja del objetivo actual; si ninguno lo es
+        se permiten todos.
+        """
+        arrays = self.env.arrays
         self.action_mask[:] = False
+        cur = arrays.node_index.get(self.env.current_node)
+        if cur is None:
+            return
+
+        # vecinos (índices) rellenados con -1 hasta max_actions
+        nb = arrays.neighbor_table[cur, : self.env.max_actions]
+        valid = nb >= 0
 
-        # obtener objetivos actuales
+        # target actual: waypoint o destino
         remaining_wps = getattr(self.env, "remaining_waypoints", [])
         destination = getattr(self.env, "destination", None)
+        target = remaining_wps[0] if remaining_wps else destination
+        goals = [arrays.node_index.get(n) for n in (remaining_wps or [destination])]
+        goals = np.array([g for g in goals if g is not None], dtype=np.int64)
 
-        # target actual: waypoint o destino
-        if remaining_wps:
-            target = remaining_wps[0]
-        else:
-            target = destination
+        # distancia al target del nodo actual (posición 0) y de cada vecino
+        dist = self._distances_to_target(target, np.append(cur, np.where(valid, nb, cur)))
+        closer = dist[1:] < dist[0]
+        is_goal = np.isin(nb, goals)
+        recent = np.isin(nb, self._recent)
 
-        # distancia desde nodo actual
-        cur = self.env.current_node
-        if self._distances:
-            prev_dist = self._distances.get(cur, {}).get(target, np.inf)
-        else:
-            prev_dist = self._sp_length_cached(cur, target)
-
-        # evaluar cada vecino
-        for i, nb in enumerate(neighbors[:n_actions]):
-            # bloquear si está en ciclo reciente
-            if nb in self.recent_nodes_set:
-                continue
-
-            # siempre permitir waypoint o destino directos
-            if nb in remaining_wps or (not remaining_wps and nb == destination):
-                self.action_mask[i] = True
-                continue
-
-            # calcular distancia del vecino al target
-            if self._distances:
-                nd = self._distances.get(nb, {}).get(target, np.inf)
-            else:
-                nd = self._sp_length_cached(nb, target)
+        mask = valid & ~recent & (is_goal | closer)
+        # fallback: permitir algo si nada es válido
+        self.action_mask[: len(nb)] = mask if mask.any() else valid
+
+    def _distances_to_target(self, target, idx: np.ndarray) -> np.ndarray:
+        """Distancias (float64) desde los índices `idx` hasta `target`."""
+        t = self.env.arrays.node_index.get(target)
+        if self._distances is not None:
+            if t is None:
+                return np.full(len(idx), np.inf)
+            return np.asarray(self._distances[idx, t], dtype=np.float64)
+        # vector por objetivo del episodio, matriz del contexto o búsquedas cacheadas
+        return self.env._distances_to(target, idx)
 
-            # permitir si no aleja
-            if nd < prev_dist:
-                self.action_mask[i] = True
+    @property
+    def sp_cache(self) -> ShortestPathCache:
+        return self.env.sp_cache
 
-        # fallback: permitir algo si nada es válido
-        if not np.any(self.action_mask) and neighbors:
-            self.action_mask[: len(neighbors)] = True
-
-    def _sp_length_cached(self, a, b):
-        # obtener distancia con caching
-        key = (a, b)
-        if key in self._sp_cache:
-            return self._sp_cache[key]
-        d = self.env._sp_length(a, b)
-        if len(self._sp_cache) > self._sp_cache_max:
-            self._sp_cache.clear()
-        self._sp_cache[key] = d
-        return d
+    def sp_cache_stats(self):
+        """(identificador de la caché, contadores); la misma caché puede estar en varios envs."""
+        return (os.getpid(), id(self.sp_cache)), self.sp_cache.stats()
 
     def _update_cycle_tracking(self):
         # actualizar registro de nodos visitados
-        self.recent_nodes.append(self.env.current_node)
-        self.recent_nodes_set = set(self.recent_nodes)
+        self._recent[self._recent_pos % RECENT_WINDOW] = self.env.arrays.node_index.get(self.env.current_node, -1)
+        self._recent_pos += 1
         self.visit_counter[self.env.current_node] += 1
 
     def _calculate_cycle_penalty(self):
@@ -110,16 +113,20 @@ class ActionMaskingWrapper(gym.Wrapper):
         return float(max(raw, -50.0))
 
     def _initialize_cycle_tracking(self):
-        self.recent_nodes = deque([self.env.current_node], maxlen=10)
-        self.recent_nodes_set = {self.env.current_node}
+        self._recent[:] = -1
+        self._recent[0] = self.env.arrays.node_index.get(self.env.current_node, -1)
+        self._recent_pos = 1
         self.visit_counter = defaultdict(int)
         self.visit_counter[self.env.current_node] = 1
 
-    def step(self, action):
-        # actualizar máscara y ejecutar acción
-        self._update_action_mask_with_cycles()
+    def action_masks(self) -> np.ndarray:
+        """Máscara de acciones válidas del estado actual (API de MaskablePPO)."""
+        return self.action_mask.copy()
 
-        # reemplazar accion invalida con una válida
+    def step(self, action):
+        # la máscara ya corresponde al estado actual (reset o paso anterior).
+        # Con MaskablePPO la acción siempre es válida; con PPO se reemplaza
+        # una acción inválida por una válida al azar
         if action >= self.env.max_actions or not self.action_mask[action]:
             valids = np.where(self.action_mask)[0]
             if len(valids) > 0:
@@ -139,6 +146,8 @@ class ActionMaskingWrapper(gym.Wrapper):
         self._update_cycle_tracking()
         reward = float(reward) + self._calculate_cycle_penalty()
 
+        # máscara del nuevo estado: la usa la política en el próximo paso
+        self._update_action_mask_with_cycles()
         info["action_mask"] = self.action_mask.copy()
 
         if len(result) == 4:
@@ -154,6 +163,7 @@ class ActionMaskingWrapper(gym.Wrapper):
             info = {}
         self._initialize_cycle_tracking()
         self._update_action_mask_with_cycles()
+        info["action_mask"] = self.action_mask.copy()
         return obs, info
 
     @property
@@ -172,6 +182,8 @@ def create_masked_waypoint_env(
     distances=None,
     distances_path=None,
     action_masking_cfg=None,
+    context=None,
+    sp_cache=None,
 ):
     env = WaypointNavigationEnv(
         graph=graph,
@@ -180,6 +192,7 @@ def create_masked_waypoint_env(
         destination=destination,
         env_cfg=env_cfg or {},
         rew_cfg=rew_cfg or {},
+        context=context,
     )
 
     return ActionMaskingWrapper(
@@ -188,4 +201,5 @@ def create_masked_waypoint_env(
         distances=distances,
         distances_path=distances_path,
         action_masking_cfg=action_masking_cfg,
+        sp_cache=sp_cache,
     )
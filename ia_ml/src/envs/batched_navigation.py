@@ -0,0 +1,335 @@
+"""Entorno vectorizado nativo (VecEnv de SB3) para navegación con waypoints.
+
+Mantiene el estado de K episodios como arrays numpy (nodo actual, máscara de
+waypoints pendientes, pasos, visitas, ventana de nodos recientes, camino) y
+los avanza a todos con un único paso vectorizado: máscara de acciones,
+reemplazo de acciones inválidas, vecino elegido, costo, progreso, recompensa,
+terminación, auto-reset y observación son operaciones sobre arrays, sin un
+bucle de Python por entorno.
+
+Reproduce la semántica de ``WaypointNavigationEnv`` envuelto en
+``ActionMaskingWrapper``; todos los episodios comparten la misma tarea
+(inicio, waypoints y destino; se cambia con ``set_options`` antes de ``reset``).
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Type
+
+import gymnasium as gym
+import numpy as np
+from stable_baselines3.common.vec_env import VecEnv
+from stable_baselines3.common.vec_env.base_vec_env import VecEnvIndices, VecEnvObs, VecEnvStepReturn
+
+from src.envs.action_masking import RECENT_WINDOW
+from src.envs.graph_context import GraphContext
+from src.envs.waypoint_navigation import WaypointNavigationEnv
+
+# códigos de terminated_reason (0 = episodio en curso)
+TERMINATION_REASONS = (None, "destination_reached", "max_steps", "max_wait_steps", "dead_end")
+_DESTINATION, _MAX_STEPS, _MAX_WAIT, _DEAD_END = 1, 2, 3, 4
+
+
+class BatchedWaypointNavigationEnv(VecEnv):
+    """K episodios de ``WaypointNavigationEnv`` + ``ActionMaskingWrapper`` en arrays.
+
+    - La tarea se resuelve una vez con un entorno plantilla: orden de los
+      waypoints, pasos óptimos y vectores de distancia de todos los nodos a
+      cada objetivo (matriz ``T x N``, fila ``W`` = destino).
+    - Las acciones inválidas se reemplazan por una válida al azar (igual que
+      el wrapper), con el generador propio sembrado por ``seed()``.
+    - ``action_masks()`` devuelve la máscara ``K x max_actions`` del estado
+      actual; ``infos`` sólo se completa en los pasos terminales.
+    """
+
+    def __init__(
+        self,
+        context: GraphContext,
+        start_node: int,
+        waypoints: List[int],
+        destination: int,
+        num_envs: int,
+        env_cfg: Optional[Dict[str, Any]] = None,
+        rew_cfg: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        # entorno plantilla: misma configuración, espacios y parámetros de recompensa
+        template = WaypointNavigationEnv(
+            None, start_node, waypoints, destination, env_cfg or {}, rew_cfg or {}, context=context
+        )
+        # sin renderizado: la base de VecEnv lo consulta vía get_attr("render_mode")
+        self.render_mode = None
+        super().__init__(int(num_envs), template.observation_space, template.action_space)
+        self.context = context
+        self.arrays = context.arrays
+        self.template = template
+        self.max_actions = template.max_actions
+        self.max_steps = int(template.max_steps)
+        self.max_wait_steps = template.max_wait_steps
+        self.anti_loop_penalty = float(template.anti_loop_penalty)
+        self._edge_cost = template._edge_cost
+        self._rng = np.random.default_rng()
+
+        self._init_task()
+
+        k, n = self.num_envs, self.arrays.n_nodes
+        self._cur = np.zeros(k, dtype=np.int64)
+        self._remaining = np.zeros((k, len(self._wp_idx)), dtype=bool)
+        self._steps = np.zeros(k, dtype=np.int64)
+        self._travel = np.zeros(k, dtype=np.float64)
+        self._visits = np.zeros((k, n), dtype=np.int32)
+        self._recent = np.full((k, RECENT_WINDOW), -1, dtype=np.int64)
+        self._recent_pos = np.zeros(k, dtype=np.int64)
+        self._path = np.zeros((k, self.max_steps + 1), dtype=np.int32)
+        self._path_len = np.zeros(k, dtype=np.int64)
+        self._masks = np.zeros((k, self.max_actions), dtype=bool)
+        self._actions = np.zeros(k, dtype=np.int64)
+        self._all = np.arange(k)
+
+    def _init_task(self, options: Optional[Dict[str, Any]] = None) -> None:
+        """Arrays de la tarea (O(objetivos)), calculados con el entorno plantilla."""
+        env, arrays = self.template, self.arrays
+        env.reset(options=options)
+        index = arrays.node_index
+        missing = [t for t in (*env.waypoints, env.destination) if t not in index]
+        if missing:
+            raise ValueError(f"Objetivos fuera del grafo: {missing}")
+
+        # waypoints en el orden de remaining_waypoints tras reset (por distancia al inicio)
+        order = list(env.remaining_waypoints)
+        self._wp_idx = np.array([index[wp] for wp in order], dtype=np.int64)
+        self._dest_idx = index[env.destination]
+        self._start_idx = index[env.start_node]
+
+        all_nodes = np.arange(arrays.n_nodes)
+        rows = [env._distances_to(t, all_nodes) for t in (*order, env.destination)]
+        self._dist = np.asarray(rows, dtype=np.float64).reshape(len(rows), arrays.n_nodes)
+        self._dest_row = len(order)
+
+        self._opt_wp = np.array([env.optimal_steps_to_waypoints[wp] for wp in order], dtype=np.float64)
+        self._opt_dest = env.optimal_steps_to_destination
+
+        emb = env.embedding_matrix
+        self._dest_emb = emb[self._dest_idx] if env.embedding_dim else np.zeros(0, dtype=np.float32)
+        self._denom = env.max_distance if env.max_distance > 0 else 1.0
+
+    # ---- estado ----
+    def _reset_rows(self, rows: np.ndarray) -> None:
+        start = self._start_idx
+        self._cur[rows] = start
+        self._remaining[rows] = True
+        self._steps[rows] = 0
+        self._travel[rows] = 0.0
+        self._visits[rows] = 0
+        self._visits[rows, start] = 1
+        self._recent[rows] = -1
+        self._recent[rows, 0] = start
+        self._recent_pos[rows] = 1
+        self._path[rows, 0] = start
+        self._path_len[rows] = 1
+
+    def _targets(self, rows: np.ndarray):
+        """(hay waypoint pendiente, fila del primer pendiente, fila del objetivo actual)."""
+        remaining = self._remaining[rows]
+        has_wp = remaining.any(axis=1)
+        first = remaining.argmax(axis=1) if remaining.shape[1] else np.zeros(len(rows), dtype=np.int64)
+        return has_wp, first, np.where(has_wp, first, self._dest_row)
+
+    def _neighbor_rows(self, cur: np.ndarray):
+        nb = self.arrays.neighbor_table[cur, : self.max_actions].astype(np.int64)
+        valid = nb >= 0
+        return np.where(valid, nb, 0), valid
+
+    # ---- máscara (ActionMaskingWrapper._update_action_mask_with_cycles) ----
+    def _compute_masks(self) -> None:
+        cur = self._cur
+        nb, valid = self._neighbor_rows(cur)
+        has_wp, _, target = self._targets(self._all)
+
+        prev = self._dist[target, cur]
+        closer = self._dist[target[:, None], nb] < prev[:, None]
+        pending = (nb[:, :, None] == self._wp_idx[None, None, :]) & self._remaining[:, None, :]
+        is_target = pending.any(axis=2) | (~has_wp[:, None] & (nb == self._dest_idx))
+        recent = (nb[:, :, None] == self._recent[:, None, :]).any(axis=2)
+
+        mask = valid & ~recent & (is_target | closer)
+        # fallback: si nada es válido se permiten todos los vecinos
+        empty = ~mask.any(axis=1)
+        mask[empty] = valid[empty]
+        self._masks = mask
+
+    def action_masks(self) -> np.ndarray:
+        """Máscara ``K x max_actions`` de acciones válidas para el estado actual."""
+        return self._masks.copy()
+
+    # ---- observación (WaypointNavigationEnv._get_obs) ----
+    def _observe(self, rows: np.ndarray) -> np.ndarray:
+        env, dist, denom = self.template, self._dist, self._denom
+        cur, steps = self._cur[rows], self._steps[rows].astype(np.float64)
+        has_wp, first, _ = self._targets(rows)
+        d, k = env.embedding_dim, self.max_actions
+
+        obs = np.zeros((len(rows), env.observation_space.shape[0]), dtype=np.float32)
+        if d:
+            emb = env.embedding_matrix
+            obs[:, 0:d] = emb[cur]
+            obs[:, d:2 * d] = self._dest_emb
+            if len(self._wp_idx):
+                obs[:, 2 * d:3 * d] = np.where(has_wp[:, None], emb[self._wp_idx[first]], 0.0)
+
+        dist_dest = dist[self._dest_row, cur]
+        dist_wp = np.where(has_wp, dist[first, cur], 0.0) if len(self._wp_idx) else np.zeros(len(rows))
+
+        scalars = obs[:, 3 * d:3 * d + 7]
+        scalars[:, 0] = dist_dest / denom
+        scalars[:, 1] = dist_wp / denom
+        scalars[:, 2] = steps / self.max_steps
+        with np.errstate(invalid="ignore"):
+            if len(self._wp_idx):
+                opt = self._opt_wp[first]
+                est = steps + dist_wp
+                scalars[:, 3] = np.where(has_wp, np.minimum(1.0, opt / np.maximum(est, 1.0)), 0.0)
+                scalars[:, 5] = np.where(has_wp, est / np.maximum(opt, 1.0), 0.0)
+            if self._opt_dest is not None:
+                opt = float(self._opt_dest)
+                est = steps + dist_dest
+                scalars[:, 4] = np.minimum(1.0, opt / np.maximum(est, 1.0))
+                scalars[:, 6] = est / max(opt, 1.0)
+
+        nb, valid = self._neighbor_rows(cur)
+        base = 3 * d + 7
+        obs[:, base:base + k] = np.where(valid, dist[self._dest_row][nb] / denom, 0.0)
+        if len(self._wp_idx):
+            wp_valid = valid & has_wp[:, None]
+            obs[:, base + k:] = np.where(wp_valid, dist[first[:, None], nb] / denom, 0.0)
+        return obs
+
+    # ---- API VecEnv ----
+    def reset(self) -> VecEnvObs:
+        seed = self._seeds[0] if self._seeds else None
+        if seed is not None:
+            self._rng = np.random.default_rng(seed)
+        self._reset_seeds()
+        # set_options({"start", "waypoints", "destination"}): nueva tarea para todo el lote
+        options = self._options[0] if self._options else None
+        if options:
+            self._init_task(options)
+            self._remaining = np.zeros((self.num_envs, len(self._wp_idx)), dtype=bool)
+        self._reset_options()
+        self._reset_rows(self._all)
+        self._compute_masks()
+        return self._observe(self._all)
+
+    def step_async(self, actions: np.ndarray) -> None:
+        self._actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+
+    def step_wait(self) -> VecEnvStepReturn:
+        rows, masks = self._all, self._masks
+        cur = self._cur
+        dead = self.arrays.n_neighbors[cur] == 0
+
+        # reemplazar acciones inválidas por una válida al azar (0 si no hay ninguna)
+        actions = self._actions
+        in_range = (actions >= 0) & (actions < self.max_actions)
+        invalid = ~in_range | ~masks[rows, np.where(in_range, actions, 0)]
+        if invalid.any():
+            scores = np.where(masks, self._rng.random(masks.shape), -1.0)
+            replacement = np.where(masks.any(axis=1), scores.argmax(axis=1), 0)
+            actions = np.where(invalid, replacement, actions)
+
+        # transición (WaypointNavigationEnv.step); sin vecinos el nodo no cambia
+        live = ~dead
+        _, _, target = self._targets(rows)
+        safe = np.where(live, actions, 0)
+        nxt = np.where(live, self.arrays.neighbor_table[cur, safe], cur).astype(np.int64)
+        travel = np.where(live, self._edge_cost[self.arrays.neighbor_edge[cur, safe]], 0.0)
+        with np.errstate(invalid="ignore"):
+            progress = self._dist[target, cur] - self._dist[target, nxt]
+
+        self._steps += 1
+        self._cur = cur = nxt
+        self._travel += travel
+        self._path[live, self._path_len[live]] = cur[live]
+        self._path_len += live
+
+        env, denom = self.template, self._denom
+        rewards = np.where(progress > 0, (progress / denom) * 5.0, -0.05) - (travel / denom) * 0.01
+        if len(self._wp_idx):
+            match = self._remaining & (self._wp_idx[None, :] == cur[:, None]) & live[:, None]
+            hit = match.any(axis=1)
+            self._remaining[hit, match[hit].argmax(axis=1)] = False
+            rewards += hit * env.waypoint_bonus
+        at_dest = live & (cur == self._dest_idx) & ~self._remaining.any(axis=1)
+        rewards += at_dest * env.destination_bonus
+        rewards = np.where(live, rewards, 0.0)
+
+        # terminación (_check_termination); sin vecinos: truncated sin done
+        reason = np.zeros(self.num_envs, dtype=np.int8)
+        reason[at_dest] = _DESTINATION
+        open_ = live & ~at_dest
+        reason[open_ & (self._steps >= self.max_steps)] = _MAX_STEPS
+        if self.max_wait_steps:
+            reason[open_ & (reason == 0) & (self._steps >= self.max_wait_steps)] = _MAX_WAIT
+        reason[dead] = _DEAD_END
+        terminated = live & (reason > 0)
+        dones = terminated | dead
+
+        # ciclos (ActionMaskingWrapper): ventana de recientes, visitas y penalización
+        self._recent[rows, self._recent_pos % RECENT_WINDOW] = cur
+        self._recent_pos += 1
+        self._visits[rows, cur] += 1
+        visits = self._visits[rows, cur]
+        penalty = np.where(visits > 2, -self.anti_loop_penalty * (visits - 2), 0.0)
+        rewards = rewards + np.maximum(penalty, -50.0)
+
+        obs = self._observe(rows)
+        infos: List[Dict[str, Any]] = [{} for _ in range(self.num_envs)]
+        done_rows = np.flatnonzero(dones)
+        if len(done_rows):
+            nodes = self.arrays.nodes
+            for i in done_rows:
+                remaining = self._wp_idx[self._remaining[i]]
+                infos[i] = {
+                    "terminal_observation": obs[i].copy(),
+                    "TimeLimit.truncated": bool(dead[i]),
+                    "terminated_reason": TERMINATION_REASONS[reason[i]],
+                    "path": [nodes[j] for j in self._path[i, : self._path_len[i]]],
+                    "remaining_waypoints": [nodes[j] for j in remaining],
+                    "current_node": nodes[cur[i]],
+                    "travel_time": float(self._travel[i]),
+                }
+            self._reset_rows(done_rows)
+            obs[done_rows] = self._observe(done_rows)
+
+        self._compute_masks()
+        return obs, rewards.astype(np.float32), dones, infos
+
+    def close(self) -> None:
+        pass
+
+    def _indices(self, indices: VecEnvIndices) -> Sequence[int]:
+        if indices is None:
+            return range(self.num_envs)
+        if isinstance(indices, int):
+            return [indices]
+        return indices
+
+    def get_attr(self, attr_name: str, indices: VecEnvIndices = None) -> List[Any]:
+        rows = self._indices(indices)
+        if attr_name == "current_node":
+            return [self.arrays.nodes[self._cur[i]] for i in rows]
+        value = getattr(self, attr_name)
+        return [value for _ in rows]
+
+    def set_attr(self, attr_name: str, value: Any, indices: VecEnvIndices = None) -> None:
+        # el estado es compartido por el lote: se asigna una vez
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name: str, *method_args, indices: VecEnvIndices = None, **method_kwargs) -> List[Any]:
+        rows = self._indices(indices)
+        if method_name == "action_masks":
+            # una fila por entorno (get_action_masks de MaskablePPO)
+            return [self._masks[i].copy() for i in rows]
+        # los métodos actúan sobre el lote completo: se llaman una vez
+        result = getattr(self, method_name)(*method_args, **method_kwargs)
+        return [result for _ in rows]
+
+    def env_is_wrapped(self, wrapper_class: Type[gym.Wrapper], indices: VecEnvIndices = None) -> List[bool]:
+        return [False for _ in self._indices(indices)]
@@ -0,0 +1,176 @@
+"""Contexto de solo lectura compartido por todos los entornos sobre un grafo.
+
+Todo lo que depende únicamente del grafo (CSR, embeddings, matriz de
+distancias, distancia máxima, grado máximo) se calcula una vez aquí; crear
+otro entorno sobre el mismo grafo sólo arma su estado de episodio.
+"""
+
+from typing import Any, Dict, Optional, Sequence
+
+import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+
+from src.utils.distances import distances_dict_to_matrix, edges_to_csgraph, max_finite_distance
+from src.utils.embeddings import build_node_embedding_matrix
+from src.utils.graph_arrays import GraphArrays, coordinate_diameter
+from src.utils.routing import CSRRouter
+from src.utils.sp_cache import ShortestPathCache
+from src.utils.spatial_index import EdgeSnapper, NodeSnapper
+
+
+def _read_only(array: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    """vista de solo lectura (no cambia los flags del array original)."""
+    if not isinstance(array, np.ndarray):
+        return array
+    view = array.view()
+    view.setflags(write=False)
+    return view
+
+
+class GraphContext:
+    """Datos inmutables derivados de un grafo.
+
+    - ``arrays``: ``GraphArrays`` (CSR, tabla de vecinos, tabla de aristas).
+    - ``embedding_matrix``: embeddings N x D en orden de índice.
+    - ``distance_matrix``: matriz N x N precalculada (memmap) o None.
+    - ``max_distance``: normalizador de distancias de la observación.
+    - ``max_degree``: grado máximo (= tamaño del espacio de acciones).
+
+    Los arrays quedan en solo lectura y los atributos no se pueden reasignar.
+    """
+
+    def __init__(self, graph: nx.MultiDiGraph, density_radius: int = 2) -> None:
+        arrays = GraphArrays(graph)
+        distance_matrix = graph.graph.get("distances")
+        if isinstance(distance_matrix, dict):
+            # dict-of-dicts legacy: convertir una vez a matriz en orden de índice
+            distance_matrix = distances_dict_to_matrix(distance_matrix, arrays.nodes)
+        embedding_matrix = build_node_embedding_matrix(graph, arrays, density_radius=int(density_radius))
+        self._init_parts(graph, arrays, embedding_matrix, distance_matrix, None, density_radius)
+
+    def _init_parts(
+        self,
+        graph: Optional[nx.MultiDiGraph],
+        arrays: GraphArrays,
+        embedding_matrix: np.ndarray,
+        distance_matrix: Optional[np.ndarray],
+        max_distance: Optional[float],
+        density_radius: int,
+        buffers: Sequence[Any] = (),
+    ) -> None:
+        for name in GraphArrays.ARRAY_FIELDS:
+            setattr(arrays, name, _read_only(getattr(arrays, name)))
+        self._set("graph", graph)
+        self._set("arrays", arrays)
+        self._set("density_radius", int(density_radius))
+        self._set("distance_matrix", _read_only(distance_matrix))
+        self._set("embedding_matrix", _read_only(embedding_matrix))
+        self._set("max_degree", arrays.max_actions)
+        self._set("max_distance", self._calculate_max_distance() if max_distance is None else float(max_distance))
+        self._set("_reverse_csgraphs", {})
+        self._set("_sp_caches", {})
+        self._set("_spatial", {})
+        self._set("_routers", {})
+        # objetos que respaldan la memoria de los arrays (p. ej. SharedMemory)
+        self._set("_buffers", tuple(buffers))
+
+    @classmethod
+    def from_parts(
+        cls,
+        arrays: GraphArrays,
+        embedding_matrix: np.ndarray,
+        distance_matrix: Optional[np.ndarray],
+        max_distance: float,
+        density_radius: int = 2,
+        graph: Optional[nx.MultiDiGraph] = None,
+        buffers: Sequence[Any] = (),
+    ) -> "GraphContext":
+        """Contexto a partir de arrays ya calculados (sin grafo networkx).
+
+        Lo usan los workers que adjuntan un contexto en memoria compartida.
+        """
+        self = cls.__new__(cls)
+        self._init_parts(graph, arrays, embedding_matrix, distance_matrix, max_distance, density_radius, buffers)
+        return self
+
+    @classmethod
+    def from_config(cls, graph: nx.MultiDiGraph, env_cfg: Optional[Dict[str, Any]] = None) -> "GraphContext":
+        env_cfg = env_cfg or {}
+        return cls(graph, density_radius=int(env_cfg.get("density_radius", 2)))
+
+    def _set(self, name: str, value: Any) -> None:
+        object.__setattr__(self, name, value)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("GraphContext es de solo lectura")
+
+    @property
+    def n_nodes(self) -> int:
+        return self.arrays.n_nodes
+
+    @property
+    def embedding_dim(self) -> int:
+        return self.embedding_matrix.shape[1]
+
+    def _calculate_max_distance(self) -> float:
+        if self.distance_matrix is not None:
+            max_dist = max_finite_distance(self.distance_matrix)
+            if max_dist > 0:
+                return max_dist
+
+        if self.arrays.n_nodes < 2:
+            return 1.0
+
+        # diámetro en coordenadas (envolvente convexa + máximo por pares)
+        max_dist = coordinate_diameter(self.arrays.x, self.arrays.y)
+        return max_dist if max_dist > 0 else 1.0
+
+    def reverse_csgraph(self, weight: str) -> sp.csr_matrix:
+        """Grafo transpuesto (CSR) para Dijkstra inverso hacia un objetivo, cacheado por peso.
+
+        Misma semántica que ``graph_to_csgraph``: mínimo entre aristas
+        paralelas y peso 1 si falta el atributo.
+        """
+        csgraph = self._reverse_csgraphs.get(weight)
+        if csgraph is None:
+            arrays = self.arrays
+            sources = np.repeat(np.arange(arrays.n_nodes, dtype=np.int64), np.diff(arrays.indptr))
+            weights = arrays.edge_features.raw(weight)
+            weights = np.where(np.isnan(weights), 1.0, weights)
+            # transpuesto: aristas v -> u
+            csgraph = edges_to_csgraph(np.asarray(arrays.indices), sources, weights, arrays.n_nodes)
+            self._reverse_csgraphs[weight] = csgraph
+        return csgraph
+
+    def node_snapper(self) -> NodeSnapper:
+        """Índice KD de nodos (metros proyectados), construido en el primer uso."""
+        snapper = self._spatial.get("nodes")
+        if snapper is None:
+            snapper = NodeSnapper(self.arrays)
+            self._spatial["nodes"] = snapper
+        return snapper
+
+    def edge_snapper(self) -> EdgeSnapper:
+        """STRtree de aristas (metros proyectados), construido en el primer uso."""
+        snapper = self._spatial.get("edges")
+        if snapper is None:
+            snapper = EdgeSnapper(self.arrays)
+            self._spatial["edges"] = snapper
+        return snapper
+
+    def router(self, weight: str) -> CSRRouter:
+        """A* sobre el CSR para ``weight`` (escala de la heurística precalculada), cacheado."""
+        router = self._routers.get(weight)
+        if router is None:
+            router = CSRRouter(self.arrays, weight)
+            self._routers[weight] = router
+        return router
+
+    def shortest_path_cache(self, weight: str) -> ShortestPathCache:
+        """Caché LRU de caminos más cortos por peso, compartida por los envs del proceso."""
+        cache = self._sp_caches.get(weight)
+        if cache is None:
+            cache = ShortestPathCache(self.arrays.n_nodes)
+            self._sp_caches[weight] = cache
+        return cache
@@ -20,6 +20,8 @@ where rewards/values are arrays.
 from typing import Tuple, Union
 import gymnasium as gym
 import numpy as np
+from stable_baselines3.common.vec_env import VecEnv, VecEnvWrapper
+from stable_baselines3.common.vec_env.base_vec_env import VecEnvObs, VecEnvStepReturn
 
 
 class RunningMeanStd:
@@ -244,3 +246,56 @@ class VC2Normalizer(gym.Wrapper):
 
     def get_value_stats(self) -> Tuple[float, float]:
         return float(self.rms_value.mean), float(self.rms_value.var)
+
+
+class VC2VecNormalizer(VecEnvWrapper):
+    """VC2 reward normalization on top of an SB3 VecEnv.
+
+    Same per-step normalization as the vectorized path of `VC2Normalizer`
+    (one discounted-return accumulator per sub-env, reset on done), for
+    native batched envs that cannot be wrapped env by env.
+    """
+
+    def __init__(
+        self,
+        venv: VecEnv,
+        gamma: float = 0.99,
+        clip_range: float = 10.0,
+        eps: float = 1e-8,
+        scale: float = 1.0,
+    ):
+        super().__init__(venv)
+        self.gamma = float(gamma)
+        self.clip_range = float(clip_range)
+        self.eps = float(eps)
+        self.scale = float(scale)
+        self.rms_return = RunningMeanStd(eps=1e-4)
+        self.rms_value = RunningMeanStd(eps=1e-4)
+        self.episode_ret = np.zeros(self.num_envs, dtype=np.float64)
+
+    def reset(self) -> VecEnvObs:
+        self.episode_ret = np.zeros(self.num_envs, dtype=np.float64)
+        return self.venv.reset()
+
+    def step_wait(self) -> VecEnvStepReturn:
+        obs, rewards, dones, infos = self.venv.step_wait()
+        r_arr = np.asarray(rewards, dtype=np.float64)
+        self.episode_ret = self.episode_ret * self.gamma + r_arr
+        self.rms_return.update(self.episode_ret)
+        std = np.sqrt(self.rms_return.var) + self.eps
+        norm_r = np.clip((r_arr / std) * self.scale, -self.clip_range, self.clip_range)
+        self.episode_ret[np.asarray(dones, dtype=bool)] = 0.0
+        return obs, norm_r.astype(np.float32), dones, infos
+
+    def push_value_batch(self, values: Union[np.ndarray, list, float]) -> None:
+        """Push a batch of raw critic predictions (all sub-envs share the stats)."""
+        v = np.asarray(values, dtype=np.float64).ravel()
+        if v.size == 0:
+            return
+        self.rms_value.update(v)
+
+    def get_return_stats(self) -> Tuple[float, float]:
+        return float(self.rms_return.mean), float(self.rms_return.var)
+
+    def get_value_stats(self) -> Tuple[float, float]:
+        return float(self.rms_value.mean), float(self.rms_value.var)
@@ -0,0 +1,168 @@
+"""GraphContext en memoria compartida para entornos en subprocesos.
+
+El proceso principal publica los arrays de un ``GraphContext`` (CSR, tabla de
+vecinos, coordenadas, columnas de aristas, embeddings y matriz de
+distancias) en bloques de ``multiprocessing.shared_memory``. Los workers
+reciben sólo un ``SharedGraphContextHandle`` (nombres, formas y dtypes) y se
+adjuntan por nombre: no se picklea el grafo networkx y la memoria no se
+multiplica por la cantidad de workers.
+
+Una matriz de distancias que ya es un memmap (.npy) no se copia: los
+workers abren el mismo archivo en modo memmap.
+"""
+
+from multiprocessing import shared_memory
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.envs.graph_context import GraphContext
+from src.utils.graph_arrays import GraphArrays
+
+# columnas crudas de aristas publicadas por defecto: costos de movimiento
+# (travel_time/length) y "weight" que usa la distancia de camino en modo astar
+DEFAULT_EDGE_COLUMNS = ("length", "travel_time", "weight")
+
+# (nombre del bloque, forma, dtype)
+ArraySpec = Tuple[str, Tuple[int, ...], str]
+
+# contextos ya adjuntados en este proceso (varios envs por worker comparten uno)
+_ATTACHED: Dict[str, GraphContext] = {}
+
+
+class SharedGraphContextHandle:
+    """Descriptor picklable de un contexto publicado; ``attach()`` lo abre en el worker."""
+
+    def __init__(
+        self,
+        token: str,
+        specs: Dict[str, ArraySpec],
+        nodes: Optional[List[Hashable]],
+        n_nodes: int,
+        max_actions: int,
+        max_distance: float,
+        density_radius: int,
+        edge_columns: Sequence[str],
+        distance_file: Optional[Tuple[str, int, Tuple[int, ...], str]] = None,
+    ) -> None:
+        self.token = token
+        self.specs = specs
+        self.nodes = nodes
+        self.n_nodes = n_nodes
+        self.max_actions = max_actions
+        self.max_distance = max_distance
+        self.density_radius = density_radius
+        self.edge_columns = tuple(edge_columns)
+        self.distance_file = distance_file
+
+    def attach(self) -> GraphContext:
+        """Contexto de solo lectura respaldado por la memoria compartida (sin copias)."""
+        context = _ATTACHED.get(self.token)
+        if context is not None:
+            return context
+
+        blocks: List[Any] = []
+
+        def view(key: str) -> np.ndarray:
+            name, shape, dtype = self.specs[key]
+            block = shared_memory.SharedMemory(name=name)
+            blocks.append(block)
+            return np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+        arrays = GraphArrays.from_arrays(
+            nodes=self.nodes if self.nodes is not None else range(self.n_nodes),
+            max_actions=self.max_actions,
+            arrays={name: view(name) for name in GraphArrays.ARRAY_FIELDS},
+            edge_columns={name: view(f"edge:{name}") for name in self.edge_columns},
+        )
+        distance_matrix = None
+        if self.distance_file is not None:
+            filename, offset, shape, dtype = self.distance_file
+            distance_matrix = np.memmap(filename, dtype=np.dtype(dtype), mode="r", offset=offset, shape=shape)
+        elif "distances" in self.specs:
+            distance_matrix = view("distances")
+
+        context = GraphContext.from_parts(
+            arrays,
+            embedding_matrix=view("embeddings"),
+            distance_matrix=distance_matrix,
+            max_distance=self.max_distance,
+            density_radius=self.density_radius,
+            buffers=blocks,
+        )
+        _ATTACHED[self.token] = context
+        return context
+
+
+class SharedGraphContext:
+    """Publica un GraphContext en memoria compartida (lado del proceso principal).
+
+    Mantiene vivos los bloques mientras exista; ``close()`` (o el ``with``)
+    los libera. Los workers usan ``handle`` para adjuntarse.
+    """
+
+    def __init__(self, context: GraphContext, edge_columns: Sequence[str] = DEFAULT_EDGE_COLUMNS) -> None:
+        self._blocks: List[shared_memory.SharedMemory] = []
+        arrays = context.arrays
+        specs: Dict[str, ArraySpec] = {}
+        try:
+            for name in GraphArrays.ARRAY_FIELDS:
+                specs[name] = self._publish(getattr(arrays, name))
+            edge_columns = tuple(dict.fromkeys(edge_columns))
+            for name in edge_columns:
+                specs[f"edge:{name}"] = self._publish(arrays.edge_features.raw(name))
+            specs["embeddings"] = self._publish(context.embedding_matrix)
+
+            distance_file = None
+            dm = context.distance_matrix
+            memmap = dm if isinstance(dm, np.memmap) else getattr(dm, "base", None)
+            if isinstance(memmap, np.memmap) and memmap.filename and memmap.shape == dm.shape:
+                # ya está en disco: los workers abren el mismo archivo
+                distance_file = (memmap.filename, int(memmap.offset), tuple(dm.shape), dm.dtype.str)
+            elif dm is not None:
+                specs["distances"] = self._publish(dm)
+        except BaseException:
+            self.close()
+            raise
+
+        nodes = arrays.nodes
+        identity = all(isinstance(n, (int, np.integer)) and n == i for i, n in enumerate(nodes))
+        self.handle = SharedGraphContextHandle(
+            token=specs["indptr"][0],
+            specs=specs,
+            nodes=None if identity else list(nodes),
+            n_nodes=arrays.n_nodes,
+            max_actions=arrays.max_actions,
+            max_distance=context.max_distance,
+            density_radius=context.density_radius,
+            edge_columns=edge_columns,
+            distance_file=distance_file,
+        )
+
+    def _publish(self, array: np.ndarray) -> ArraySpec:
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        self._blocks.append(block)
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        return block.name, tuple(array.shape), array.dtype.str
+
+    @property
+    def nbytes(self) -> int:
+        return sum(block.size for block in self._blocks)
+
+    def close(self) -> None:
+        """Libera los bloques (los workers deben haber terminado)."""
+        _ATTACHED.pop(getattr(getattr(self, "handle", None), "token", None), None)
+        for block in self._blocks:
+            block.close()
+            try:
+                block.unlink()
+            except FileNotFoundError:
+                pass
+        self._blocks = []
+
+    def __enter__(self) -> "SharedGraphContext":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
@@ -0,0 +1,124 @@
+"""Muestreo aleatorio de tareas (inicio, waypoints, destino) por episodio.
+
+Los nodos se eligen dentro de la componente fuertemente conexa más grande
+del grafo, así todo objetivo es alcanzable desde cualquier otro. La
+distancia en línea recta inicio -> destino se acota con
+``min_distance_m`` / ``max_distance_m`` y los waypoints se eligen entre
+los nodos cuyo desvío (inicio -> waypoint -> destino) no supera
+``max_distance_m``.
+"""
+
+from typing import Any, Dict, Optional, Sequence, Union
+
+import gymnasium as gym
+import numpy as np
+from scipy.sparse.csgraph import connected_components
+
+from src.envs.graph_context import GraphContext
+from src.utils.distances import edges_to_csgraph
+from src.utils.graph_arrays import haversine_m
+
+
+class TaskSampler:
+    """Genera ``{"start", "waypoints", "destination"}`` alcanzables para ``reset(options=...)``."""
+
+    def __init__(
+        self,
+        context: GraphContext,
+        n_waypoints: Sequence[int] = (1, 3),
+        min_distance_m: float = 0.0,
+        max_distance_m: float = float("inf"),
+        seed: Optional[Union[int, np.random.SeedSequence]] = None,
+        max_tries: int = 100,
+    ) -> None:
+        arrays = context.arrays
+        self.nodes = arrays.nodes
+        self.n_waypoints = (int(n_waypoints[0]), int(n_waypoints[-1]))
+        self.min_distance_m = float(min_distance_m)
+        self.max_distance_m = float(max_distance_m)
+        self.max_tries = int(max_tries)
+
+        # componente fuertemente conexa más grande (aristas paralelas colapsadas)
+        sources = np.repeat(np.arange(arrays.n_nodes, dtype=np.int64), np.diff(arrays.indptr))
+        adjacency = edges_to_csgraph(sources, np.asarray(arrays.indices), np.ones(arrays.n_edges), arrays.n_nodes)
+        _, labels = connected_components(adjacency, directed=True, connection="strong")
+        self.candidates = np.flatnonzero(labels == np.bincount(labels).argmax())
+        if len(self.candidates) < self.n_waypoints[1] + 2:
+            raise ValueError(
+                f"La componente fuertemente conexa más grande tiene {len(self.candidates)} nodos; "
+                f"se necesitan al menos {self.n_waypoints[1] + 2}"
+            )
+        self._x = arrays.x[self.candidates]
+        self._y = arrays.y[self.candidates]
+        self.initial_seed = seed
+        self.rng = np.random.default_rng(seed)
+
+    @classmethod
+    def from_config(
+        cls, context: GraphContext, tasks_cfg: Dict[str, Any], seed: Optional[Union[int, np.random.SeedSequence]] = None
+    ) -> "TaskSampler":
+        return cls(
+            context,
+            n_waypoints=tasks_cfg.get("n_waypoints", (1, 3)),
+            min_distance_m=float(tasks_cfg.get("min_distance_m", 0.0)),
+            max_distance_m=float(tasks_cfg.get("max_distance_m", float("inf"))),
+            seed=seed,
+        )
+
+    def seed(self, seed: Optional[Union[int, np.random.SeedSequence]]) -> None:
+        self.initial_seed = seed
+        self.rng = np.random.default_rng(seed)
+
+    def rewind(self) -> None:
+        """Vuelve al inicio de la secuencia de la semilla (mismas tareas otra vez)."""
+        self.rng = np.random.default_rng(self.initial_seed)
+
+    def sample(self) -> Dict[str, Any]:
+        rng = self.rng
+        k = int(rng.integers(self.n_waypoints[0], self.n_waypoints[1] + 1))
+        for _ in range(self.max_tries):
+            s = int(rng.integers(len(self.candidates)))
+            d_start = haversine_m(self._x[s], self._y[s], self._x, self._y)
+            dests = np.flatnonzero((d_start >= self.min_distance_m) & (d_start <= self.max_distance_m))
+            dests = dests[dests != s]
+            if not len(dests):
+                continue
+            t = int(rng.choice(dests))
+            d_dest = haversine_m(self._x[t], self._y[t], self._x, self._y)
+            pool = np.flatnonzero(d_start + d_dest <= max(self.max_distance_m, d_start[t]))
+            pool = pool[(pool != s) & (pool != t)]
+            if len(pool) < k:
+                continue
+            wps = rng.choice(pool, size=k, replace=False)
+            nodes, cands = self.nodes, self.candidates
+            return {
+                "start": nodes[cands[s]],
+                "waypoints": [nodes[cands[w]] for w in wps],
+                "destination": nodes[cands[t]],
+            }
+        raise RuntimeError(
+            f"No se encontró una tarea con {k} waypoints y distancia en "
+            f"[{self.min_distance_m}, {self.max_distance_m}] m tras {self.max_tries} intentos"
+        )
+
+
+class TaskSamplingWrapper(gym.Wrapper):
+    """Cada ``reset`` sin ``options`` arranca un episodio con una tarea muestreada.
+
+    Un ``seed`` en ``reset`` también siembra el muestreador (semilla por worker).
+    """
+
+    def __init__(self, env: gym.Env, sampler: TaskSampler) -> None:
+        super().__init__(env)
+        self.sampler = sampler
+
+    def reset(self, *, seed: Optional[int] = None, options: Optional[Dict[str, Any]] = None):
+        if seed is not None:
+            self.sampler.seed(seed)
+        if options is None:
+            options = self.sampler.sample()
+        return self.env.reset(seed=seed, options=options)
+
+    def rewind_tasks(self) -> None:
+        """Repite desde el principio la secuencia de tareas (evaluación reproducible)."""
+        self.sampler.rewind()
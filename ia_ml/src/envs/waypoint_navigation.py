@@ -3,8 +3,9 @@ import gymnasium as gym
 from gymnasium import spaces
 import networkx as nx
 import numpy as np
+from scipy.sparse.csgraph import dijkstra
 from typing import Dict, Any, List, Optional
-from src.utils.embeddings import build_node_embeddings
+from src.envs.graph_context import GraphContext
 
 class WaypointNavigationEnv(gym.Env):
     """
@@ -18,28 +19,30 @@ class WaypointNavigationEnv(gym.Env):
     metadata = {"render_modes": ["human"]}
     def __init__(
         self,
-        graph: nx.MultiDiGraph,
+        graph: Optional[nx.MultiDiGraph],
         start_node: int,
         waypoints: List[int],
         destination: int,
         env_cfg: Dict[str, Any],
         rew_cfg: Dict[str, Any],
+        context: Optional[GraphContext] = None,
     ) -> None:
         super().__init__()
 
         env_cfg = env_cfg or {}
         rew_cfg = rew_cfg or {}
 
-        if waypoints is None:
-            waypoints = []
-        elif isinstance(waypoints, (int,str)):
-            waypoints = [waypoints]
-        else:
-            try:
-                waypoints = list(waypoints)
-            except TypeError:
-                waypoints = [waypoints]
+        waypoints = self._as_waypoint_list(waypoints)
+
+        if context is None:
+            context = GraphContext.from_config(graph, env_cfg)
+        elif graph is None:
+            # contexto adjuntado sin grafo networkx (p. ej. memoria compartida)
+            graph = context.graph
+        elif context.graph is not graph:
+            raise ValueError("El GraphContext fue construido sobre otro grafo")
 
+        self.context = context
         self.graph = graph
         self.start_node = start_node
         self.waypoints = waypoints
@@ -47,6 +50,10 @@ class WaypointNavigationEnv(gym.Env):
         self.env_cfg = env_cfg
         self.rew_cfg = rew_cfg
         self.render_mode = self.env_cfg.get("render_mode", "human")
+        # "terminal": path/remaining_waypoints en info sólo al terminar; "full": en cada paso
+        self.info_verbosity = self.env_cfg.get("info_verbosity", "terminal")
+        if self.info_verbosity not in ("terminal", "full"):
+            raise ValueError(f"info_verbosity desconocido: {self.info_verbosity}")
 
         # inicializar entorno
         self._init_environment(env_cfg)
@@ -54,9 +61,19 @@ class WaypointNavigationEnv(gym.Env):
         self._init_reward_params(rew_cfg)
         self._reset_state_vars()
 
+        # A* sobre el CSR del contexto para la escala de la heurística (al primer uso)
+        self._router = None
+
+        # consultas fuera de los vectores por objetivo: caché LRU del contexto
+        # (compartida en el proceso); depende del peso, fijado en _init_reward_params
+        self.sp_cache = self.context.shortest_path_cache(self._sp_weight())
+
     def _init_environment(self, env_cfg: Dict[str, Any]):
+        # representación CSR del grafo para el camino caliente de step()
+        self.arrays = self.context.arrays
+
         self.max_steps = (
-            max(1, self.graph.number_of_nodes())
+            max(1, self.arrays.n_nodes)
             if env_cfg.get("max_steps", "auto") == "auto"
             else env_cfg.get("max_steps")
         )
@@ -66,22 +83,33 @@ class WaypointNavigationEnv(gym.Env):
             else env_cfg.get("max_wait_steps")
         )
 
-        self.distance_matrix = None
-        dm = self.graph.graph.get("distances")
-        if dm is not None:
-            # matriz de distancias precalculada
-            self.distance_matrix = dm
+        # matriz de distancias precalculada (N x N, posiblemente memmap) o None
+        self.distance_matrix: Optional[np.ndarray] = self.context.distance_matrix
+
+        # sin matriz: en cada reset se calcula un Dijkstra inverso por objetivo
+        self._target_dist: Dict[Any, np.ndarray] = {}
         
-        # calcular máximo para normalización
-        self.max_distance = self._calculate_max_distance()
+        # máximo para normalización
+        self.max_distance = self.context.max_distance
 
     def _init_spaces(self):
-        # cargar embeddings y configurar espacios
-        self.node_embeddings = build_node_embeddings(self.graph)
-        self.embedding_dim = len(next(iter(self.node_embeddings.values()), []))
-        self.max_actions = max(dict(self.graph.degree()).values(), default=1)
+        # embeddings como matriz N x D indexada por el índice del nodo (compartida)
+        self.embedding_matrix = self.context.embedding_matrix
+        self.embedding_dim = self.context.embedding_dim
+        self.max_actions = self.context.max_degree
         obs_dim = 3 * self.embedding_dim + 7 + 2 * self.max_actions
 
+        # buffer de observación preasignado y vistas a cada bloque:
+        # [emb actual | emb destino | emb waypoint | 7 escalares | dist. vecinos a destino | dist. vecinos a waypoint]
+        d, k = self.embedding_dim, self.max_actions
+        self._obs_buf = np.zeros(obs_dim, dtype=np.float32)
+        self._obs_cur_emb = self._obs_buf[0:d]
+        self._obs_dest_emb = self._obs_buf[d:2 * d]
+        self._obs_wp_emb = self._obs_buf[2 * d:3 * d]
+        self._obs_scalars = self._obs_buf[3 * d:3 * d + 7]
+        self._obs_neigh_dest = self._obs_buf[3 * d + 7:3 * d + 7 + k]
+        self._obs_neigh_wp = self._obs_buf[3 * d + 7 + k:]
+
         self.observation_space = spaces.Box(
             low=-np.inf,
             high=np.inf,
@@ -100,25 +128,49 @@ class WaypointNavigationEnv(gym.Env):
         self.waypoint_bonus = rew_cfg.get("waypoint_bonus", 50.0)
         self.destination_bonus = rew_cfg.get("destination_bonus", 200.0)
         self.no_progress_penalty = rew_cfg.get("no_progress_penalty", 2.0)
+        self._edge_cost = self.arrays.edge_cost(self.weight_name)
 
     def _reset_state_vars(self):
         # inicializar variables de estado del episodio
         self.current_node: Optional[int] = None
         self.remaining_waypoints: List[int] = []
-        self.path_history: List[int] = []
+        # camino como índices de nodo en un buffer preasignado + longitud
+        self._path_buf = np.zeros(int(self.max_steps) + 1, dtype=np.int32)
+        self._path_len = 0
         self.steps_taken = 0
         self.total_travel_time = 0.0
         self.optimal_steps_to_destination: Optional[int] = None
         self.optimal_steps_to_waypoints: Dict[int, int] = {}
 
 
+    @staticmethod
+    def _as_waypoint_list(waypoints) -> List[int]:
+        if waypoints is None:
+            return []
+        if isinstance(waypoints, (int, str)):
+            return [waypoints]
+        try:
+            return list(waypoints)
+        except TypeError:
+            return [waypoints]
+
     def reset(self, *, seed: Optional[int] = None, options: Optional[Dict[str, Any]] = None):
+        """Reinicia el episodio.
+
+        ``options`` puede traer ``start``, ``waypoints`` y/o ``destination``
+        para cambiar la tarea sin reconstruir el entorno: sólo se recalcula
+        el estado por objetivo (vectores de distancia de objetivos nuevos).
+        """
         super().reset(seed=seed)
+        if options:
+            self._set_task(options)
+        self._compute_target_distances()
         self.current_node = self.start_node
         self.remaining_waypoints = sorted(
             self.waypoints, key=lambda wp: self._sp_length(self.current_node, wp)
         )
-        self.path_history = [self.current_node]
+        self._path_len = 0
+        self._append_path(self.arrays.node_index[self.current_node])
         self.steps_taken = 0
         self.total_travel_time = 0.0
         
@@ -140,19 +192,24 @@ class WaypointNavigationEnv(gym.Env):
         reward, done, truncated = 0.0, False, False
         info: Dict[str, Any] = {}
 
-        neighbors = self._neighbors(self.current_node)
-        if not neighbors:
+        cur = self.arrays.node_index.get(self.current_node)
+        n_neighbors = int(self.arrays.n_neighbors[cur]) if cur is not None else 0
+        if n_neighbors == 0:
             truncated = True
             info["terminated_reason"] = "dead_end"
             return self._finalize_step(reward, done, truncated, info)
 
-        next_node = neighbors[action]
-        travel_time = self._compute_travel_cost(self.current_node, next_node)
+        action = int(action)
+        if not 0 <= action < n_neighbors:
+            raise IndexError(f"Acción {action} fuera de rango para {n_neighbors} vecinos")
+        next_idx = self.arrays.neighbor_table[cur, action]
+        next_node = self.arrays.nodes[next_idx]
+        travel_time = self._compute_travel_cost(cur, action)
         progress = self._compute_progress(next_node)
 
         # actualizar estado
         self.current_node = next_node
-        self.path_history.append(next_node)
+        self._append_path(next_idx)
         self.total_travel_time += travel_time
 
         # calcular recompensa
@@ -164,9 +221,9 @@ class WaypointNavigationEnv(gym.Env):
 
         return self._finalize_step(reward, done, truncated, info)
 
-    def _compute_travel_cost(self, current: int, next_node: int) -> float:
-        edge_data = self._edge_data(current, next_node)
-        return float(edge_data.get(self.weight_name, edge_data.get("length", 1.0)))
+    def _compute_travel_cost(self, cur_idx: int, action: int) -> float:
+        # costo de la primera arista paralela hacia el vecino elegido
+        return float(self._edge_cost[self.arrays.neighbor_edge[cur_idx, action]])
 
     def _compute_progress(self, next_node: int) -> float:
         # determinar target actual (waypoint o destino)
@@ -219,27 +276,117 @@ class WaypointNavigationEnv(gym.Env):
         return done, truncated, info
 
     def _finalize_step(self, reward, done, truncated, info):
-        """Genera la observación e info de salida."""
+        """Genera la observación e info de salida (camino completo sólo al terminar)."""
         obs = self._get_obs()
-        info.update({
-            "path": self.path_history.copy(),
-            "remaining_waypoints": list(self.remaining_waypoints),
-            "current_node": self.current_node,
-            "travel_time": self.total_travel_time,
-        })
+        info["current_node"] = self.current_node
+        info["travel_time"] = self.total_travel_time
+        if done or truncated or self.info_verbosity == "full":
+            info["path"] = self.path_history
+            info["remaining_waypoints"] = list(self.remaining_waypoints)
         return obs, float(reward), done, truncated, info
 
+    def _append_path(self, idx: int) -> None:
+        if self._path_len == len(self._path_buf):
+            # pasos más allá de max_steps (el llamador ignoró done): duplicar el buffer
+            self._path_buf = np.concatenate([self._path_buf, np.zeros_like(self._path_buf)])
+        self._path_buf[self._path_len] = idx
+        self._path_len += 1
+
+    @property
+    def path_history(self) -> List[int]:
+        """Nodos recorridos en el episodio (lista nueva en cada acceso)."""
+        nodes = self.arrays.nodes
+        return [nodes[i] for i in self._path_buf[: self._path_len]]
+
     def _neighbors(self, node: Optional[int]) -> List[int]:
-        return list(self.graph.neighbors(node)) if node in self.graph else []
+        idx = self.arrays.node_index.get(node)
+        if idx is None:
+            return []
+        return [self.arrays.nodes[j] for j in self.arrays.neighbors(idx)]
+
+    def _sp_weight(self) -> str:
+        # mismo peso que usan nx.astar_path_length (atributo "weight", 1 si falta)
+        # y nx.shortest_path_length en _sp_length
+        algorithm = self.env_cfg.get("shortest_path_algorithm", "astar")
+        if algorithm == "astar":
+            return "weight"
+        if algorithm == "dijkstra":
+            return self.weight_name
+        raise ValueError(f"Unknown algorithm: {algorithm}")
+
+    def _set_task(self, options: Dict[str, Any]) -> None:
+        """Aplica ``start`` / ``waypoints`` / ``destination`` de ``options``."""
+        start = options.get("start", self.start_node)
+        waypoints = self._as_waypoint_list(options.get("waypoints", self.waypoints))
+        destination = options.get("destination", self.destination)
+        missing = [n for n in (start, *waypoints, destination) if n not in self.arrays.node_index]
+        if missing:
+            raise ValueError(f"Nodos fuera del grafo: {missing}")
+        self.start_node = start
+        self.waypoints = waypoints
+        self.destination = destination
+
+    def _compute_target_distances(self):
+        """Distancias de todos los nodos hacia cada objetivo (waypoints + destino).
+
+        Un Dijkstra inverso por objetivo sobre el grafo transpuesto; después
+        progreso, observación, eficiencia y máscara son lecturas de arrays.
+        Nodos sin camino quedan en N, igual que NetworkXNoPath en _sp_length.
+        Los vectores de objetivos que siguen en la tarea se reutilizan entre
+        resets; sólo se calculan los de objetivos nuevos.
+        """
+        if self.distance_matrix is not None:
+            self._target_dist = {}
+            return
+        targets = [
+            t for t in dict.fromkeys([*self.waypoints, self.destination])
+            if t in self.arrays.node_index
+        ]
+        kept = {t: self._target_dist[t] for t in targets if t in self._target_dist}
+        new = [t for t in targets if t not in kept]
+        if new:
+            dist = self._reverse_dijkstra([self.arrays.node_index[t] for t in new])
+            for target, row in zip(new, dist):
+                kept[target] = row
+        self._target_dist = kept
+
+    def _reverse_dijkstra(self, target_indices: List[int]) -> np.ndarray:
+        """Distancias (una fila por objetivo) de todos los nodos hacia cada objetivo."""
+        dist = dijkstra(
+            self.context.reverse_csgraph(self._sp_weight()),
+            directed=True,
+            indices=target_indices,
+        )
+        dist[np.isinf(dist)] = float(self.arrays.n_nodes)
+        return dist
 
     def _sp_length(self, a: int, b: int) -> float:
         """Calculates the path using the configured algorithm."""
+        ia = self.arrays.node_index.get(a)
+        ib = self.arrays.node_index.get(b)
+        target_dist = self._target_dist.get(b)
+        if target_dist is not None and ia is not None:
+            return float(target_dist[ia])
+
         if self.distance_matrix is not None:
-            try:
-                # quick try: direct dict lookup
-                return float(self.distance_matrix.get(a, {}).get(b, np.inf))
-            except Exception:
-                pass
+            if ia is None or ib is None:
+                return float(np.inf)
+            return float(self.distance_matrix[ia, ib])
+
+        if ia is None or ib is None:
+            return self._search_length(a, b)
+        # fuera de los objetivos del episodio: búsqueda puntual, cacheada por par de índices
+        return self.sp_cache.get_or_compute(ia, ib, lambda: self._search_length(a, b))
+
+    def _search_length(self, a: int, b: int) -> float:
+        """Búsqueda de camino más corto de a a b, sin vectores ni caché."""
+        if self.graph is None:
+            # contexto sin grafo networkx (worker en memoria compartida): Dijkstra inverso
+            ia = self.arrays.node_index.get(a)
+            ib = self.arrays.node_index.get(b)
+            if ia is None or ib is None:
+                raise nx.NodeNotFound(f"Nodo {a if ia is None else b} no está en el grafo")
+            return float(self._reverse_dijkstra([ib])[0, ia])
 
         algorithm = self.env_cfg.get("shortest_path_algorithm", "astar")
         try:
@@ -263,110 +410,77 @@ class WaypointNavigationEnv(gym.Env):
             return float(self.graph.number_of_nodes())
         
     def _heuristic(self, u: int, v: int) -> float:
-        """Euclidian heuristic for A* https://www.geeksforgeeks.org/dsa/a-search-algorithm/"""
-        u_data = self.graph.nodes[u]
-        v_data = self.graph.nodes[v]
-        # La distancia euclidiana entre dos puntos es la longitud del segmento de línea entre ellos. Se puede calcular a partir de las coordenadas cartesianas de los puntos utilizando el teorema de Pitágoras.
-        return ((u_data['x'] - v_data['x'])**2 + (u_data['y'] - v_data['y'])**2)**0.5
+        """Heurística admisible para A*: haversine(u, v) * k, en unidades del peso de búsqueda.
+
+        k es el mínimo de peso / haversine sobre las aristas (precalculado una
+        vez por grafo en ``context.router``): con travel_time es 1 / velocidad
+        máxima, con length ~1, y con el peso por defecto (1 por arista)
+        1 / arista más larga. Ningún camino cuesta menos que k por su
+        distancia en línea recta, así que nunca sobreestima (ver src.utils.routing).
+        """
+        if self._router is None:
+            self._router = self.context.router(self._sp_weight())
+        index = self.arrays.node_index
+        return self._router.scale * self._router.straight_m(index[u], index[v])
     
-    def _calculate_max_distance(self) -> float:
-        if self.distance_matrix is not None:
-            try:
-                max_dist = 0.0
-                for source_dict in self.distance_matrix.values():
-                    if isinstance(source_dict, dict):
-                        for dist in source_dict.values():
-                            if isinstance(dist, (int, float)) and dist != np.inf:
-                                max_dist = max(max_dist, float(dist))
-                if max_dist > 0:
-                    return max_dist
-            except Exception:
-                pass
-        
-        nodes = list(self.graph.nodes(data=True))
-        if len(nodes) < 2:
-            return 1.0
-        
-        max_dist = 0.0
-        for i, (u, u_data) in enumerate(nodes):
-            ux = float(u_data.get("x", 0.0))
-            uy = float(u_data.get("y", 0.0))
-            for v, v_data in nodes[i+1:]:
-                vx = float(v_data.get("x", 0.0))
-                vy = float(v_data.get("y", 0.0))
-                dist = ((ux - vx)**2 + (uy - vy)**2)**0.5
-                max_dist = max(max_dist, dist)
-        
-        return max_dist if max_dist > 0 else 1.0
-        
-    # devuelve un diccionario con la información de la arista entre dos nodos
-    def _edge_data(self, u: int, v: int) -> Dict[str, Any]:
-        data = self.graph.get_edge_data(u, v, default={})
-        if isinstance(data, dict) and all(isinstance(k, int) for k in data.keys()):
-            if data:
-                entry = data.get(next(iter(data)), {})
-                return entry if isinstance(entry, dict) else {}
-        return data if isinstance(data, dict) else {}
-
     def _get_obs(self) -> np.ndarray:
-        cur_emb = self._emb(self.current_node)
-        dest_emb = self._emb(self.destination)
+        cur = self.arrays.node_index.get(self.current_node)
+        self._write_emb(self._obs_cur_emb, cur)
+        self._write_emb(self._obs_dest_emb, self.arrays.node_index.get(self.destination))
 
         if self.remaining_waypoints:
             wp_node = self.remaining_waypoints[0]
-            wp_emb = self._emb(wp_node)
+            self._write_emb(self._obs_wp_emb, self.arrays.node_index.get(wp_node))
             dist_wp = float(self._sp_length(self.current_node, wp_node))
         else:
             wp_node = None
-            wp_emb = np.zeros(self.embedding_dim, dtype=np.float32)
+            self._obs_wp_emb[:] = 0.0
             dist_wp = 0.0
 
         dist_dest = float(self._sp_length(self.current_node, self.destination))
 
         denom = self.max_distance if self.max_distance > 0 else 1.0
-        dist_dest_norm = dist_dest / denom
-        dist_wp_norm = dist_wp / denom
 
         efficiency_info = self._get_efficiency_info()
-        scalar_feats = np.array(
-            [
-                dist_dest_norm,
-                dist_wp_norm,
-                self.steps_taken / self.max_steps,
-                efficiency_info["wp_efficiency"],
-                efficiency_info["dest_efficiency"],
-                efficiency_info["steps_vs_optimal_wp"],
-                efficiency_info["steps_vs_optimal_dest"],
-            ],
-            dtype=np.float32,
+        self._obs_scalars[:] = (
+            dist_dest / denom,
+            dist_wp / denom,
+            self.steps_taken / self.max_steps,
+            efficiency_info["wp_efficiency"],
+            efficiency_info["dest_efficiency"],
+            efficiency_info["steps_vs_optimal_wp"],
+            efficiency_info["steps_vs_optimal_dest"],
         )
 
-        neighbors = list(self.graph.neighbors(self.current_node))
-        neigh_dist_dest = np.zeros(self.max_actions, dtype=np.float32)
-        neigh_dist_wp = np.zeros(self.max_actions, dtype=np.float32)
-
-        for i, nb in enumerate(neighbors[: self.max_actions]):
-            d_dest = float(self._sp_length(nb, self.destination))
-            neigh_dist_dest[i] = d_dest / denom
-
-            if wp_node is not None:
-                d_wp = float(self._sp_length(nb, wp_node))
-                neigh_dist_wp[i] = d_wp / denom
-            else:
-                neigh_dist_wp[i] = 0.0
-
-        obs = np.concatenate(
-            [
-                cur_emb,
-                dest_emb,
-                wp_emb,
-                scalar_feats,
-                neigh_dist_dest,
-                neigh_dist_wp,
-            ]
-        ).astype(np.float32)
-
-        return obs
+        # distancias de los vecinos a los objetivos por indexado sobre la tabla de vecinos
+        self._obs_neigh_dest[:] = 0.0
+        self._obs_neigh_wp[:] = 0.0
+        if cur is not None:
+            neighbors = self.arrays.neighbors(cur)
+            n = len(neighbors)
+            if n:
+                self._obs_neigh_dest[:n] = self._distances_to(self.destination, neighbors) / denom
+                if wp_node is not None:
+                    self._obs_neigh_wp[:n] = self._distances_to(wp_node, neighbors) / denom
+
+        return self._obs_buf.copy()
+
+    def _distances_to(self, target: int, sources: np.ndarray) -> np.ndarray:
+        """Distancias (float64) desde los índices `sources` hasta `target`."""
+        target_dist = self._target_dist.get(target)
+        if target_dist is not None:
+            return target_dist[sources]
+        t = self.arrays.node_index.get(target)
+        if self.distance_matrix is not None and t is not None:
+            return np.asarray(self.distance_matrix[sources, t], dtype=np.float64)
+        nodes = self.arrays.nodes
+        return np.array([self._sp_length(nodes[i], target) for i in sources], dtype=np.float64)
+
+    def _write_emb(self, out: np.ndarray, idx: Optional[int]) -> None:
+        if idx is None or self.embedding_dim == 0:
+            out[:] = 0.0
+        else:
+            out[:] = self.embedding_matrix[idx]
 
 
     def _calculate_optimal_steps(self):
@@ -375,12 +489,12 @@ class WaypointNavigationEnv(gym.Env):
         current = self.current_node if self.current_node is not None else self.start_node
         
         for wp in self.waypoints:
-            if wp in self.graph.nodes:
+            if wp in self.arrays.node_index:
                 sp_dist = self._sp_length(current, wp)
                 self.optimal_steps_to_waypoints[wp] = max(1, int(sp_dist))
                 current = wp
         
-        if self.destination in self.graph.nodes:
+        if self.destination in self.arrays.node_index:
             if self.waypoints:
                 last_wp = self.waypoints[-1]
                 sp_dist = self._sp_length(last_wp, self.destination)
@@ -422,10 +536,3 @@ class WaypointNavigationEnv(gym.Env):
                 info['dest_efficiency'] = min(1.0, optimal_steps / max(estimated_total_steps, 1.0))
         
         return info
-
-    def _emb(self, node: Optional[int]) -> np.ndarray:
-        if node is None or self.embedding_dim == 0:
-            return np.zeros(self.embedding_dim, dtype=np.float32)
-        vec = self.node_embeddings.get(str(node))
-        return np.asarray(vec, dtype=np.float32) if vec is not None else np.zeros(self.embedding_dim, dtype=np.float32)
-
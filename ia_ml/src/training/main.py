@@ -9,6 +9,9 @@ import networkx as nx
 import numpy as np
 import torch
 
+from sb3_contrib import MaskablePPO
+from sb3_contrib.common.maskable.callbacks import MaskableEvalCallback
+from sb3_contrib.common.maskable.utils import get_action_masks
 from stable_baselines3 import PPO
 from stable_baselines3.common.callbacks import (
     EvalCallback, 
@@ -17,24 +20,147 @@ from stable_baselines3.common.callbacks import (
     CallbackList
 )
 from stable_baselines3.common.monitor import Monitor
-from src.envs import create_masked_waypoint_env 
-from src.envs.reward_normalizer import VC2Normalizer
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv, VecEnv, VecMonitor
+from src.envs import (
+    BatchedWaypointNavigationEnv,
+    GraphContext,
+    SharedGraphContext,
+    TaskSampler,
+    TaskSamplingWrapper,
+    create_masked_waypoint_env,
+)
+from src.envs.shared_context import DEFAULT_EDGE_COLUMNS
+from src.envs.reward_normalizer import VC2Normalizer, VC2VecNormalizer
 from src.data.download_graph import (
     get_graph_relabel,
     load_graph_from_graphml,
     relabel_nodes_to_indices,
     load_distances_if_present,
+    attach_distances,
 )
 from src.utils.config_loader import load_config
 from src.utils.embeddings import build_node_embeddings 
 
 
-def make_env(graph, start_node, waypoints, destination, environment_cfg: Dict, rewards_cfg: Dict):
-    base = create_masked_waypoint_env(graph, waypoints, start_node, destination, environment_cfg, rewards_cfg)
-    gamma = get_float(rewards_cfg, "norm_gamma", 0.99)
-    clip = get_float(rewards_cfg, "norm_clip", 10.0)
-    scale = get_float(rewards_cfg, "norm_scale", 1.0)
-    return VC2Normalizer(base, gamma=gamma, clip_range=clip, scale=scale)
+def make_env(
+    graph,
+    start_node,
+    waypoints,
+    destination,
+    environment_cfg: Dict,
+    rewards_cfg: Dict,
+    context: GraphContext | None = None,
+    tasks_cfg: Dict | None = None,
+    task_seed: int | np.random.SeedSequence | None = None,
+):
+    base = create_masked_waypoint_env(
+        graph, waypoints, start_node, destination, environment_cfg, rewards_cfg, context=context
+    )
+    if get_bool(tasks_cfg or {}, "random", False):
+        # una tarea aleatoria por episodio (la ruta fija queda como default de options)
+        base = TaskSamplingWrapper(base, TaskSampler.from_config(base.unwrapped.context, tasks_cfg, seed=task_seed))
+    return VC2Normalizer(base, **vc2_kwargs(rewards_cfg))
+
+
+def vc2_kwargs(rewards_cfg: Dict) -> Dict[str, float]:
+    return dict(
+        gamma=get_float(rewards_cfg, "norm_gamma", 0.99),
+        clip_range=get_float(rewards_cfg, "norm_clip", 10.0),
+        scale=get_float(rewards_cfg, "norm_scale", 1.0),
+    )
+
+
+def eval_task_seed(eval_seed: int) -> np.random.SeedSequence:
+    """Semilla de las tareas de evaluación, en un flujo aparte del de entrenamiento.
+
+    Los workers siembran su muestreador con enteros (seed + índice); un hijo
+    de ``SeedSequence(eval_seed)`` nunca reproduce esas secuencias, así la
+    evaluación no repite las tareas de ningún worker.
+    """
+    return np.random.SeedSequence(eval_seed).spawn(1)[0]
+
+
+def make_env_fn(
+    rank: int,
+    seed: int,
+    monitor_dir: str,
+    start_node,
+    waypoints,
+    destination,
+    environment_cfg: Dict,
+    rewards_cfg: Dict,
+    context: GraphContext | None = None,
+    handle=None,
+    tasks_cfg: Dict | None = None,
+):
+    """Constructor de un worker: env enmascarado + VC2 + Monitor propio.
+
+    Con `handle` (SharedGraphContextHandle) el worker se adjunta a la memoria
+    compartida y la closure no arrastra el grafo al picklearse.
+    """
+    def _init():
+        ctx = handle.attach() if handle is not None else context
+        # RNG global del proceso: lo usa el reemplazo de acciones del wrapper
+        np.random.seed(seed + rank)
+        env = make_env(ctx.graph, start_node, waypoints, destination, environment_cfg, rewards_cfg, ctx, tasks_cfg)
+        env = Monitor(env, os.path.join(monitor_dir, f"worker_{rank}"))
+        env.action_space.seed(seed + rank)
+        return env
+    return _init
+
+
+def build_vec_env(
+    context: GraphContext,
+    start_node,
+    waypoints,
+    destination,
+    environment_cfg: Dict,
+    rewards_cfg: Dict,
+    ppo_cfg: Dict[str, Any],
+    monitor_dir: str,
+    tasks_cfg: Dict[str, Any] | None = None,
+) -> Tuple[VecEnv, SharedGraphContext | None]:
+    """VecEnv de entrenamiento según `ppo.n_envs` y `ppo.vec_env` (dummy | subproc | batched).
+
+    En modo subproc el contexto del grafo se publica en memoria compartida;
+    el llamador debe cerrar el SharedGraphContext devuelto al terminar. En
+    modo batched los n_envs episodios avanzan juntos en arrays numpy dentro
+    de este proceso (VC2 y Monitor a nivel de VecEnv). Con `tasks.random`
+    cada worker muestrea una tarea por episodio (semilla seed + índice).
+    """
+    n_envs = max(1, get_int(ppo_cfg, "n_envs", 1))
+    kind = str(ppo_cfg.get("vec_env", "dummy")).lower()
+    seed = get_int(ppo_cfg, "seed", 0)
+    common = (seed, monitor_dir, start_node, waypoints, destination, environment_cfg, rewards_cfg)
+
+    shared = None
+    if kind == "subproc":
+        weight_name = rewards_cfg.get("weight_name", "travel_time")
+        shared = SharedGraphContext(context, edge_columns=(*DEFAULT_EDGE_COLUMNS, weight_name))
+        try:
+            vec_env = SubprocVecEnv(
+                [make_env_fn(rank, *common, handle=shared.handle, tasks_cfg=tasks_cfg) for rank in range(n_envs)]
+            )
+        except BaseException:
+            shared.close()
+            raise
+    elif kind == "dummy":
+        vec_env = DummyVecEnv([make_env_fn(rank, *common, context=context, tasks_cfg=tasks_cfg) for rank in range(n_envs)])
+    elif kind == "batched":
+        if get_bool(tasks_cfg or {}, "random", False):
+            raise ValueError("ppo.vec_env 'batched' comparte una tarea por lote: no admite tasks.random")
+        vec_env = BatchedWaypointNavigationEnv(
+            context, start_node, waypoints, destination, n_envs, environment_cfg, rewards_cfg
+        )
+        vec_env = VC2VecNormalizer(vec_env, **vc2_kwargs(rewards_cfg))
+        vec_env = VecMonitor(vec_env, os.path.join(monitor_dir, "batched"))
+    else:
+        raise ValueError(f"ppo.vec_env desconocido: {kind} (usar 'dummy', 'subproc' o 'batched')")
+
+    # semillas por worker: seed + índice en el próximo reset
+    vec_env.seed(seed)
+    print(f"Entornos de entrenamiento: {n_envs} ({kind})")
+    return vec_env, shared
 
 
 def get_config_path() -> Path:
@@ -93,27 +219,13 @@ def load_graph_from_cfg(cfg: Dict[str, Any]) -> nx.MultiDiGraph:
             raise ValueError("Config 'graph.path' requerido cuando source == 'file'")
         print(f"Cargando grafo desde archivo: {path}")
         G_osm = load_graph_from_graphml(path)
+        G_relabeled, node_to_idx, idx_to_node = relabel_nodes_to_indices(G_osm)
+
+        # distancias precalculadas: .npy (memmap en orden de índice) o .pkl legacy
         distances_path = graph_cfg.get("distances_path") or ""
         if distances_path:
-            distances = load_distances_if_present(distances_path)
-            if distances is not None:
-                G_osm.graph["distances"] = distances
-        G_relabeled, node_to_idx, idx_to_node = relabel_nodes_to_indices(G_osm)
-        
-        # Convertir distancias de IDs originales a índices relabeled
-        if "distances" in G_osm.graph:
-            converted = {}
-            for orig_u, dist_dict in G_osm.graph["distances"].items():
-                u_idx = node_to_idx.get(orig_u)
-                if u_idx is None:
-                    continue
-                converted[u_idx] = {}
-                for orig_v, d in dist_dict.items():
-                    v_idx = node_to_idx.get(orig_v)
-                    if v_idx is None:
-                        continue
-                    converted[u_idx][v_idx] = float(d)
-            G_relabeled.graph["distances"] = converted
+            distances = load_distances_if_present(distances_path, list(G_osm.nodes()))
+            attach_distances(G_relabeled, distances, node_to_idx)
         
         return G_relabeled
     place = graph_cfg.get("place") or "Río Cuarto, Cordoba, Argentina"
@@ -153,9 +265,34 @@ def build_policy_kwargs(ppo_cfg: Dict[str, Any]) -> Dict[str, Any]:
     return dict(net_arch=list(net_arch)) if net_arch is not None else {}
 
 
+ALGORITHMS = {"ppo": PPO, "maskable_ppo": MaskablePPO}
+
+
+def get_algorithm_class(ppo_cfg: Dict[str, Any]):
+    """Clase de SB3 según `ppo.algorithm`: "ppo" o "maskable_ppo" (usa action_masks() del env)."""
+    name = str(ppo_cfg.get("algorithm", "ppo")).lower()
+    if name not in ALGORITHMS:
+        raise ValueError(f"ppo.algorithm desconocido: {name} (usar {' | '.join(ALGORITHMS)})")
+    return ALGORITHMS[name]
+
+
+def load_trained_model(path: str, **kwargs):
+    """Carga un .zip detectando la clase por la política guardada, no por la config.
+
+    MaskablePPO.load rechaza (ValueError) una política que no sea
+    MaskableActorCriticPolicy; en ese caso el modelo es un PPO común.
+    """
+    try:
+        return MaskablePPO.load(path, **kwargs)
+    except ValueError:
+        return PPO.load(path, **kwargs)
+
+
 def build_model(env, ppo_cfg: Dict[str, Any], policy_kwargs: Dict[str, Any], device: str, tensorboard_log: str | None = None) -> PPO:
+    seed = ppo_cfg.get("seed")
     policy = ppo_cfg.get("policy", "MlpPolicy")
-    return PPO(
+    algorithm = get_algorithm_class(ppo_cfg)
+    return algorithm(
         policy,
         env,
         learning_rate=get_float(ppo_cfg, "learning_rate", 3e-4),
@@ -171,6 +308,7 @@ def build_model(env, ppo_cfg: Dict[str, Any], policy_kwargs: Dict[str, Any], dev
         verbose=get_int(ppo_cfg, "verbose", 1),
         device=device,
         tensorboard_log=tensorboard_log,
+        seed=int(seed) if seed is not None else None,
     )
 
 
@@ -180,6 +318,9 @@ class DebugCallback(BaseCallback):
     - Path recorrido
     - Waypoints que faltan
     - Si pasó por el destino final
+
+    Con varios entornos (VecEnv) muestra el último episodio terminado en
+    cualquiera de ellos e indica de qué worker vino.
     """
     def __init__(self, verbose: int = 0, debug_freq: int = 1000):
         super().__init__(verbose)
@@ -190,8 +331,14 @@ class DebugCallback(BaseCallback):
         self.last_episode_current_node = None
         self.last_episode_terminated_reason = None
         self.last_episode_info = None
+        self.last_episode_env = None
         self.episode_count = 0
+        self.episodes_per_env = np.zeros(1, dtype=np.int64)
         self.last_debug_step = 0
+
+    def _init_callback(self) -> None:
+        n_envs = getattr(self.training_env, "num_envs", 1) if self.training_env is not None else 1
+        self.episodes_per_env = np.zeros(n_envs, dtype=np.int64)
     
     def _on_step(self) -> bool:
         # Acceder a información del paso actual
@@ -208,7 +355,10 @@ class DebugCallback(BaseCallback):
                 self.last_episode_current_node = info.get("current_node", None)
                 self.last_episode_terminated_reason = info.get("terminated_reason", None)
                 self.last_episode_info = info.copy()  # Guardar info completo para debug
+                self.last_episode_env = i
                 self.episode_count += 1
+                if i < len(self.episodes_per_env):
+                    self.episodes_per_env[i] += 1
         
         # Mostrar debug cada debug_freq pasos
         if self.num_timesteps - self.last_debug_step >= self.debug_freq:
@@ -218,6 +368,11 @@ class DebugCallback(BaseCallback):
             if self.last_episode_path is not None:
                 print("\n" + "=" * 80)
                 print(f"[DEBUG] Paso {self.num_timesteps} | Episodio #{self.episode_count}")
+                if len(self.episodes_per_env) > 1:
+                    print(
+                        f"Entorno #{self.last_episode_env} | "
+                        f"episodios por entorno: {self.episodes_per_env.tolist()}"
+                    )
                 print("=" * 80)
                 
                 # Mostrar path (truncar si es muy largo)
@@ -270,12 +425,15 @@ class DebugCallback(BaseCallback):
 class PushValueStatsCallback(BaseCallback):
     """Callback que empuja las predicciones del crítico (values) al normalizador VC2.
 
-    Debe inicializarse con la instancia del normalizador que envuelve el env base
-    (es decir, la que devuelve `make_env`). En `on_rollout_end` accede al
-    `rollout_buffer` del modelo y extrae los `values` para actualizar
-    `rms_value` vía `push_value_batch`.
+    `normalizer` puede ser la instancia del normalizador que envuelve el env
+    base (la que devuelve `make_env`), un VecEnv de normalizadores (uno por
+    worker, p. ej. SubprocVecEnv) o un VecEnv con VC2VecNormalizer; si es
+    None se usa `training_env`. En `on_rollout_end` se extraen los `values`
+    del `rollout_buffer` y se actualiza `rms_value` vía `push_value_batch`;
+    en un VecEnv de normalizadores cada worker recibe la columna de sus
+    propios values.
     """
-    def __init__(self, normalizer, verbose: int = 0):
+    def __init__(self, normalizer=None, verbose: int = 0):
         super().__init__(verbose)
         self.normalizer = normalizer
 
@@ -284,7 +442,7 @@ class PushValueStatsCallback(BaseCallback):
         return True
 
     def _on_rollout_end(self) -> None:
-        # SB3 almacena los valores predichos en rollout_buffer.values (torch tensor)
+        # SB3 almacena los valores predichos en rollout_buffer.values (n_steps x n_envs)
         try:
             buf = getattr(self.model, "rollout_buffer", None)
             if buf is None:
@@ -292,35 +450,90 @@ class PushValueStatsCallback(BaseCallback):
             values = None
             # rollout_buffer may store 'values' or 'values_preds'
             if hasattr(buf, "values"):
-                # Torch tensor
                 values = buf.values
             elif hasattr(buf, "value_preds"):
                 values = buf.value_preds
             if values is None:
                 return
-            # convert to numpy and push
-            vals_np = values.cpu().numpy().ravel()
-            self.normalizer.push_value_batch(vals_np)
+            # numpy en SB3; tensor torch en buffers personalizados
+            vals_np = values.cpu().numpy() if hasattr(values, "cpu") else np.asarray(values)
+
+            target = self.normalizer if self.normalizer is not None else self.training_env
+            if hasattr(target, "push_value_batch"):
+                target.push_value_batch(vals_np.ravel())
+            elif hasattr(target, "env_method"):
+                n_envs = target.num_envs
+                vals_np = vals_np.reshape(-1, n_envs)
+                for i in range(n_envs):
+                    target.env_method("push_value_batch", vals_np[:, i], indices=i)
         except Exception as e:
             if self.verbose:
                 print(f"PushValueStatsCallback error: {e}")
 
 
-def build_callbacks(eval_env, eval_cfg: Dict[str, Any], debug_freq: int = 1000) -> Tuple[EvalCallback, DebugCallback]:
+class ShortestPathCacheCallback(BaseCallback):
+    """Registra en TensorBoard los contadores de la caché LRU de caminos (`sp_cache/*`).
+
+    Los envs del mismo proceso comparten una caché: se suman los contadores
+    de cada caché distinta una sola vez.
+    """
+
+    def _on_step(self) -> bool:
+        return True
+
+    def _on_rollout_end(self) -> None:
+        try:
+            reported = self.training_env.env_method("sp_cache_stats")
+        except AttributeError:
+            # VecEnv sin ActionMaskingWrapper (p. ej. batched)
+            return
+        caches = dict(reported)
+        totals = {key: sum(stats[key] for stats in caches.values()) for key in ("hits", "misses", "evictions", "size")}
+        lookups = totals["hits"] + totals["misses"]
+        for key, value in totals.items():
+            self.logger.record(f"sp_cache/{key}", value)
+        self.logger.record("sp_cache/hit_rate", totals["hits"] / lookups if lookups else 0.0)
+
+
+class RewindEvalTasksCallback(BaseCallback):
+    """Tras cada evaluación rebobina el muestreador de tareas del env de evaluación.
+
+    Con `tasks.random` el env de evaluación tiene su propia semilla; al
+    rebobinarla todas las evaluaciones corren sobre las mismas tareas y
+    best model / early stopping comparan resultados comparables.
+    """
+
+    def _on_step(self) -> bool:
+        self.parent.eval_env.env_method("rewind_tasks")
+        return True
+
+
+def build_callbacks(
+    eval_env,
+    eval_cfg: Dict[str, Any],
+    debug_freq: int = 1000,
+    n_envs: int = 1,
+    maskable: bool = False,
+    random_tasks: bool = False,
+) -> Tuple[EvalCallback, DebugCallback]:
     early_cfg = eval_cfg.get("early_stop", {})
     stop_callback = StopTrainingOnNoModelImprovement(
         max_no_improvement_evals=get_int(early_cfg, "max_no_improvement_evals", 8),
         min_evals=get_int(early_cfg, "min_evals", 3),
         verbose=get_int(early_cfg, "verbose", 1),
     )
-    eval_callback = EvalCallback(
+    after_eval = CallbackList([stop_callback, RewindEvalTasksCallback()]) if random_tasks else stop_callback
+    # con MaskablePPO la evaluación también usa las máscaras del entorno
+    eval_class = MaskableEvalCallback if maskable else EvalCallback
+    eval_callback = eval_class(
         eval_env,
         best_model_save_path=eval_cfg.get("best_model_save_path", "./logs/best_model_masked/"),
         log_path=eval_cfg.get("log_path", "./logs/results_masked/"),
-        eval_freq=get_int(eval_cfg, "eval_freq", 5000),
+        # eval_freq se cuenta en llamadas a step() del VecEnv (n_envs pasos cada una)
+        eval_freq=max(get_int(eval_cfg, "eval_freq", 5000) // max(1, n_envs), 1),
         n_eval_episodes=get_int(eval_cfg, "n_eval_episodes", 5),
         deterministic=get_bool(eval_cfg, "deterministic", True),
-        callback_after_eval=stop_callback,
+        callback_after_eval=after_eval,
         verbose=get_int(eval_cfg, "verbose", 1),
     )
     debug_callback = DebugCallback(verbose=1, debug_freq=debug_freq)
@@ -343,8 +556,14 @@ def unwrap_env(env):
         break
     return e
 
-def demo_episode(env, model: PPO, waypoints: list[int], destination: int, max_steps: int) -> None:
-    obs, info = env.reset()
+def demo_episode(
+    env, model: PPO, waypoints: list[int], destination: int, max_steps: int, start_node: int | None = None
+) -> None:
+    # tarea explícita: con tasks.random el entorno muestrearía otra
+    options = {"waypoints": waypoints, "destination": destination}
+    if start_node is not None:
+        options["start"] = start_node
+    obs, info = env.reset(options=options)
     done = False
     truncated = False
     total_reward = 0.0
@@ -357,7 +576,10 @@ def demo_episode(env, model: PPO, waypoints: list[int], destination: int, max_st
     print(f"Max steps: {max_steps}\n")
 
     for step in range(max_steps * 2):
-        action, _ = model.predict(obs, deterministic=True)
+        if isinstance(model, MaskablePPO):
+            action, _ = model.predict(obs, deterministic=True, action_masks=get_action_masks(env))
+        else:
+            action, _ = model.predict(obs, deterministic=True)
         obs, reward, done, truncated, info = env.step(action)
         total_reward += reward
         if step < 15 or done or truncated:
@@ -367,7 +589,8 @@ def demo_episode(env, model: PPO, waypoints: list[int], destination: int, max_st
         if done or truncated:
             break
 
-    path = info.get("path", [])
+    # info trae el camino en el paso terminal; si se cortó antes, leerlo del entorno
+    path = info.get("path") or getattr(inner, "path_history", [])
     print("\n" + "=" * 60)
     if done:
         print(f"Éxito en {len(path)} pasos")
@@ -399,12 +622,19 @@ def main() -> None:
     if tensorboard_log:
         os.makedirs(tensorboard_log, exist_ok=True)
 
-    # construir entornos 
-    base_env = make_env(graph, start_node, waypoints, destination, environment_cfg, rewards_cfg)
-    base_eval_env = make_env(graph, start_node, waypoints, destination, environment_cfg, rewards_cfg)
+    # construir entornos sobre un único contexto compartido (embeddings, CSR, distancias)
+    context = GraphContext.from_config(graph, environment_cfg)
+    tasks_cfg = cfg.get("tasks", {})
+    env, shared_context = build_vec_env(
+        context, start_node, waypoints, destination, environment_cfg, rewards_cfg, ppo_cfg, train_log_dir, tasks_cfg
+    )
+    # evaluación con semilla fija de tareas (rebobinada tras cada evaluación)
+    base_eval_env = make_env(
+        graph, start_node, waypoints, destination, environment_cfg, rewards_cfg, context, tasks_cfg,
+        task_seed=eval_task_seed(get_int(tasks_cfg, "eval_seed", 0)),
+    )
     
-    # envolver entornos con Monitor para registrar recompensas
-    env = Monitor(base_env, train_log_dir)
+    # envolver entorno de evaluación con Monitor para registrar recompensas
     eval_env = Monitor(base_eval_env, eval_log_dir)
 
     # modelo
@@ -419,15 +649,23 @@ def main() -> None:
     # entrenamiento
     total_timesteps = get_int(ppo_cfg, "total_timesteps", 250_000)
     # callbacks
-    eval_callback, debug_callback = build_callbacks(eval_env, eval_cfg, debug_freq=1000)
-    # PushValueStatsCallback needs the original normalizer instance (base_env)
-    push_value_callback = PushValueStatsCallback(normalizer=base_env, verbose=0)
-    callback_list = CallbackList([eval_callback, debug_callback, push_value_callback])
-    model.learn(total_timesteps=total_timesteps, callback=callback_list, progress_bar=True)
-    model.save("ppo_waypoint_masked")
-
-    # demo breve
-    demo_episode(env, model, waypoints, destination, max_steps)
+    eval_callback, debug_callback = build_callbacks(
+        eval_env, eval_cfg, debug_freq=1000, n_envs=env.num_envs, maskable=isinstance(model, MaskablePPO),
+        random_tasks=get_bool(tasks_cfg, "random", False),
+    )
+    # PushValueStatsCallback reparte los values entre los normalizadores de cada worker
+    push_value_callback = PushValueStatsCallback(normalizer=env, verbose=0)
+    callback_list = CallbackList([eval_callback, debug_callback, push_value_callback, ShortestPathCacheCallback()])
+    try:
+        model.learn(total_timesteps=total_timesteps, callback=callback_list, progress_bar=True)
+        model.save("ppo_waypoint_masked")
+    finally:
+        env.close()
+        if shared_context is not None:
+            shared_context.close()
+
+    # demo breve (entorno de evaluación, no vectorizado)
+    demo_episode(eval_env, model, waypoints, destination, max_steps, start_node=start_node)
 
 
 if __name__ == "__main__":
@@ -12,13 +12,16 @@ import glob
 
 import matplotlib.pyplot as plt
 import networkx as nx
+import numpy as np
 import osmnx as ox
 
 # Habilitar imports relativos cuando se ejecuta como script
 sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
 
 from src.data.download_graph import get_graph_relabel, indices_to_osm_nodes, load_subgraph_from_file 
-from src.training.run_inference import run_episode
+from src.envs import GraphContext
+from src.training.run_inference import load_env_configs, run_episode
+from src.utils.graph_arrays import GraphArrays
 from pathlib import Path  
 
 
@@ -117,30 +120,42 @@ def compute_osm_route(G_osm: nx.MultiDiGraph, node_sequence: List[int]) -> List[
     return route
 
 
-def _edge_attr_list(edge_data: object) -> List[Dict[str, float]]:
-    if not isinstance(edge_data, dict):
-        return []
-    if all(isinstance(val, dict) for val in edge_data.values()):
-        return [attrs for attrs in edge_data.values()]
-    return [edge_data]
+def _min_present(values: np.ndarray) -> Optional[float]:
+    present = values[~np.isnan(values)]
+    return float(present.min()) if present.size else None
 
 
-def compute_path_metrics(G_osm: nx.MultiDiGraph, path_nodes: List[int]) -> Tuple[float, float]:
+def compute_path_metrics(
+    G_osm: nx.MultiDiGraph,
+    path_nodes: List[int],
+    arrays: Optional[GraphArrays] = None,
+) -> Tuple[float, float]:
+    """(travel_time, length) totales del camino leyendo la tabla de aristas.
+
+    entre aristas paralelas se toma el mínimo de cada atributo; si falta uno
+    se usa el otro. ``arrays`` permite reutilizar el CSR de ``G_osm``.
+    """
+    if arrays is None:
+        arrays = GraphArrays(G_osm)
+    edges = arrays.edge_features
     travel_total = 0.0
     length_total = 0.0
     for u, v in zip(path_nodes, path_nodes[1:]):
-        attrs_list = _edge_attr_list(G_osm.get_edge_data(u, v, default={}))
-        if not attrs_list:
+        iu, iv = arrays.node_index.get(u), arrays.node_index.get(v)
+        if iu is None or iv is None:
+            parallel = np.empty(0, dtype=np.int64)
+        else:
+            lo, hi = arrays.indptr[iu], arrays.indptr[iu + 1]
+            parallel = lo + np.flatnonzero(arrays.indices[lo:hi] == iv)
+        if parallel.size == 0:
             try:
                 travel = float(nx.shortest_path_length(G_osm, u, v, weight="travel_time"))
             except (nx.NetworkXNoPath, nx.NetworkXError):
                 travel = float(nx.shortest_path_length(G_osm, u, v, weight="length"))
             length = travel
         else:
-            travel_candidates = [float(attr["travel_time"]) for attr in attrs_list if "travel_time" in attr]
-            length_candidates = [float(attr["length"]) for attr in attrs_list if "length" in attr]
-            travel = min(travel_candidates) if travel_candidates else None
-            length = min(length_candidates) if length_candidates else None
+            travel = _min_present(edges.travel_time_attr[parallel])
+            length = _min_present(edges.length[parallel])
             if travel is None and length is not None:
                 travel = length
             if length is None and travel is not None:
@@ -251,8 +266,15 @@ def find_best_model(
     max_steps: Optional[int],
     deterministic: bool,
     verbose: bool,
+    osm_arrays: Optional[GraphArrays] = None,
+    graph_relabel: Optional[nx.MultiDiGraph] = None,
+    node_to_idx: Optional[Dict[int, int]] = None,
+    context: Optional[GraphContext] = None,
 ) -> Tuple[str, float]:
     """evalúa múltiples modelos y retorna el que tenga menor diferencia con osm.
+
+    el grafo relabelado y su GraphContext se cargan una sola vez y se
+    reutilizan para todos los modelos candidatos.
     
     returns:
         (best_model_path, best_difference_in_meters)
@@ -301,16 +323,22 @@ def find_best_model(
         "deterministic": deterministic,
         "verbose": False,  # silenciar durante evaluación
     }
-    if subgraph_path:
+    if graph_relabel is not None:
+        episode_base_kwargs.update(graph=graph_relabel, node_to_idx=node_to_idx, idx_to_node=idx_to_node)
+    elif subgraph_path:
         episode_base_kwargs["subgraph_path"] = subgraph_path
     else:
         episode_base_kwargs["place"] = place
+    if context is not None:
+        episode_base_kwargs["context"] = context
     
     # convertir índices a nodos osm para calcular ruta óptima
     seq_indices = [start_idx, *waypoints, destination_idx]
     seq_osm = convert_indices(seq_indices, idx_to_node)
     osm_nodes = compute_osm_route(G_osm, seq_osm)
-    osm_metrics = compute_path_metrics(G_osm, osm_nodes)
+    if osm_arrays is None:
+        osm_arrays = GraphArrays(G_osm)
+    osm_metrics = compute_path_metrics(G_osm, osm_nodes, osm_arrays)
     osm_length = osm_metrics[1]
     
     # evaluar cada modelo
@@ -320,6 +348,15 @@ def find_best_model(
             episode_kwargs["model_path"] = str(model_file)
             
             rl_result = run_episode(**episode_kwargs)
+            # reutilizar grafo y contexto del primer episodio en los siguientes
+            episode_base_kwargs.pop("subgraph_path", None)
+            episode_base_kwargs.pop("place", None)
+            episode_base_kwargs.update(
+                graph=rl_result["graph"],
+                node_to_idx=rl_result["node_to_idx"],
+                idx_to_node=rl_result["idx_to_node"],
+                context=rl_result["context"],
+            )
             rl_indices = rl_result["path"]
             
             if len(rl_indices) < 2:
@@ -328,7 +365,7 @@ def find_best_model(
                 continue
             
             rl_osm_nodes = convert_indices(rl_indices, rl_result["idx_to_node"])
-            rl_metrics = compute_path_metrics(G_osm, rl_osm_nodes)
+            rl_metrics = compute_path_metrics(G_osm, rl_osm_nodes, osm_arrays)
             rl_length = rl_metrics[1]
             
             diff = abs(rl_length - osm_length)
@@ -380,7 +417,16 @@ def main() -> None:
         graph_relabel, node_to_idx, idx_to_node = load_subgraph_from_file(str(subgraph_path))
     else:
         # Cargar desde localidad (comportamiento original)
-        _, node_to_idx, idx_to_node, G_osm = get_graph_relabel(args.place, return_original=True)
+        graph_relabel, node_to_idx, idx_to_node, G_osm = get_graph_relabel(args.place, return_original=True)
+
+    # CSR + tabla de aristas de G_osm para las métricas de los caminos
+    osm_arrays = GraphArrays(G_osm)
+    # contexto compartido por todos los episodios RL sobre el grafo relabelado
+    context = (
+        GraphContext.from_config(graph_relabel, load_env_configs()[0])
+        if args.compare or (args.path is None and not args.osm_route)
+        else None
+    )
 
     base_start_idx = args.start
     base_dest_idx = args.destination if args.destination not in (None, -1) else max(idx_to_node.keys())
@@ -419,6 +465,10 @@ def main() -> None:
                 max_steps=args.max_steps,
                 deterministic=args.deterministic,
                 verbose=args.verbose,
+                osm_arrays=osm_arrays,
+                graph_relabel=graph_relabel,
+                node_to_idx=node_to_idx,
+                context=context,
             )
             if args.verbose:
                 print(f"\n[INFO] Mejor modelo encontrado: {best_model_path}")
@@ -434,23 +484,23 @@ def main() -> None:
             "max_steps": args.max_steps,
             "deterministic": args.deterministic,
             "verbose": args.verbose,
+            "graph": graph_relabel,
+            "node_to_idx": node_to_idx,
+            "idx_to_node": idx_to_node,
+            "context": context,
         }
-        if args.subgraph:
-            episode_kwargs["subgraph_path"] = str(subgraph_path)
-        else:
-            episode_kwargs["place"] = args.place
         
         rl_result = run_episode(**episode_kwargs)
         rl_indices = rl_result["path"]
         if len(rl_indices) < 2:
             raise RuntimeError("El modelo no devolvió un camino válido para graficar")
         rl_osm_nodes = convert_indices(rl_indices, rl_result["idx_to_node"])
-        rl_metrics = compute_path_metrics(G_osm, rl_osm_nodes)
+        rl_metrics = compute_path_metrics(G_osm, rl_osm_nodes, osm_arrays)
 
         seq_indices = [base_start_idx, *args.waypoints, base_dest_idx]
         seq_osm = convert_indices(seq_indices, idx_to_node)
         osm_nodes = compute_osm_route(G_osm, seq_osm)
-        osm_metrics = compute_path_metrics(G_osm, osm_nodes)
+        osm_metrics = compute_path_metrics(G_osm, osm_nodes, osm_arrays)
 
         base, ext = ensure_extension(args.output)
         rl_output = f"{base}_rl{ext}"
@@ -489,7 +539,7 @@ def main() -> None:
         seq_indices = [base_start_idx, *args.waypoints, base_dest_idx]
         seq_osm = convert_indices(seq_indices, idx_to_node)
         osm_nodes = compute_osm_route(G_osm, seq_osm)
-        metrics = compute_path_metrics(G_osm, osm_nodes)
+        metrics = compute_path_metrics(G_osm, osm_nodes, osm_arrays)
         base, ext = ensure_extension(args.output)
         output_path = f"{base}{ext}"
         plot_route_image(
@@ -518,11 +568,11 @@ def main() -> None:
             "max_steps": args.max_steps,
             "deterministic": args.deterministic,
             "verbose": args.verbose,
+            "graph": graph_relabel,
+            "node_to_idx": node_to_idx,
+            "idx_to_node": idx_to_node,
+            "context": context,
         }
-        if args.subgraph:
-            episode_kwargs["subgraph_path"] = str(subgraph_path)
-        else:
-            episode_kwargs["place"] = args.place
         
         rl_result = run_episode(**episode_kwargs)
         path_indices = rl_result["path"]
@@ -534,7 +584,7 @@ def main() -> None:
         mapping_for_path = idx_to_node
 
     path_nodes = convert_indices(path_indices, mapping_for_path)
-    metrics = compute_path_metrics(G_osm, path_nodes)
+    metrics = compute_path_metrics(G_osm, path_nodes, osm_arrays)
     base, ext = ensure_extension(args.output)
     output_path = f"{base}{ext}"
     plot_route_image(
@@ -5,19 +5,18 @@ from __future__ import annotations
 import argparse
 import os
 import sys
-from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
-from stable_baselines3 import PPO
+from sb3_contrib import MaskablePPO
 
 # Habilitar imports relativos cuando se ejecuta como script
 sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
 
-from src.envs import create_masked_waypoint_env 
+from src.envs import GraphContext, create_masked_waypoint_env 
 from src.data.download_graph import get_graph_relabel, load_subgraph_from_file  
-from src.training.main import build_node_embeddings  
 from src.utils.config_loader import load_config
+from src.training.main import get_config_path, load_trained_model
 import networkx as nx 
 
 
@@ -35,6 +34,12 @@ def parse_args() -> argparse.Namespace:
     return parser.parse_args()
 
 
+def load_env_configs() -> Tuple[Dict, Dict]:
+    """(environment_cfg, rewards_cfg) desde envs/config/config.yaml."""
+    cfg = load_config(get_config_path())
+    return cfg["environment"], cfg["rewards"]
+
+
 def run_episode(
     *,
     place: Optional[str] = None,
@@ -42,6 +47,7 @@ def run_episode(
     graph: Optional[nx.MultiDiGraph] = None,
     node_to_idx: Optional[Dict] = None,
     idx_to_node: Optional[Dict] = None,
+    context: Optional[GraphContext] = None,
     model_path: str,
     start: int,
     waypoints: Optional[List[int]] = None,
@@ -58,6 +64,7 @@ def run_episode(
         graph: grafo directamente (si ya está cargado)
         node_to_idx: mapeo de nodos a índices (requerido si se pasa graph)
         idx_to_node: mapeo de índices a nodos (requerido si se pasa graph)
+        context: GraphContext de graph ya construido (se reutiliza entre episodios)
         model_path: ruta al modelo PPO
         start: nodo inicial
         waypoints: waypoints a visitar
@@ -94,38 +101,69 @@ def run_episode(
 
     max_steps = max_steps if max_steps is not None else int(max(1, n_nodes * 0.8))
 
-    node_embeddings = build_node_embeddings(graph)
-
-    CONFIG_PATH = Path(__file__).resolve().parents[1] / "envs" / "config" / "config.yaml"
-    cfg = load_config(CONFIG_PATH)
+    cfg = load_config(get_config_path())
     environment_cfg, rewards_cfg = cfg["environment"], cfg["rewards"]
-    env = create_masked_waypoint_env(graph, waypoints, start, destination, environment_cfg, rewards_cfg)
+    if context is None:
+        context = GraphContext.from_config(graph, environment_cfg)
+    env = create_masked_waypoint_env(
+        graph, waypoints, start, destination, environment_cfg, rewards_cfg, context=context
+    )
 
-    from src.envs.legacy_wrapper import LegacyObservationWrapper
+    model, env = load_policy(model_path, env)
+    result = play_episode(model, env, max_steps=max_steps, deterministic=deterministic, verbose=verbose)
+    result.update(
+        environment_cfg=environment_cfg,
+        rewards_cfg=rewards_cfg,
+        graph=graph,
+        node_to_idx=node_to_idx,
+        idx_to_node=idx_to_node,
+        context=context,
+    )
+    return result
 
+
+def load_policy(model_path: str, env):
+    """Carga el modelo una vez y lo asocia a env; devuelve (model, env).
+
+    env puede volver envuelto si el modelo espera la observación legacy.
+    """
     if not os.path.exists(model_path):
         raise FileNotFoundError(f"No se encontro el modelo en {model_path}")
 
     # Cargar modelo sin env primero para verificar obs space
     try:
-        model = PPO.load(model_path)
+        model = load_trained_model(model_path)
     except Exception:
         # Fallback si falla carga sin env (raro en SB3 pero posible)
-        model = PPO.load(model_path, env=env)
+        model = load_trained_model(model_path, env=env)
 
     # Verificar compatibilidad de espacios
     if model.observation_space.shape != env.observation_space.shape:
         print(f"[WARNING] Mismatch de obs space: Modelo {model.observation_space.shape} vs Env {env.observation_space.shape}")
         if model.observation_space.shape == (69,) and env.observation_space.shape[0] > 69:
+            from src.envs.legacy_wrapper import LegacyObservationWrapper
+
             print("[INFO] Aplicando LegacyObservationWrapper para compatibilidad...")
             env = LegacyObservationWrapper(env)
         else:
             # Si no es el caso conocido, intentar cargar normal y dejar que explote o warn
             pass
-    
+
     model.set_env(env)
+    return model, env
 
-    obs, info = env.reset()
+
+def play_episode(
+    model,
+    env,
+    *,
+    max_steps: int,
+    deterministic: bool = True,
+    verbose: bool = False,
+    options: Optional[Dict] = None,
+) -> Dict[str, object]:
+    """Ejecuta un episodio con un modelo ya cargado; options redirige la tarea (reset)."""
+    obs, info = env.reset(options=options)
     done = False
     truncated = False
     total_reward = 0.0
@@ -133,13 +171,16 @@ def run_episode(
 
     if verbose:
         print(f"Inicio: nodo {env.current_node}")
-        print(f"Waypoints pendientes: {waypoints}")
-        print(f"Destino: {destination}")
+        print(f"Waypoints pendientes: {env.unwrapped.waypoints}")
+        print(f"Destino: {env.unwrapped.destination}")
         print(f"Max steps: {max_steps}")
         print("---")
 
     while not (done or truncated):
-        action, _ = model.predict(obs, deterministic=deterministic)
+        if isinstance(model, MaskablePPO):
+            action, _ = model.predict(obs, deterministic=deterministic, action_masks=env.action_masks())
+        else:
+            action, _ = model.predict(obs, deterministic=deterministic)
         obs, reward, done, truncated, info = env.step(action)
         total_reward += reward
         steps += 1
@@ -148,7 +189,7 @@ def run_episode(
             mask_applied = info.get("masking_applied", 0)
             print(
                 f"Paso {steps:03d} -> nodo {env.current_node}, "
-                f"reward={reward:.2f}, mask={mask_applied}, remaining={info.get('remaining_waypoints', [])}"
+                f"reward={reward:.2f}, mask={mask_applied}, remaining={env.unwrapped.remaining_waypoints}"
             )
 
         if steps >= max_steps * 2:
@@ -156,7 +197,8 @@ def run_episode(
             info["terminated_reason"] = "manual_limit"
             break
 
-    path = info.get("path", [])
+    # info trae el camino en el paso terminal; si se cortó antes, leerlo del entorno
+    path = info.get("path") or env.unwrapped.path_history
 
     return {
         "path": path,
@@ -165,11 +207,6 @@ def run_episode(
         "steps": steps,
         "total_reward": total_reward,
         "info": info,
-        "environment_cfg": environment_cfg,
-        "rewards_cfg": rewards_cfg,
-        "graph": graph,
-        "node_to_idx": node_to_idx,
-        "idx_to_node": idx_to_node,
     }
 
 
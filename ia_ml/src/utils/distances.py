@@ -1,33 +1,354 @@
+import hashlib
+import json
 import os
 import pickle
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Hashable, Iterable, Iterator, Optional, Sequence, Tuple
+
 import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import dijkstra
+
+# grafo disperso del proceso worker (se envía una sola vez vía initializer)
+_WORKER_CSGRAPH: Optional[sp.csr_matrix] = None
+
+
+def distance_matrix_nodes_path(matrix_path: str) -> str:
+    """Ruta del archivo auxiliar con el orden de nodos de la matriz (ids originales)."""
+    base, _ = os.path.splitext(str(matrix_path))
+    return f"{base}_nodes.npy"
+
+
+def distance_matrix_manifest_path(matrix_path: str) -> str:
+    """Ruta del manifiesto de bloques terminados (precomputo reanudable)."""
+    base, _ = os.path.splitext(str(matrix_path))
+    return f"{base}_manifest.json"
+
+
+def _read_manifest(matrix_path: str) -> Optional[Dict[str, Any]]:
+    manifest_path = distance_matrix_manifest_path(matrix_path)
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(matrix_path: str, manifest: Dict[str, Any]) -> None:
+    # escritura atómica: un corte a mitad nunca deja un manifiesto corrupto
+    manifest_path = distance_matrix_manifest_path(matrix_path)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, manifest_path)
+
+
+def is_distance_matrix_complete(matrix_path: str) -> bool:
+    """False si hay un manifiesto de un precomputo que no terminó."""
+    if not os.path.exists(str(matrix_path)):
+        return False
+    manifest = _read_manifest(matrix_path)
+    return manifest is None or bool(manifest.get("complete", False))
+
+
+def distances_dict_to_matrix(distances: Dict, nodes: Sequence[Hashable]) -> np.ndarray:
+    """Convierte un dict-of-dicts {u: {v: d}} a una matriz densa float32 en el orden de `nodes`.
+
+    Los pares sin entrada quedan en np.inf.
+    """
+    node_to_idx = {node: i for i, node in enumerate(nodes)}
+    n = len(nodes)
+    matrix = np.full((n, n), np.inf, dtype=np.float32)
+    for u, row in distances.items():
+        i = node_to_idx.get(u)
+        if i is None:
+            continue
+        cols = [node_to_idx.get(v) for v in row]
+        vals = list(row.values())
+        keep = [k for k, c in enumerate(cols) if c is not None]
+        if keep:
+            matrix[i, [cols[k] for k in keep]] = [vals[k] for k in keep]
+    return matrix
+
+
+def graph_to_csgraph(G: nx.Graph, weight: str = "length") -> sp.csr_matrix:
+    """Convierte el grafo a una matriz dispersa N x N (orden de `list(G.nodes())`).
+
+    Igual que networkx: entre aristas paralelas se usa la de menor peso y una
+    arista sin el atributo pesa 1. Las aristas de peso 0 se conservan como
+    ceros explícitos (csgraph las trata como aristas).
+    """
+    nodes = list(G.nodes())
+    node_to_idx = {node: i for i, node in enumerate(nodes)}
+    n = len(nodes)
+    rows, cols, vals = [], [], []
+    for u, v, w in G.edges(data=weight, default=1):
+        rows.append(node_to_idx[u])
+        cols.append(node_to_idx[v])
+        vals.append(float(w))
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    vals = np.asarray(vals, dtype=np.float64)
+    if not G.is_directed():
+        rows, cols, vals = np.concatenate([rows, cols]), np.concatenate([cols, rows]), np.concatenate([vals, vals])
+    return edges_to_csgraph(rows, cols, vals, n)
+
+
+def edges_to_csgraph(rows: np.ndarray, cols: np.ndarray, vals: np.ndarray, n: int) -> sp.csr_matrix:
+    """Matriz dispersa N x N desde listas de aristas (mínimo entre paralelas, ceros explícitos)."""
+    # mínimo entre aristas paralelas: ordenar por (fila, columna, peso) y quedarse con la primera
+    order = np.lexsort((vals, cols, rows))
+    rows, cols, vals = rows[order], cols[order], vals[order]
+    first = np.ones(rows.size, dtype=bool)
+    first[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+    rows, cols, vals = rows[first], cols[first], vals[first]
+
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(rows, minlength=n))
+    return sp.csr_matrix((vals, cols, indptr), shape=(n, n))
+
+
+def _init_worker(data: np.ndarray, indices: np.ndarray, indptr: np.ndarray, n: int) -> None:
+    global _WORKER_CSGRAPH
+    _WORKER_CSGRAPH = sp.csr_matrix((data, indices, indptr), shape=(n, n))
+
+
+def _dijkstra_block(bounds: Tuple[int, int]) -> Tuple[int, np.ndarray]:
+    start, stop = bounds
+    rows = dijkstra(_WORKER_CSGRAPH, directed=True, indices=np.arange(start, stop))
+    return start, rows.astype(np.float32)
+
+
+def _row_blocks(n: int, chunk_size: int) -> Iterator[Tuple[int, int]]:
+    for start in range(0, n, chunk_size):
+        yield start, min(start + chunk_size, n)
+
+
+def _iter_distance_blocks(
+    csgraph: sp.csr_matrix,
+    blocks: Iterable[Tuple[int, int]],
+    workers: int,
+) -> Iterator[Tuple[int, np.ndarray]]:
+    """Genera (fila_inicio, filas float32) por bloque, en orden de finalización.
+
+    Con varios workers se mantienen a lo sumo `2 * workers` bloques en vuelo,
+    así la memoria queda acotada por el tamaño de bloque y no por N.
+    """
+    n = csgraph.shape[0]
+    blocks = iter(blocks)
+    if workers <= 1:
+        _init_worker(csgraph.data, csgraph.indices, csgraph.indptr, n)
+        for bounds in blocks:
+            yield _dijkstra_block(bounds)
+        return
 
-def precalculate_distances(G, cache_path="data/distances_cache.pkl"):
+    initargs = (csgraph.data, csgraph.indices, csgraph.indptr, n)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+        pending = set()
+        for bounds in blocks:
+            pending.add(pool.submit(_dijkstra_block, bounds))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def compute_distance_matrix(
+    G: nx.Graph,
+    weight: str = "length",
+    *,
+    workers: int = 1,
+    chunk_size: int = 256,
+    out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Distancias más cortas entre todos los pares como matriz densa float32.
+
+    Corre `scipy.sparse.csgraph.dijkstra` (C) por bloques de `chunk_size`
+    filas origen, repartidos entre `workers` procesos; cada bloque se escribe
+    directamente en `out` (p. ej. un memmap de `np.lib.format.open_memmap`).
+
+    Las filas/columnas siguen el orden de `list(G.nodes())`, que es el mismo
+    que usa `relabel_nodes_to_indices`, así que la matriz queda indexada por
+    los ids relabelados. Pares inalcanzables = np.inf.
+    """
+    csgraph = graph_to_csgraph(G, weight=weight)
+    n = csgraph.shape[0]
+    if out is None:
+        out = np.empty((n, n), dtype=np.float32)
+    elif out.shape != (n, n):
+        raise ValueError(f"La matriz de salida {out.shape} no coincide con el grafo ({n} nodos)")
+    chunk_size = max(1, int(chunk_size))
+    workers = workers if n > chunk_size else 1
+    for start, rows in _iter_distance_blocks(csgraph, _row_blocks(n, chunk_size), workers):
+        out[start:start + rows.shape[0]] = rows
+    return out
+
+
+def _graph_fingerprint(G: nx.Graph, weight: str) -> str:
+    h = hashlib.sha1()
+    h.update(weight.encode("utf-8"))
+    h.update(str(G.number_of_edges()).encode("utf-8"))
+    for node in G.nodes():
+        h.update(str(node).encode("utf-8"))
+        h.update(b",")
+    return h.hexdigest()
+
+
+def compute_distance_matrix_to_file(
+    G: nx.Graph,
+    path: str,
+    weight: str = "length",
+    *,
+    workers: int = 1,
+    chunk_size: int = 256,
+    resume: bool = True,
+) -> np.ndarray:
+    """Calcula la matriz en streaming hacia el .npy final y la reabre en solo lectura (memmap).
+
+    Cada bloque de filas terminado se escribe en su posición del archivo y
+    se registra en `<nombre>_manifest.json`. Si la corrida se corta (kill,
+    OOM), volver a llamar con los mismos argumentos retoma desde los bloques
+    pendientes. La memoria pico queda acotada por `chunk_size * N` por bloque
+    en vuelo; la matriz completa nunca se mantiene en memoria.
+
+    `resume=False` descarta el progreso previo y empieza de cero.
+    """
+    path = str(path)
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+
+    csgraph = graph_to_csgraph(G, weight=weight)
+    n = csgraph.shape[0]
+    chunk_size = max(1, int(chunk_size))
+    fingerprint = _graph_fingerprint(G, weight)
+
+    manifest = _read_manifest(path) if resume else None
+    if (
+        manifest is None
+        or not os.path.exists(path)
+        or manifest.get("n_nodes") != n
+        or manifest.get("chunk_size") != chunk_size
+        or manifest.get("fingerprint") != fingerprint
+    ):
+        # archivo nuevo: crea el header .npy y reserva N x N (archivo disperso)
+        np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(n, n)).flush()
+        manifest = {
+            "n_nodes": n,
+            "weight": weight,
+            "chunk_size": chunk_size,
+            "fingerprint": fingerprint,
+            "completed": [],
+            "complete": False,
+        }
+        _write_manifest(path, manifest)
+
+    completed = set(manifest["completed"])
+    pending_blocks = [b for b in _row_blocks(n, chunk_size) if b[0] not in completed]
+    if completed:
+        print(f"[distances] Reanudando: {len(completed)} bloques ya calculados, {len(pending_blocks)} pendientes")
+
+    header_offset = np.load(path, mmap_mode="r").offset
+    row_bytes = n * np.dtype(np.float32).itemsize
+    workers = workers if len(pending_blocks) > 1 else 1
+    with open(path, "r+b") as fh:
+        for start, rows in _iter_distance_blocks(csgraph, pending_blocks, workers):
+            fh.seek(header_offset + start * row_bytes)
+            fh.write(np.ascontiguousarray(rows, dtype=np.float32).tobytes())
+            fh.flush()
+            os.fsync(fh.fileno())
+            # registrar el bloque sólo después de que está en disco
+            manifest["completed"].append(start)
+            _write_manifest(path, manifest)
+
+    np.save(distance_matrix_nodes_path(path), np.asarray(list(G.nodes())))
+    manifest["complete"] = True
+    _write_manifest(path, manifest)
+    return load_distance_matrix(path)
+
+
+def save_distance_matrix(matrix: np.ndarray, path: str, nodes: Optional[Sequence[Hashable]] = None) -> None:
+    """Guarda la matriz como .npy (abrible con np.memmap) y opcionalmente el orden de nodos."""
+    parent = os.path.dirname(str(path))
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    np.save(str(path), np.asarray(matrix, dtype=np.float32))
+    if nodes is not None:
+        np.save(distance_matrix_nodes_path(path), np.asarray(list(nodes)))
+
+
+def load_distance_matrix(path: str, nodes: Optional[Sequence[Hashable]] = None) -> np.ndarray:
+    """Abre una matriz .npy en modo memmap de solo lectura.
+
+    Si se pasa `nodes` y existe el archivo auxiliar de orden de nodos, se valida
+    que la matriz corresponda al mismo grafo.
+    """
+    if not is_distance_matrix_complete(path):
+        raise ValueError(f"La matriz de distancias {path} está incompleta (precomputo sin terminar)")
+    matrix = np.load(str(path), mmap_mode="r")
+    if matrix.ndim != 2 or matrix.shape[0] != matrix.shape[1]:
+        raise ValueError(f"La matriz de distancias {path} no es cuadrada: {matrix.shape}")
+    if nodes is not None:
+        if matrix.shape[0] != len(nodes):
+            raise ValueError(
+                f"La matriz de distancias {path} tiene {matrix.shape[0]} nodos y el grafo {len(nodes)}"
+            )
+        nodes_path = distance_matrix_nodes_path(path)
+        if os.path.exists(nodes_path):
+            saved = np.load(nodes_path, allow_pickle=False)
+            if [str(n) for n in saved.tolist()] != [str(n) for n in nodes]:
+                raise ValueError(f"El orden de nodos de {path} no coincide con el grafo")
+    return matrix
+
+
+def max_finite_distance(matrix: np.ndarray, block_rows: int = 1024) -> float:
+    """Máxima distancia finita de la matriz (0.0 si no hay ninguna).
+
+    Recorre la matriz (memmap) por bloques de filas para no materializar una
+    máscara N x N en memoria.
+    """
+    max_dist = 0.0
+    for start in range(0, matrix.shape[0], block_rows):
+        block = np.asarray(matrix[start:start + block_rows])
+        max_dist = max(max_dist, float(np.max(block, where=np.isfinite(block), initial=0.0)))
+    return max_dist
+
+
+def precalculate_distances(G, cache_path="data/distances_cache.npy", weight="length", workers=1, chunk_size=256):
     """
     Precalcula las distancias más cortas entre todos los nodos de un grafo usando Dijkstra.
-    Si existe un archivo cache, lo carga directamente para evitar recalcular.
-    
+    Si existe un archivo cache, lo abre directamente (memmap) para evitar recalcular.
+
+    Cache legacy .pkl (dict-of-dicts) se sigue leyendo y se convierte a matriz.
     """
 
-    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
 
-    # Si ya existe un cache previo, lo cargamos
-    if os.path.exists(cache_path):
+    # Si ya existe un cache previo (y terminó), lo cargamos; si quedó a medias se reanuda
+    if (cache_path.endswith(".pkl") and os.path.exists(cache_path)) or is_distance_matrix_complete(cache_path):
         print(f"[distances] Cargando distancias desde cache: {cache_path}")
-        with open(cache_path, "rb") as f:
-            shortest_paths = pickle.load(f)
-        return shortest_paths
+        if cache_path.endswith(".pkl"):
+            with open(cache_path, "rb") as f:
+                return distances_dict_to_matrix(pickle.load(f), list(G.nodes()))
+        return load_distance_matrix(cache_path, list(G.nodes()))
 
     # Si no existe, las calculamos
     print("[distances] Calculando distancias entre nodos (esto puede tardar)...")
-    shortest_paths = dict(nx.all_pairs_dijkstra_path_length(G))
-
-    # Guardamos en cache para próximas ejecuciones
-    with open(cache_path, "wb") as f:
-        pickle.dump(shortest_paths, f)
+    matrix = compute_distance_matrix_to_file(
+        G, cache_path, weight=weight, workers=workers, chunk_size=chunk_size
+    )
 
     print(f"[distances] Distancias precalculadas y guardadas en {cache_path}")
-    return shortest_paths
+    return matrix
 
 
 if __name__ == "__main__":
@@ -40,16 +361,22 @@ if __name__ == "__main__":
         epilog=(
             "Examples:\n"
             "  python3 src/utils/distances.py -g scripts/subgraph.graphml\n"
-            "  python3 src/utils/distances.py -g scripts/subgraph.graphml -c src/data/mygraph_distances.pkl\n"
+            "  python3 src/utils/distances.py -g scripts/subgraph.graphml -c src/data/mygraph_distances.npy\n"
             "\n"
             "Notes:\n"
-            "  - The output cache is a pickle of the all-pairs shortest-path lengths.\n"
+            "  - The output cache is a float32 N x N matrix (.npy) in graph node order,\n"
+            "    opened with np.memmap. A <name>_nodes.npy file stores the node order.\n"
+            "  - Finished row blocks are recorded in <name>_manifest.json; re-running the same\n"
+            "    command after a crash resumes from the pending blocks.\n"
             "  - For large graphs this can take significant time and memory. Consider computing\n"
             "    only target-based distances if you have many nodes but few targets.\n"
         ),
     )
     parser.add_argument("-g", "--graph", required=True, help="Path to input .graphml file")
-    parser.add_argument("-c", "--cache", default="src/data/subgraph_distances.pkl", help="Output cache path (.pkl)")
+    parser.add_argument("-c", "--cache", default="src/data/subgraph_distances.npy", help="Output cache path (.npy)")
+    parser.add_argument("-w", "--weight", default="length", help="Edge attribute to use as weight (default: length)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes for Dijkstra (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=256, help="Source rows per Dijkstra task (default: 256)")
     args = parser.parse_args()
 
     graph_path = Path(args.graph)
@@ -62,5 +389,11 @@ if __name__ == "__main__":
     cache_path.parent.mkdir(parents=True, exist_ok=True)
 
     print(f"[distances] Precomputing distances for {graph_path} -> {cache_path} (this may take some time)...")
-    precalculate_distances(G, cache_path=str(cache_path))
+    precalculate_distances(
+        G,
+        cache_path=str(cache_path),
+        weight=args.weight,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+    )
     print("[distances] Done.")
@@ -0,0 +1,257 @@
+"""Tabla columnar de características de aristas alineada con el CSR.
+
+Las aristas se leen una sola vez (en el orden de ``GraphArrays``) y cada
+atributo queda en un array numpy. Los valores crudos de texto
+(``maxspeed``, ``lanes``, ``highway``, ``surface``, ``oneway``) se parsean
+una vez por valor distinto gracias a un memo: en un grafo de OSM hay miles
+de aristas pero sólo unos cientos de strings distintos.
+"""
+
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence
+
+import numpy as np
+
+# mapeo de highway types a códigos jerárquicos (mayor = más importante)
+HIGHWAY_HIERARCHY = {
+    'motorway': 6, 'motorway_link': 5,
+    'trunk': 5, 'trunk_link': 4,
+    'primary': 4, 'primary_link': 3,
+    'secondary': 3, 'secondary_link': 2,
+    'tertiary': 2, 'tertiary_link': 1,
+    'residential': 1, 'living_street': 1,
+    'unclassified': 0, 'service': 0,
+}
+
+# mapeo de surface types a scores (mayor = mejor calidad)
+SURFACE_SCORES = {
+    'paved': 1.0, 'asphalt': 1.0, 'concrete': 1.0,
+    'paving_stones': 0.9, 'cobblestone': 0.8,
+    'compacted': 0.7, 'gravel': 0.6,
+    'dirt': 0.4, 'sand': 0.3, 'unpaved': 0.5,
+    'grass': 0.2, 'ground': 0.3,
+}
+
+DEFAULT_SPEED_KMH = 50.0
+
+
+def _parse_maxspeed(maxspeed: Any) -> Optional[float]:
+    """extrae maxspeed en km/h, convirtiendo diferentes formatos."""
+    if maxspeed is None:
+        return None
+
+    # si es número, asumir km/h
+    if isinstance(maxspeed, (int, float)):
+        return float(maxspeed)
+
+    # si es string, parsear (ej: "50 km/h" -> 50, "50" -> 50)
+    if isinstance(maxspeed, str):
+        try:
+            # remover "km/h", "mph", etc.
+            cleaned = maxspeed.lower().replace("km/h", "").replace("mph", "").strip()
+            # intentar extraer número
+            for part in cleaned.split():
+                try:
+                    return float(part)
+                except ValueError:
+                    continue
+        except Exception:
+            pass
+
+    return None
+
+def _parse_lanes(lanes: Any) -> Optional[float]:
+    """número de carriles (primer valor si es lista), None si no se puede leer."""
+    if lanes is None:
+        return None
+    try:
+        if isinstance(lanes, (list, tuple)):
+            return float(lanes[0]) if lanes else None
+        return float(lanes)
+    except (ValueError, TypeError):
+        return None
+
+def _parse_highway_code(highway: Any) -> float:
+    """convierte highway type a código jerárquico normalizado."""
+    if isinstance(highway, list):
+        highway = highway[0] if highway else None
+    if highway is None:
+        return 0.0
+    return float(HIGHWAY_HIERARCHY.get(str(highway).lower(), 0.0)) / 6.0  # normalizado a [0, 1]
+
+def _parse_surface_score(surface: Any) -> float:
+    """obtiene score de superficie (0-1, mayor = mejor)."""
+    if isinstance(surface, list):
+        surface = surface[0] if surface else None
+    if surface is None:
+        return 0.5  # default: calidad media
+    return SURFACE_SCORES.get(str(surface).lower(), 0.5)
+
+def _parse_oneway_flag(oneway: Any) -> float:
+    """retorna 1.0 si es oneway, 0.0 si no."""
+    if isinstance(oneway, bool):
+        return 1.0 if oneway else 0.0
+    if isinstance(oneway, str):
+        return 1.0 if oneway.lower() in ("true", "yes", "1") else 0.0
+    return 0.0
+
+
+class _Memo:
+    """cache valor crudo -> valor parseado (listas se usan como tuplas)."""
+
+    def __init__(self, parse: Callable[[Any], Any]) -> None:
+        self.parse = parse
+        self.cache: Dict[Hashable, Any] = {}
+
+    def __call__(self, raw: Any) -> Any:
+        key = (type(raw), tuple(raw)) if isinstance(raw, list) else (type(raw), raw)
+        try:
+            return self.cache[key]
+        except KeyError:
+            value = self.cache[key] = self.parse(raw)
+            return value
+        except TypeError:
+            # valor no hasheable: parsear sin cache
+            return self.parse(raw)
+
+
+def _nan_if_none(value: Optional[float]) -> float:
+    return np.nan if value is None else value
+
+
+class EdgeFeatureTable:
+    """Columnas por arista (float64, una fila por arista del CSR).
+
+    Columnas crudas (``nan`` = atributo ausente): ``length``,
+    ``travel_time_attr``, ``speed_kph``, ``maxspeed``, ``lanes``.
+    Columnas derivadas: ``highway_code``, ``surface_score``, ``oneway_flag``,
+    ``travel_time`` (ver ``_travel_time``) y las normalizadas
+    ``maxspeed_norm``, ``lanes_norm``, ``travel_time_norm``.
+    """
+
+    def __init__(self, edge_attrs: Sequence[Dict[str, Any]]) -> None:
+        self._edge_attrs = edge_attrs
+        self.n_edges = len(edge_attrs)
+
+        maxspeed_memo = _Memo(_parse_maxspeed)
+        lanes_memo = _Memo(_parse_lanes)
+        highway_memo = _Memo(_parse_highway_code)
+        surface_memo = _Memo(_parse_surface_score)
+        oneway_memo = _Memo(_parse_oneway_flag)
+
+        length: List[float] = []
+        travel_time_attr: List[float] = []
+        speed_kph: List[float] = []
+        maxspeed: List[float] = []
+        lanes: List[float] = []
+        highway_code: List[float] = []
+        surface_score: List[float] = []
+        oneway_flag: List[float] = []
+
+        # una sola pasada sobre las aristas
+        for attrs in edge_attrs:
+            get = attrs.get
+            value = get("length")
+            length.append(np.nan if value is None else float(value))
+            value = get("travel_time")
+            travel_time_attr.append(np.nan if value is None else float(value))
+            value = get("speed_kph")
+            speed_kph.append(np.nan if value is None else float(value))
+            maxspeed.append(_nan_if_none(maxspeed_memo(get("maxspeed"))))
+            lanes.append(_nan_if_none(lanes_memo(get("lanes"))))
+            highway_code.append(highway_memo(get("highway")))
+            surface_score.append(surface_memo(get("surface")))
+            oneway_flag.append(oneway_memo(get("oneway", False)))
+
+        self.length = np.array(length, dtype=np.float64)
+        self.travel_time_attr = np.array(travel_time_attr, dtype=np.float64)
+        self.speed_kph = np.array(speed_kph, dtype=np.float64)
+        self.maxspeed = np.array(maxspeed, dtype=np.float64)
+        self.lanes = np.array(lanes, dtype=np.float64)
+        self.highway_code = np.array(highway_code, dtype=np.float64)
+        self.surface_score = np.array(surface_score, dtype=np.float64)
+        self.oneway_flag = np.array(oneway_flag, dtype=np.float64)
+
+        self.travel_time = self._travel_time()
+        self._normalize()
+
+        self._raw_cache: Dict[str, np.ndarray] = {
+            "length": self.length,
+            "travel_time": self.travel_time_attr,
+            "speed_kph": self.speed_kph,
+        }
+        self._cost_cache: Dict[str, np.ndarray] = {}
+
+    @classmethod
+    def from_columns(cls, n_edges: int, columns: Dict[str, np.ndarray]) -> "EdgeFeatureTable":
+        """Tabla parcial sólo con columnas crudas ya calculadas (sin los atributos).
+
+        Alcanza para ``raw``/``cost`` sobre esas columnas; es lo que usan los
+        procesos worker que reciben los arrays por memoria compartida.
+        """
+        self = cls.__new__(cls)
+        self._edge_attrs = None
+        self.n_edges = n_edges
+        self.length = columns["length"]
+        self._raw_cache = dict(columns)
+        self._cost_cache = {}
+        return self
+
+    def _travel_time(self) -> np.ndarray:
+        """travel_time en segundos.
+
+        prioridad: atributo travel_time de osmnx, luego speed_kph, luego
+        maxspeed (o DEFAULT_SPEED_KMH). sin length el tiempo es 0.
+        """
+        speed_kmh = np.where(
+            np.isnan(self.speed_kph),
+            np.where(np.isnan(self.maxspeed), DEFAULT_SPEED_KMH, self.maxspeed),
+            self.speed_kph,
+        )
+        speed_ms = speed_kmh / 3.6
+        with np.errstate(divide="ignore", invalid="ignore"):
+            from_speed = np.where(speed_ms > 0, self.length / speed_ms, 0.0)
+        travel_time = np.where(np.isnan(self.travel_time_attr), from_speed, self.travel_time_attr)
+        return np.where(np.isnan(self.length), 0.0, travel_time)
+
+    def _normalize(self) -> None:
+        has_maxspeed = ~np.isnan(self.maxspeed)
+        has_lanes = ~np.isnan(self.lanes)
+        positive_tt = self.travel_time > 0
+
+        maxspeed_max = self.maxspeed[has_maxspeed].max() if has_maxspeed.any() else 1.0
+        lanes_max = self.lanes[has_lanes].max() if has_lanes.any() else 1.0
+        travel_time_max = self.travel_time[positive_tt].max() if positive_tt.any() else 1.0
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.maxspeed_norm = np.where(has_maxspeed, self.maxspeed / maxspeed_max, 0.0)
+            lanes_value = np.where(has_lanes, self.lanes, 0.0)
+            self.lanes_norm = lanes_value / lanes_max if lanes_max > 0 else np.zeros(self.n_edges)
+            self.travel_time_norm = (
+                self.travel_time / travel_time_max if travel_time_max > 0 else np.zeros(self.n_edges)
+            )
+
+    def raw(self, name: str) -> np.ndarray:
+        """columna ``float(attrs[name])`` con ``nan`` donde falta el atributo."""
+        column = self._raw_cache.get(name)
+        if column is None:
+            if self._edge_attrs is None:
+                raise KeyError(f"Columna de aristas '{name}' no disponible")
+            column = np.array(
+                [np.nan if a.get(name) is None else float(a[name]) for a in self._edge_attrs],
+                dtype=np.float64,
+            )
+            self._raw_cache[name] = column
+        return column
+
+    def cost(self, weight_name: str) -> np.ndarray:
+        """costo por arista: ``attrs[weight_name]``, fallback a ``length`` y luego a 1.0."""
+        cached = self._cost_cache.get(weight_name)
+        if cached is None:
+            length = np.where(np.isnan(self.length), 1.0, self.length)
+            if weight_name == "length":
+                cached = length
+            else:
+                weight = self.raw(weight_name)
+                cached = np.where(np.isnan(weight), length, weight)
+            self._cost_cache[weight_name] = cached
+        return cached
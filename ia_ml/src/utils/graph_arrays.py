@@ -0,0 +1,167 @@
+"""Representación CSR (arrays numpy) de un MultiDiGraph de OSMnx.
+
+Se construye una sola vez a partir del grafo y reemplaza los recorridos
+de diccionarios de networkx en el camino caliente del entorno
+(vecinos, datos de aristas, costos de movimiento).
+"""
+
+from typing import Any, Dict, Hashable, List, Optional, Sequence
+
+import networkx as nx
+import numpy as np
+from scipy.spatial import ConvexHull, QhullError
+
+from src.utils.edge_features import EdgeFeatureTable
+
+
+def coordinate_diameter(x: np.ndarray, y: np.ndarray, block_size: int = 2048) -> float:
+    """Máxima distancia euclídea entre dos puntos (x, y).
+
+    Sólo los vértices de la envolvente convexa pueden ser extremos del
+    diámetro, así que se reduce a ellos y se toma el máximo por pares en
+    bloques. Con puntos degenerados (colineales, repetidos) se usan todos.
+    """
+    points = np.unique(np.column_stack((x, y)).astype(np.float64), axis=0)
+    if len(points) < 2:
+        return 0.0
+    if len(points) > 3:
+        try:
+            points = points[ConvexHull(points).vertices]
+        except QhullError:
+            pass
+
+    max_sq = 0.0
+    for start in range(0, len(points), block_size):
+        block = points[start:start + block_size]
+        dx = block[:, None, 0] - points[None, start:, 0]
+        dy = block[:, None, 1] - points[None, start:, 1]
+        max_sq = max(max_sq, float((dx * dx + dy * dy).max()))
+    return max_sq ** 0.5
+
+
+EARTH_RADIUS_M = 6_371_008.8
+
+
+def haversine_m(x1, y1, x2, y2) -> np.ndarray:
+    """Distancia de gran círculo en metros entre (lon, lat) en grados (vectorizada)."""
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (x1, y1, x2, y2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class GraphArrays:
+    """Arrays compactos de adyacencia de un grafo dirigido.
+
+    - ``indptr`` / ``indices``: CSR sobre *todas* las aristas salientes
+      (incluye aristas paralelas), en el mismo orden que
+      ``graph.edges(node, keys=True)``. Las columnas por arista
+      (``edge_features``, ``edge_cost``) están alineadas con este orden.
+    - ``neighbor_table``: tabla ``N x max_actions`` con los vecinos únicos
+      de cada nodo (mismo orden que ``graph.neighbors``), rellenada con -1.
+    - ``neighbor_edge``: índice (en el CSR) de la primera arista paralela
+      hacia cada vecino, igual que la que devolvía ``_edge_data``.
+
+    Los nodos se indexan en el orden de ``list(graph.nodes())``; para un
+    grafo relabelado (0..n-1) el índice coincide con la etiqueta.
+    """
+
+    def __init__(self, graph: nx.MultiDiGraph) -> None:
+        self.nodes: List[Hashable] = list(graph.nodes())
+        self.n_nodes = len(self.nodes)
+        self.node_index: Dict[Hashable, int] = {node: i for i, node in enumerate(self.nodes)}
+
+        degrees = [d for _, d in graph.degree()]
+        self.max_actions = max(degrees, default=1)
+
+        # CSR sobre aristas (u, v, key) en orden de adyacencia
+        indptr = np.zeros(self.n_nodes + 1, dtype=np.int64)
+        indices: List[int] = []
+        self._edge_attrs: List[Dict[str, Any]] = []
+        neighbor_rows: List[List[int]] = []
+        neighbor_edge_rows: List[List[int]] = []
+
+        succ = graph.succ if graph.is_directed() else graph.adj
+        multi = graph.is_multigraph()
+        for i, node in enumerate(self.nodes):
+            row_nb: List[int] = []
+            row_edge: List[int] = []
+            for nb, keydict in succ[node].items():
+                j = self.node_index[nb]
+                row_nb.append(j)
+                row_edge.append(len(indices))
+                edge_list = keydict.values() if multi else (keydict,)
+                for attrs in edge_list:
+                    indices.append(j)
+                    self._edge_attrs.append(attrs)
+            neighbor_rows.append(row_nb)
+            neighbor_edge_rows.append(row_edge)
+            indptr[i + 1] = len(indices)
+
+        self.indptr = indptr
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.n_edges = len(indices)
+
+        # tabla de vecinos únicos, rellenada con -1
+        self.n_neighbors = np.array([len(r) for r in neighbor_rows], dtype=np.int32)
+        width = max(1, self.max_actions)
+        self.neighbor_table = np.full((self.n_nodes, width), -1, dtype=np.int32)
+        self.neighbor_edge = np.full((self.n_nodes, width), -1, dtype=np.int64)
+        for i, (row_nb, row_edge) in enumerate(zip(neighbor_rows, neighbor_edge_rows)):
+            k = min(len(row_nb), width)
+            self.neighbor_table[i, :k] = row_nb[:k]
+            self.neighbor_edge[i, :k] = row_edge[:k]
+
+        self.x = np.array([float(graph.nodes[n].get("x", 0.0)) for n in self.nodes], dtype=np.float64)
+        self.y = np.array([float(graph.nodes[n].get("y", 0.0)) for n in self.nodes], dtype=np.float64)
+
+        self._edge_features: Optional[EdgeFeatureTable] = None
+
+    # campos array que definen la estructura (lo que se comparte entre procesos)
+    ARRAY_FIELDS = ("indptr", "indices", "n_neighbors", "neighbor_table", "neighbor_edge", "x", "y")
+
+    @classmethod
+    def from_arrays(
+        cls,
+        nodes: Sequence[Hashable],
+        max_actions: int,
+        arrays: Dict[str, np.ndarray],
+        edge_columns: Dict[str, np.ndarray],
+    ) -> "GraphArrays":
+        """Reconstruye la estructura sin el grafo networkx.
+
+        ``arrays`` trae los ``ARRAY_FIELDS`` y ``edge_columns`` las columnas
+        crudas de aristas disponibles (ver ``EdgeFeatureTable.from_columns``).
+        """
+        self = cls.__new__(cls)
+        self.nodes = list(nodes)
+        self.n_nodes = len(self.nodes)
+        self.node_index = {node: i for i, node in enumerate(self.nodes)}
+        self.max_actions = int(max_actions)
+        for name in cls.ARRAY_FIELDS:
+            setattr(self, name, arrays[name])
+        self.n_edges = len(self.indices)
+        self._edge_attrs = None
+        self._edge_features = EdgeFeatureTable.from_columns(self.n_edges, edge_columns)
+        return self
+
+    def index_of(self, node: Hashable) -> int:
+        return self.node_index[node]
+
+    def neighbors(self, idx: int) -> np.ndarray:
+        """Vecinos únicos (índices) del nodo ``idx``."""
+        return self.neighbor_table[idx, : self.n_neighbors[idx]]
+
+    @property
+    def edge_features(self) -> EdgeFeatureTable:
+        """Tabla columnar de atributos de aristas (se construye la primera vez)."""
+        if self._edge_features is None:
+            self._edge_features = EdgeFeatureTable(self._edge_attrs)
+        return self._edge_features
+
+    def edge_cost(self, weight_name: str) -> np.ndarray:
+        """Costo de moverse por cada arista del CSR.
+
+        Misma semántica que el entorno: ``attrs[weight_name]`` con fallback a
+        ``length`` y luego a 1.0.
+        """
+        return self.edge_features.cost(weight_name)
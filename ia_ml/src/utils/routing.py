@@ -0,0 +1,155 @@
+"""A* de una sola pasada sobre el CSR de ``GraphArrays``.
+
+Devuelve en la misma búsqueda el costo, los nodos y las aristas usadas, de
+modo que longitud y tiempo reales se suman sobre esas aristas sin volver a
+buscar. Admite varios orígenes y destinos con costo inicial / final (para
+partir de un punto sobre una calle en lugar de un nodo).
+
+Heurística: ``h(n) = k * haversine(n, t)`` con ``k`` el mínimo, sobre todas
+las aristas, de ``peso / haversine(u, v)``. Para cualquier camino
+``P`` de ``n`` a ``t``::
+
+    costo(P) = sum(w_e) >= k * sum(haversine(e)) >= k * haversine(n, t)
+
+(la segunda desigualdad es la triangular sobre la esfera), así que ``h``
+nunca sobreestima: es admisible, y por el mismo argumento aplicado a una
+arista, ``h(u) <= w(u, v) + h(v)`` (consistente). Con ``length`` ``k``
+es ~1; con ``travel_time`` es 1 / (velocidad máxima efectiva del grafo).
+"""
+
+import heapq
+import math
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from src.utils.graph_arrays import EARTH_RADIUS_M, GraphArrays, haversine_m
+
+
+def edge_weights(arrays: GraphArrays, weight: str) -> np.ndarray:
+    """Peso por arista del CSR: ``attrs[weight]`` y 1 si falta (igual que reverse_csgraph)."""
+    weights = arrays.edge_features.raw(weight)
+    return np.where(np.isnan(weights), 1.0, weights)
+
+
+def heuristic_scale(arrays: GraphArrays, weights: np.ndarray) -> float:
+    """Mayor ``k`` con ``k * haversine(u, v) <= w(u, v)`` en todas las aristas.
+
+    Aristas de longitud geográfica nula no acotan ``k`` (cualquier ``k`` las cumple).
+    """
+    tails = np.repeat(np.arange(arrays.n_nodes), np.diff(arrays.indptr))
+    heads = np.asarray(arrays.indices)
+    straight = haversine_m(arrays.x[tails], arrays.y[tails], arrays.x[heads], arrays.y[heads])
+    positive = straight > 0
+    if not positive.any():
+        return 0.0
+    return max(0.0, float(np.min(np.asarray(weights)[positive] / straight[positive])))
+
+
+class CSRPath(NamedTuple):
+    """Resultado de ``CSRRouter.search`` (índices de nodo y de arista del CSR)."""
+
+    cost: float
+    nodes: List[int]
+    edges: List[int]
+    expanded: int
+
+
+class CSRRouter:
+    """A* sobre el CSR para un peso dado; se construye una vez por grafo y peso."""
+
+    def __init__(self, arrays: GraphArrays, weight: str) -> None:
+        self.arrays = arrays
+        self.weight = weight
+        self.weights = edge_weights(arrays, weight)
+        self.scale = heuristic_scale(arrays, self.weights)
+        # listas de Python: el bucle de A* indexa escalares
+        self._indptr = np.asarray(arrays.indptr).tolist()
+        self._heads = np.asarray(arrays.indices).tolist()
+        self._weights = self.weights.tolist()
+        self._lon = np.radians(arrays.x).tolist()
+        self._lat = np.radians(arrays.y).tolist()
+
+    def straight_m(self, a: int, b: int) -> float:
+        """Haversine en metros entre los nodos de índices a y b (escalar, sin numpy)."""
+        lon_a, lat_a, lon_b, lat_b = self._lon[a], self._lat[a], self._lon[b], self._lat[b]
+        h = math.sin((lat_b - lat_a) / 2) ** 2 + math.cos(lat_a) * math.cos(lat_b) * math.sin((lon_b - lon_a) / 2) ** 2
+        return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(1.0, h)))
+
+    def search(self, sources: Dict[int, float], targets: Dict[int, float]) -> Optional[CSRPath]:
+        """Camino de costo mínimo ``sources[s] + camino(s, t) + targets[t]``; None si no hay.
+
+        ``sources`` / ``targets`` mapean índice de nodo -> costo inicial / final.
+        """
+        if not sources or not targets:
+            return None
+        scale = self.scale
+        goals = list(targets.items())
+
+        def heuristic(n: int) -> float:
+            # mínimo sobre destinos: sigue siendo cota inferior del costo restante
+            return min(scale * self.straight_m(n, t) + off for t, off in goals)
+
+        indptr, heads, weights = self._indptr, self._heads, self._weights
+        g: Dict[int, float] = {}
+        parent: Dict[int, tuple] = {}
+        h_cache: Dict[int, float] = {}
+        heap = []
+        counter = 0
+        for s, off in sources.items():
+            if off < g.get(s, math.inf):
+                g[s] = off
+                parent[s] = (-1, -1)
+                h_cache[s] = heuristic(s)
+                heapq.heappush(heap, (off + h_cache[s], counter, s))
+                counter += 1
+
+        best_cost, best_goal = math.inf, -1
+        closed = set()
+        expanded = 0
+        while heap:
+            f, _, n = heapq.heappop(heap)
+            if f >= best_cost:
+                break
+            if n in closed:
+                continue
+            closed.add(n)
+            expanded += 1
+            gn = g[n]
+            if n in targets and gn + targets[n] < best_cost:
+                best_cost, best_goal = gn + targets[n], n
+            for k in range(indptr[n], indptr[n + 1]):
+                v = heads[k]
+                gv = gn + weights[k]
+                if gv < g.get(v, math.inf):
+                    g[v] = gv
+                    parent[v] = (n, k)
+                    hv = h_cache.get(v)
+                    if hv is None:
+                        hv = h_cache[v] = heuristic(v)
+                    heapq.heappush(heap, (gv + hv, counter, v))
+                    counter += 1
+
+        if best_goal < 0:
+            return None
+        nodes, edges = [best_goal], []
+        prev, edge = parent[best_goal]
+        while prev >= 0:
+            nodes.append(prev)
+            edges.append(edge)
+            prev, edge = parent[prev]
+        nodes.reverse()
+        edges.reverse()
+        return CSRPath(cost=float(best_cost), nodes=nodes, edges=edges, expanded=expanded)
+
+
+def path_edges(arrays: GraphArrays, nodes: List[int]) -> np.ndarray:
+    """Aristas (CSR) que usa el entorno para recorrer ``nodes`` (primera paralela)."""
+    edges = np.empty(max(0, len(nodes) - 1), dtype=np.int64)
+    for i, (u, v) in enumerate(zip(nodes[:-1], nodes[1:])):
+        row = arrays.neighbor_table[u, : arrays.n_neighbors[u]]
+        pos = np.flatnonzero(row == v)
+        if pos.size == 0:
+            raise ValueError(f"No hay arista entre {arrays.nodes[u]} y {arrays.nodes[v]}")
+        edges[i] = arrays.neighbor_edge[u, pos[0]]
+    return edges
@@ -0,0 +1,62 @@
+"""Caché LRU acotada de longitudes de camino más corto.
+
+Las claves son pares de índices de nodo empaquetados en un único entero
+(``a * n_nodes + b``). Al llenarse se descarta sólo la entrada menos usada
+recientemente, en lugar de vaciar todo. Lleva contadores de aciertos,
+fallos y desalojos para registrarlos (p. ej. en TensorBoard).
+"""
+
+from collections import OrderedDict
+from typing import Callable, Dict
+
+# capacidad por defecto (mismo tope que la caché anterior del wrapper)
+DEFAULT_CAPACITY = 20000
+
+
+class ShortestPathCache:
+    """Caché LRU ``(índice a, índice b) -> distancia`` compartible entre entornos."""
+
+    def __init__(self, n_nodes: int, capacity: int = DEFAULT_CAPACITY) -> None:
+        self.n_nodes = int(n_nodes)
+        self.capacity = max(1, int(capacity))
+        self._data: "OrderedDict[int, float]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_or_compute(self, a: int, b: int, compute: Callable[[], float]) -> float:
+        """Distancia cacheada de ``a`` a ``b`` (índices); ``compute()`` si falta."""
+        key = a * self.n_nodes + b
+        value = self._data.get(key)
+        if value is not None:
+            self.hits += 1
+            self._data.move_to_end(key)
+            return value
+        self.misses += 1
+        value = float(compute())
+        self._data[key] = value
+        if len(self._data) > self.capacity:
+            self._data.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._data),
+            "capacity": self.capacity,
+            "hit_rate": self.hit_rate,
+        }
+
+    def clear(self) -> None:
+        self._data.clear()
@@ -0,0 +1,175 @@
+"""Índices espaciales para ubicar coordenadas (lon, lat) sobre el grafo.
+
+Las coordenadas se proyectan a metros con una equirectangular centrada en
+la latitud media del grafo; a escala de ciudad el error es despreciable
+y las distancias euclídeas del árbol ordenan igual que las reales. La
+distancia devuelta se recalcula con haversine sobre el punto elegido.
+
+- ``NodeSnapper``: nodo más cercano (cKDTree).
+- ``EdgeSnapper``: punto más cercano sobre una arista (STRtree de shapely).
+"""
+
+from typing import NamedTuple, Tuple
+
+import numpy as np
+import shapely
+from scipy.spatial import cKDTree
+
+from src.utils.graph_arrays import EARTH_RADIUS_M, GraphArrays, haversine_m
+
+
+class LocalProjection:
+    """Proyección equirectangular (lon, lat) en grados -> (x, y) en metros."""
+
+    def __init__(self, lat0: float) -> None:
+        self.lat0 = float(lat0)
+        self._kx = EARTH_RADIUS_M * np.cos(np.radians(self.lat0))
+
+    @classmethod
+    def for_arrays(cls, arrays: GraphArrays) -> "LocalProjection":
+        return cls(float(np.mean(arrays.y)) if arrays.n_nodes else 0.0)
+
+    def project(self, lon, lat) -> np.ndarray:
+        """Array (..., 2) en metros."""
+        lon = np.radians(np.asarray(lon, dtype=np.float64))
+        lat = np.radians(np.asarray(lat, dtype=np.float64))
+        return np.stack([lon * self._kx, lat * EARTH_RADIUS_M], axis=-1)
+
+    def unproject(self, xy) -> np.ndarray:
+        """Inversa de ``project``: array (..., 2) de [lon, lat] en grados."""
+        xy = np.asarray(xy, dtype=np.float64)
+        return np.degrees(np.stack([xy[..., 0] / self._kx, xy[..., 1] / EARTH_RADIUS_M], axis=-1))
+
+
+def as_coords(coords) -> np.ndarray:
+    """[[lon, lat], ...] (o un solo par) como array M x 2 de float64."""
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    if not np.isfinite(coords).all():
+        raise ValueError("Coordenadas no finitas")
+    return coords
+
+
+class NodeSnapper:
+    """Nodo más cercano a cada coordenada con un cKDTree sobre metros proyectados.
+
+    Se construye una vez por grafo (ver ``GraphContext.node_snapper``); cada
+    consulta es O(M log N) para M puntos en una sola llamada vectorizada.
+    """
+
+    def __init__(self, arrays: GraphArrays) -> None:
+        if arrays.n_nodes == 0:
+            raise ValueError("Grafo sin nodos")
+        self.arrays = arrays
+        self.projection = LocalProjection.for_arrays(arrays)
+        self._tree = cKDTree(self.projection.project(arrays.x, arrays.y))
+
+    def snap_indices(self, coords) -> Tuple[np.ndarray, np.ndarray]:
+        """(índices de nodo, distancia en metros) para cada [lon, lat]."""
+        coords = as_coords(coords)
+        _, idx = self._tree.query(self.projection.project(coords[:, 0], coords[:, 1]))
+        idx = np.asarray(idx, dtype=np.int64)
+        dist_m = haversine_m(coords[:, 0], coords[:, 1], self.arrays.x[idx], self.arrays.y[idx])
+        return idx, dist_m
+
+    def snap(self, coords) -> Tuple[list, np.ndarray]:
+        """(ids de nodo, distancia en metros) para cada [lon, lat]."""
+        idx, dist_m = self.snap_indices(coords)
+        nodes = self.arrays.nodes
+        return [nodes[i] for i in idx], dist_m
+
+
+class EdgeSnap(NamedTuple):
+    """Proyección de M coordenadas sobre sus aristas más cercanas (arrays de largo M).
+
+    - ``edge``: índice de arista en el CSR (u -> v).
+    - ``fraction``: posición sobre la arista, 0 en u y 1 en v.
+    - ``reverse_edge``: arista v -> u sobre la misma línea, o -1 si es de un solo sentido.
+    - ``lon`` / ``lat``: punto proyectado; ``dist_m``: distancia hasta él.
+    """
+
+    edge: np.ndarray
+    fraction: np.ndarray
+    reverse_edge: np.ndarray
+    lon: np.ndarray
+    lat: np.ndarray
+    dist_m: np.ndarray
+
+
+class EdgeSnapper:
+    """Punto más cercano sobre la red con un STRtree de aristas en metros proyectados.
+
+    Usa la geometría de OSM de cada arista si el grafo la trae (``geometry``)
+    y si no el segmento recto entre sus nodos. Se construye una vez por
+    grafo (ver ``GraphContext.edge_snapper``); una consulta de M puntos es
+    una sola llamada vectorizada a shapely.
+    """
+
+    def __init__(self, arrays: GraphArrays) -> None:
+        if arrays.n_edges == 0:
+            raise ValueError("Grafo sin aristas")
+        self.arrays = arrays
+        self.projection = LocalProjection.for_arrays(arrays)
+        self.tails = np.repeat(np.arange(arrays.n_nodes, dtype=np.int64), np.diff(arrays.indptr))
+        self.heads = np.asarray(arrays.indices, dtype=np.int64)
+
+        xy = self.projection.project(arrays.x, arrays.y)
+        lines = shapely.linestrings(np.stack([xy[self.tails], xy[self.heads]], axis=1))
+        for e, attrs in enumerate(arrays._edge_attrs or ()):
+            geometry = attrs.get("geometry")
+            if geometry is not None and hasattr(geometry, "coords"):
+                coords = np.asarray(geometry.coords, dtype=np.float64)
+                lines[e] = shapely.linestrings(self.projection.project(coords[:, 0], coords[:, 1]))
+        self._lines = lines
+        self._tree = shapely.STRtree(lines)
+        self.coincident, self.reverse_edge = self._match_edges()
+
+    def _match_edges(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(primera paralela u -> v con la misma geometría, arista v -> u sobre la misma línea o -1).
+
+        Sólo se emparejan aristas cuyas líneas coinciden: en OSM dos aristas
+        entre los mismos nodos pueden ser calles distintas (p. ej. una curva).
+        """
+        tails, heads = self.tails.tolist(), self.heads.tolist()
+        by_ends = {}
+        for e, key in enumerate(zip(tails, heads)):
+            by_ends.setdefault(key, []).append(e)
+
+        # pares candidatos (arista, paralela anterior) y (arista, arista opuesta)
+        same, opposite = [], []
+        for e, (u, v) in enumerate(zip(tails, heads)):
+            same.extend((e, r) for r in by_ends[(u, v)] if r < e)
+            opposite.extend((e, r) for r in by_ends.get((v, u), ()) if r != e)
+
+        def equal_pairs(pairs):
+            pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+            return pairs[shapely.equals(self._lines[pairs[:, 0]], self._lines[pairs[:, 1]])]
+
+        n_edges = len(tails)
+        coincident = np.arange(n_edges, dtype=np.int64)
+        reverse = np.full(n_edges, -1, dtype=np.int64)
+        # pares en orden creciente de r: queda la primera coincidencia
+        for e, r in equal_pairs(same)[::-1].tolist():
+            coincident[e] = r
+        for e, r in equal_pairs(opposite)[::-1].tolist():
+            reverse[e] = r
+        return coincident, reverse
+
+    def snap(self, coords) -> EdgeSnap:
+        """Arista más cercana, posición sobre ella y punto proyectado para cada [lon, lat]."""
+        coords = as_coords(coords)
+        points = shapely.points(self.projection.project(coords[:, 0], coords[:, 1]))
+        edge = np.asarray(self._tree.query_nearest(points, all_matches=False)[1], dtype=np.int64)
+        lines = self._lines[edge]
+        fraction = np.nan_to_num(shapely.line_locate_point(lines, points, normalized=True))
+        snapped = self.projection.unproject(
+            shapely.get_coordinates(shapely.line_interpolate_point(lines, fraction, normalized=True))
+        )
+        lon, lat = snapped[:, 0], snapped[:, 1]
+        return EdgeSnap(
+            edge=edge,
+            fraction=fraction,
+            reverse_edge=self.reverse_edge[edge],
+            lon=lon,
+            lat=lat,
+            dist_m=haversine_m(coords[:, 0], coords[:, 1], lon, lat),
+        )
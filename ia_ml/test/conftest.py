@@ -5,4 +5,27 @@ import osmnx as ox
 def city_graph():
     """Descarga y devuelve el grafo de una ciudad"""
     graph = ox.graph_from_place("Río Cuarto, Córdoba, Argentina", network_type="drive")
-    return graph
\ No newline at end of file
+    return graph
+
+@pytest.fixture
+def small_graph():
+    """Grafo sintético pequeño (grilla 4x4, nodos 0..15) sin depender de la red"""
+    import networkx as nx
+
+    graph = nx.MultiDiGraph()
+    side = 4
+    for i in range(side):
+        for j in range(side):
+            graph.add_node(i * side + j, x=-64.35 + 0.001 * j, y=-33.12 + 0.001 * i)
+    for i in range(side):
+        for j in range(side):
+            u = i * side + j
+            if j + 1 < side:
+                graph.add_edge(u, u + 1, length=100.0, travel_time=10.0, highway="residential")
+                graph.add_edge(u + 1, u, length=100.0, travel_time=10.0, highway="residential")
+            if i + 1 < side:
+                graph.add_edge(u, u + side, length=120.0, travel_time=8.0, highway="primary", maxspeed="60")
+                graph.add_edge(u + side, u, length=120.0, travel_time=8.0, highway="primary", maxspeed="60")
+    # arista paralela más lenta: la primera clave sigue siendo la del costo de movimiento
+    graph.add_edge(0, 1, length=90.0, travel_time=30.0, highway="service")
+    return graph
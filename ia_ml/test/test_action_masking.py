@@ -0,0 +1,31 @@
+import numpy as np
+
+from src.envs import create_masked_waypoint_env
+
+
+def test_action_masks_follow_the_current_state(small_graph):
+    env = create_masked_waypoint_env(small_graph, [5, 10], 0, 15, {"max_steps": 50}, {})
+    _, info = env.reset()
+    for _ in range(6):
+        masks = env.action_masks()
+        assert np.array_equal(masks, info["action_mask"])
+        action = int(np.flatnonzero(masks)[0])
+        expected = env.env._neighbors(env.current_node)[action]
+        _, _, done, truncated, info = env.step(action)
+        # una acción válida nunca se reemplaza
+        assert env.current_node == expected
+        if done or truncated:
+            break
+
+
+def test_load_trained_model_detects_the_saved_class(small_graph, tmp_path):
+    from sb3_contrib import MaskablePPO
+    from stable_baselines3 import PPO
+
+    from src.training.main import load_trained_model
+
+    env = create_masked_waypoint_env(small_graph, [5], 0, 15, {"max_steps": 20}, {})
+    for algorithm in (PPO, MaskablePPO):
+        path = tmp_path / f"{algorithm.__name__}.zip"
+        algorithm("MlpPolicy", env, n_steps=16, batch_size=16).save(path)
+        assert type(load_trained_model(str(path))) is algorithm
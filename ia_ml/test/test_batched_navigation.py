@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from src.envs import BatchedWaypointNavigationEnv, GraphContext, create_masked_waypoint_env
+
+
+@pytest.mark.parametrize("algorithm", ["astar", "dijkstra"])
+def test_batched_env_matches_masked_env(small_graph, algorithm):
+    env_cfg = {"max_steps": 12, "shortest_path_algorithm": algorithm}
+    context = GraphContext(small_graph)
+    single = create_masked_waypoint_env(small_graph, [5, 10], 0, 15, env_cfg, {}, context=context)
+    batched = BatchedWaypointNavigationEnv(context, 0, [5, 10], 15, 3, env_cfg, {})
+
+    obs, _ = single.reset()
+    batched_obs = batched.reset()
+    assert np.array_equal(batched_obs[0], obs)
+    for _ in range(30):
+        single._update_action_mask_with_cycles()
+        masks = batched.action_masks()
+        assert np.array_equal(masks[0], single.action_mask)
+        # acción válida elegida de forma determinista: sin reemplazo aleatorio
+        action = int(np.flatnonzero(masks[0])[-1])
+        obs, reward, done, truncated, info = single.step(action)
+        batched_obs, rewards, dones, infos = batched.step(np.full(3, action))
+        assert rewards[0] == pytest.approx(reward, rel=1e-6)
+        assert dones[0] == (done or truncated)
+        if dones[0]:
+            assert np.array_equal(infos[0]["terminal_observation"], obs)
+            assert infos[0]["path"] == info["path"]
+            assert infos[0]["terminated_reason"] == info["terminated_reason"]
+            obs, _ = single.reset()
+        assert np.array_equal(batched_obs[0], obs)
+        # todos los episodios recibieron la misma acción
+        assert np.array_equal(batched_obs[1], batched_obs[0])
+
+
+def test_batched_env_replaces_invalid_actions(small_graph):
+    batched = BatchedWaypointNavigationEnv(GraphContext(small_graph), 0, [5], 15, 8, {"max_steps": 20}, {})
+    batched.seed(0)
+    batched.reset()
+    masks = batched.action_masks()
+    invalid = np.array([np.flatnonzero(~row)[0] if (~row).any() else batched.max_actions for row in masks])
+    batched.step(invalid)
+    assert np.isin(batched.get_attr("current_node"), list(small_graph.neighbors(0))).all()
+
+
+def test_batched_env_retargets_with_set_options(small_graph):
+    context = GraphContext(small_graph)
+    batched = BatchedWaypointNavigationEnv(context, 0, [5], 15, 2, {"max_steps": 20}, {})
+    batched.reset()
+    batched.set_options({"start": 3, "waypoints": [10, 6], "destination": 12})
+    obs = batched.reset()
+    fresh = BatchedWaypointNavigationEnv(context, 3, [10, 6], 12, 2, {"max_steps": 20}, {})
+    assert np.array_equal(obs, fresh.reset())
+    assert np.array_equal(batched.action_masks(), fresh.action_masks())
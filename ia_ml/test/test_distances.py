@@ -0,0 +1,70 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from src.utils.distances import (
+    compute_distance_matrix,
+    distances_dict_to_matrix,
+    load_distance_matrix,
+    max_finite_distance,
+    save_distance_matrix,
+)
+
+
+def test_matrix_matches_all_pairs_dijkstra(small_graph):
+    matrix = compute_distance_matrix(small_graph, weight="length")
+    expected = dict(nx.all_pairs_dijkstra_path_length(small_graph, weight="length"))
+    assert matrix.dtype == np.float32
+    assert np.array_equal(matrix, distances_dict_to_matrix(expected, list(small_graph.nodes())))
+
+
+def test_saved_matrix_opens_as_memmap(small_graph, tmp_path):
+    path = tmp_path / "g_distances.npy"
+    matrix = compute_distance_matrix(small_graph)
+    save_distance_matrix(matrix, str(path), nodes=list(small_graph.nodes()))
+    loaded = load_distance_matrix(str(path), list(small_graph.nodes()))
+    assert isinstance(loaded, np.memmap)
+    assert np.array_equal(loaded, matrix)
+    with pytest.raises(ValueError):
+        load_distance_matrix(str(path), list(reversed(list(small_graph.nodes()))))
+
+
+def test_parallel_chunks_match_single_process(small_graph):
+    serial = compute_distance_matrix(small_graph, weight="travel_time")
+    parallel = compute_distance_matrix(small_graph, weight="travel_time", workers=2, chunk_size=3)
+    assert np.array_equal(serial, parallel)
+
+
+def test_interrupted_precompute_resumes_pending_blocks(small_graph, tmp_path):
+    import json
+
+    from src.utils.distances import compute_distance_matrix_to_file, distance_matrix_manifest_path
+
+    path = str(tmp_path / "g_distances.npy")
+    expected = compute_distance_matrix(small_graph)
+    compute_distance_matrix_to_file(small_graph, path, chunk_size=4)
+
+    # simular una corrida cortada: sólo el primer bloque quedó registrado
+    manifest_path = distance_matrix_manifest_path(path)
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    manifest["completed"], manifest["complete"] = [0], False
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    partial = np.load(path, mmap_mode="r+")
+    partial[4:] = -1.0
+    partial.flush()
+    del partial
+    with pytest.raises(ValueError):
+        load_distance_matrix(path)
+
+    resumed = compute_distance_matrix_to_file(small_graph, path, chunk_size=4)
+    assert np.array_equal(resumed, expected)
+
+
+def test_max_finite_distance_ignores_unreachable(tmp_path):
+    matrix = np.array([[0.0, 3.0, np.inf], [np.inf, 0.0, 7.5], [1.0, np.inf, 0.0]], dtype=np.float32)
+    path = str(tmp_path / "d.npy")
+    save_distance_matrix(matrix, path)
+    assert max_finite_distance(np.load(path, mmap_mode="r"), block_rows=2) == 7.5
+    assert max_finite_distance(np.full((2, 2), np.inf, dtype=np.float32)) == 0.0
@@ -0,0 +1,42 @@
+import networkx as nx
+import numpy as np
+
+from src.utils.edge_features import EdgeFeatureTable
+from src.utils.graph_arrays import GraphArrays
+
+
+def test_columns_follow_csr_order(small_graph):
+    arrays = GraphArrays(small_graph)
+    edges = arrays.edge_features
+    expected = [attrs["length"] for _, _, attrs in small_graph.edges(data=True)]
+    assert edges.n_edges == arrays.n_edges
+    assert np.array_equal(edges.length, expected)
+    # aristas verticales primary con maxspeed "60"
+    assert np.nanmax(edges.maxspeed) == 60.0
+    assert set(np.unique(edges.maxspeed_norm)) <= {0.0, 1.0}
+
+
+def test_parsing_and_travel_time_priority():
+    edges = EdgeFeatureTable([
+        {"length": 100.0, "travel_time": 7.0, "maxspeed": "40 km/h"},
+        {"length": 100.0, "speed_kph": 36.0, "lanes": ["2", "3"], "highway": ["primary", "secondary"]},
+        {"length": 100.0, "maxspeed": "36", "oneway": "yes", "surface": "gravel"},
+        {"length": 100.0, "lanes": "x", "oneway": True},
+        {"highway": "residential"},
+    ])
+    assert np.allclose(edges.travel_time, [7.0, 10.0, 10.0, 100.0 / (50.0 / 3.6), 0.0])
+    assert np.array_equal(edges.maxspeed_norm, [1.0, 0.0, 36.0 / 40.0, 0.0, 0.0])
+    assert np.array_equal(edges.lanes_norm, [0.0, 1.0, 0.0, 0.0, 0.0])
+    assert np.array_equal(edges.highway_code, [0.0, 4 / 6, 0.0, 0.0, 1 / 6])
+    assert np.array_equal(edges.oneway_flag, [0.0, 0.0, 1.0, 1.0, 0.0])
+    assert edges.surface_score[2] == 0.6 and edges.surface_score[0] == 0.5
+
+
+def test_cost_fallbacks():
+    graph = nx.MultiDiGraph()
+    graph.add_edge(0, 1, length=10.0, travel_time=2.0)
+    graph.add_edge(1, 2, length=20.0)
+    graph.add_edge(2, 0)
+    arrays = GraphArrays(graph)
+    assert np.array_equal(arrays.edge_cost("travel_time"), [2.0, 20.0, 1.0])
+    assert np.array_equal(arrays.edge_cost("length"), [10.0, 20.0, 1.0])
@@ -0,0 +1,42 @@
+import networkx as nx
+import numpy as np
+
+from src.utils.embeddings import (
+    EMBEDDING_DIM,
+    _k_hop_counts,
+    build_node_embedding_matrix,
+    build_node_embeddings,
+)
+from src.utils.graph_arrays import GraphArrays
+
+
+def test_matrix_rows_follow_node_order(small_graph):
+    matrix = build_node_embedding_matrix(small_graph)
+    by_node = build_node_embeddings(small_graph)
+    assert matrix.shape == (small_graph.number_of_nodes(), EMBEDDING_DIM)
+    assert matrix.dtype == np.float32
+    for idx, node in enumerate(small_graph.nodes()):
+        assert np.array_equal(by_node[str(node)], matrix[idx])
+
+
+def test_degree_features(small_graph):
+    matrix = build_node_embedding_matrix(small_graph)
+    degrees = dict(small_graph.degree())
+    max_degree = max(degrees.values())
+    for idx, node in enumerate(small_graph.nodes()):
+        neighbors = list(small_graph.neighbors(node))
+        nb_degs = [degrees[n] for n in neighbors]
+        assert matrix[idx, 2] == np.float32(degrees[node] / max_degree)
+        assert matrix[idx, 4] == np.float32(small_graph.out_degree(node) / max_degree)
+        assert matrix[idx, 5] == np.float32(len(neighbors) / max_degree)
+        assert matrix[idx, 6] == np.float32(np.mean(nb_degs) / max_degree)
+        assert matrix[idx, 9] == np.float32(np.std(nb_degs) / max_degree)
+
+
+def test_k_hop_counts_match_bfs(small_graph):
+    arrays = GraphArrays(small_graph)
+    for radius in (1, 2, 4):
+        counts = _k_hop_counts(arrays, radius, block_size=5)
+        for idx, node in enumerate(arrays.nodes):
+            reachable = nx.single_source_shortest_path_length(small_graph, node, cutoff=radius)
+            assert counts[idx] == len(reachable) - 1
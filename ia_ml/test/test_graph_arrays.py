@@ -0,0 +1,36 @@
+import numpy as np
+
+from src.utils.graph_arrays import GraphArrays, coordinate_diameter
+
+
+def test_csr_matches_networkx(small_graph):
+    arrays = GraphArrays(small_graph)
+    assert arrays.n_nodes == small_graph.number_of_nodes()
+    assert arrays.n_edges == small_graph.number_of_edges()
+    assert arrays.max_actions == max(d for _, d in small_graph.degree())
+    for node in small_graph.nodes:
+        idx = arrays.node_index[node]
+        expected = [arrays.node_index[n] for n in small_graph.neighbors(node)]
+        assert arrays.neighbors(idx).tolist() == expected
+        assert (arrays.neighbor_table[idx, len(expected):] == -1).all()
+
+
+def test_edge_cost_uses_first_parallel_edge(small_graph):
+    arrays = GraphArrays(small_graph)
+    cost = arrays.edge_cost("travel_time")
+    slot = arrays.neighbors(0).tolist().index(1)
+    assert cost[arrays.neighbor_edge[0, slot]] == 10.0
+    assert arrays.indptr[1] - arrays.indptr[0] == 3
+
+
+def test_coordinate_diameter_matches_pairwise():
+    rng = np.random.default_rng(0)
+    x, y = rng.normal(size=300), rng.normal(size=300)
+    expected = max(
+        ((x[i] - x[j]) ** 2 + (y[i] - y[j]) ** 2) ** 0.5
+        for i in range(len(x)) for j in range(i + 1, len(x))
+    )
+    assert coordinate_diameter(x, y) == expected
+    # colineales y repetidos
+    assert coordinate_diameter(np.array([0.0, 1.0, 2.0, 2.0]), np.array([0.0, 1.0, 2.0, 2.0])) == 8 ** 0.5
+    assert coordinate_diameter(np.array([1.0]), np.array([1.0])) == 0.0
@@ -0,0 +1,65 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from src.envs import GraphContext, WaypointNavigationEnv, create_masked_waypoint_env
+
+
+def _make_env(graph, context=None):
+    return create_masked_waypoint_env(graph, [5, 10], 0, 15, {"max_steps": 50}, {}, context=context)
+
+
+def test_envs_share_context(small_graph):
+    context = GraphContext(small_graph)
+    first, second = _make_env(small_graph, context), _make_env(small_graph, context)
+    assert first.env.embedding_matrix is second.env.embedding_matrix
+    assert first.env.arrays is context.arrays
+    assert first.env.max_distance == context.max_distance
+    assert first.env.max_actions == context.max_degree
+
+    shared, own = first.env, _make_env(small_graph).env
+    assert np.array_equal(shared.reset()[0], own.reset()[0])
+    for action in (0, 1, 0, 2):
+        assert np.array_equal(shared.step(action)[0], own.step(action)[0])
+
+
+def test_context_is_read_only(small_graph):
+    context = GraphContext(small_graph)
+    with pytest.raises(AttributeError):
+        context.max_distance = 1.0
+    with pytest.raises(ValueError):
+        context.embedding_matrix[0, 0] = 1.0
+    with pytest.raises(ValueError):
+        context.arrays.neighbor_table[0, 0] = 3
+
+
+def test_context_must_match_graph(small_graph):
+    context = GraphContext(nx.MultiDiGraph(small_graph))
+    with pytest.raises(ValueError):
+        WaypointNavigationEnv(small_graph, 0, [5], 15, {}, {}, context=context)
+
+
+def test_shared_context_attaches_without_graph(small_graph):
+    import pickle
+
+    from src.envs import SharedGraphContext
+
+    context = GraphContext(small_graph)
+    with SharedGraphContext(context) as shared:
+        attached = pickle.loads(pickle.dumps(shared.handle)).attach()
+        assert attached.graph is None
+        assert not attached.embedding_matrix.flags.owndata
+        assert np.array_equal(attached.embedding_matrix, context.embedding_matrix)
+        assert attached.max_distance == context.max_distance
+
+        for algorithm in ("astar", "dijkstra"):
+            env_cfg = {"max_steps": 50, "shortest_path_algorithm": algorithm}
+            local = WaypointNavigationEnv(small_graph, 0, [5, 10], 15, env_cfg, {}, context=context)
+            worker = WaypointNavigationEnv(None, 0, [5, 10], 15, env_cfg, {}, context=attached)
+            assert np.array_equal(local.reset()[0], worker.reset()[0])
+            for action in (0, 1, 0, 2, 1):
+                local_step, worker_step = local.step(action), worker.step(action)
+                assert np.array_equal(local_step[0], worker_step[0])
+                assert local_step[1] == worker_step[1]
+            # consulta fuera de los objetivos del episodio (Dijkstra inverso puntual)
+            assert worker._sp_length(3, 12) == local._sp_length(3, 12)
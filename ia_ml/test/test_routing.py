@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+from scipy.sparse.csgraph import dijkstra
+
+from src.envs import GraphContext
+from src.utils.graph_arrays import haversine_m
+
+
+@pytest.mark.parametrize("weight", ["length", "travel_time"])
+def test_astar_matches_dijkstra_with_admissible_heuristic(small_graph, weight):
+    context = GraphContext(small_graph)
+    arrays, router = context.arrays, context.router(weight)
+    # distancias exactas de todos los nodos hacia cada objetivo
+    exact = dijkstra(context.reverse_csgraph(weight), directed=True)
+
+    for t in range(arrays.n_nodes):
+        straight = haversine_m(arrays.x, arrays.y, arrays.x[t], arrays.y[t])
+        assert np.all(router.scale * straight <= exact[t] + 1e-9)
+        for s in range(arrays.n_nodes):
+            path = router.search({s: 0.0}, {t: 0.0})
+            assert path.cost == pytest.approx(exact[t, s])
+            # una sola búsqueda: aristas encadenadas y costo = suma de sus pesos
+            assert path.nodes[0] == s and path.nodes[-1] == t
+            assert [int(arrays.indices[e]) for e in path.edges] == path.nodes[1:]
+            assert router.weights[path.edges].sum() == pytest.approx(path.cost)
+
+
+def test_search_with_source_and_target_offsets(small_graph):
+    router = GraphContext(small_graph).router("travel_time")
+    path = router.search({0: 5.0, 1: 0.0}, {3: 0.0, 2: 100.0})
+    assert path.nodes == [1, 2, 3]
+    assert path.cost == pytest.approx(20.0)
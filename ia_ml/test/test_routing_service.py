@@ -0,0 +1,105 @@
+import networkx as nx
+import pytest
+
+from src.api.routing_service import OffNetworkError, RoutingService
+from src.envs import create_masked_waypoint_env
+
+
+def make_service(graph, model_path=None):
+    mapping = {n: n for n in graph.nodes}
+    return RoutingService(graph, mapping, mapping, model_path=model_path, environment_cfg={"max_steps": 30}, rewards_cfg={})
+
+
+def coord(graph, node):
+    return [graph.nodes[node]["x"], graph.nodes[node]["y"]]
+
+
+def test_astar_route_visits_waypoints_in_order(small_graph):
+    service = make_service(small_graph)
+    route = service.route_astar(coord(small_graph, 0), [coord(small_graph, 12)], coord(small_graph, 3))
+    expected = nx.shortest_path_length(small_graph, 0, 12, weight="travel_time")
+    expected += nx.shortest_path_length(small_graph, 12, 3, weight="travel_time")
+    assert route["duration"] == pytest.approx(expected)
+    # suma real de length: 3 tramos verticales y luego 3 horizontales + 3 verticales
+    assert route["distance"] == pytest.approx(3 * 120.0 + 3 * 100.0 + 3 * 120.0)
+    coordinates = route["coordinates"]
+    assert coordinates[0] == coord(small_graph, 0) and coordinates[-1] == coord(small_graph, 3)
+    assert coord(small_graph, 12) in coordinates
+
+
+def test_route_starts_from_the_projection_on_the_street(small_graph):
+    service = make_service(small_graph)
+    # 25 % del tramo 0 -> 1, 10 m al sur de la calle
+    start = [coord(small_graph, 0)[0] + 0.00025, coord(small_graph, 0)[1] - 0.00009]
+    route = service.route_astar(start, [], coord(small_graph, 3))
+    # 0.75 del tramo hasta 1 (la paralela lenta no cuenta) y luego 1 -> 2 -> 3
+    assert route["duration"] == pytest.approx(0.75 * 10.0 + 20.0)
+    assert route["distance"] == pytest.approx(0.75 * 100.0 + 200.0)
+    assert route["coordinates"][0] == pytest.approx([start[0], coord(small_graph, 0)[1]])
+    assert route["coordinates"][1] == coord(small_graph, 1)
+
+    # en sentido contrario se sale por 0 pagando el 25 % recorrido
+    route = service.route_astar(start, [], coord(small_graph, 12))
+    assert route["duration"] == pytest.approx(0.25 * 10.0 + 3 * 8.0)
+    assert route["distance"] == pytest.approx(0.25 * 100.0 + 3 * 120.0)
+
+    # sobre la misma calle y más adelante: directo, sin pasar por nodos
+    ahead = [start[0] + 0.0005, start[1]]
+    route = service.route_astar(start, [], ahead)
+    assert (route["duration"], route["distance"]) == pytest.approx((0.5 * 10.0, 0.5 * 100.0))
+
+
+def test_policy_is_loaded_once_and_reused(small_graph, tmp_path):
+    from sb3_contrib import MaskablePPO
+
+    service = make_service(small_graph)
+    path = tmp_path / "model.zip"
+    env = create_masked_waypoint_env(small_graph, [], 0, 0, {"max_steps": 30}, {}, context=service.context)
+    MaskablePPO("MlpPolicy", env, n_steps=16, batch_size=16).save(path)
+
+    service = make_service(small_graph, model_path=str(path))
+    model, inference_env = service.model, service.env
+    service.warm_up()
+    for target in (15, 5):
+        route = service.route(coord(small_graph, 0), [], coord(small_graph, target))
+        assert route is not None
+        assert route["coordinates"][-1] == coord(small_graph, target)
+    assert service.model is model and service.env is inference_env
+
+
+def test_off_network_points_are_rejected(small_graph):
+    service = make_service(small_graph)
+    far = [coord(small_graph, 15)[0] + 0.05, coord(small_graph, 15)[1]]
+    with pytest.raises(OffNetworkError):
+        service.route_astar(coord(small_graph, 0), [], far)
+
+
+def test_unloadable_model_falls_back_to_astar(small_graph, tmp_path):
+    path = tmp_path / "model.zip"
+    path.write_bytes(b"no es un zip")
+    service = make_service(small_graph, model_path=str(path))
+    assert not service.has_model
+    route = service.route(coord(small_graph, 0), [], coord(small_graph, 3))
+    assert route["coordinates"][-1] == coord(small_graph, 3)
+
+
+def test_partial_cost_is_charged_on_the_snapped_street(small_graph):
+    from shapely.geometry import LineString
+
+    # paralela 0 -> 1 que es otra calle: una curva de un solo sentido hacia el sur
+    (x0, y0), (x1, _) = coord(small_graph, 0), coord(small_graph, 1)
+    apex = [(x0 + x1) / 2, y0 - 0.004]
+    curve = LineString([(x0, y0), tuple(apex), (x1, y0)])
+    small_graph.add_edge(0, 1, length=870.0, travel_time=60.0, highway="service", geometry=curve)
+    service = make_service(small_graph)
+
+    route = service.route_astar(apex, [], coord(small_graph, 1))
+    assert (route["duration"], route["distance"]) == pytest.approx((30.0, 435.0))
+    # sin sentido contrario: hacia 0 hay que seguir hasta 1 y volver
+    route = service.route_astar(apex, [], coord(small_graph, 0))
+    assert (route["duration"], route["distance"]) == pytest.approx((30.0 + 10.0, 435.0 + 100.0))
+
+    # las paralelas rectas siguen colapsadas sobre la más barata
+    start = [x0 + 0.00025, y0]
+    route = service.route_astar(start, [], coord(small_graph, 1))
+    assert (route["duration"], route["distance"]) == pytest.approx((0.75 * 10.0, 0.75 * 100.0))
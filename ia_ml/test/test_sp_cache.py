@@ -0,0 +1,30 @@
+from src.envs import GraphContext, create_masked_waypoint_env
+from src.utils.sp_cache import ShortestPathCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ShortestPathCache(n_nodes=10, capacity=2)
+    cache.get_or_compute(0, 1, lambda: 1.0)
+    cache.get_or_compute(0, 2, lambda: 2.0)
+    assert cache.get_or_compute(0, 1, lambda: -1.0) == 1.0  # (0, 1) pasa a ser la más reciente
+    cache.get_or_compute(0, 3, lambda: 3.0)  # desaloja (0, 2)
+    assert cache.get_or_compute(0, 2, lambda: 4.0) == 4.0
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 4, 2)
+    assert len(cache) == 2
+
+
+def test_wrappers_share_context_cache(small_graph):
+    context = GraphContext(small_graph)
+    train = create_masked_waypoint_env(small_graph, [5], 0, 15, {}, {}, context=context)
+    evaluation = create_masked_waypoint_env(small_graph, [5], 0, 15, {}, {}, context=context)
+    assert train.sp_cache is evaluation.sp_cache
+
+    # 12 no es objetivo del episodio: la búsqueda pasa por la caché compartida
+    assert train.env._sp_length(3, 12) == evaluation.env._sp_length(3, 12)
+    _, stats = evaluation.sp_cache_stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+    # los objetivos del episodio se leen de sus vectores sin tocar la caché
+    train.reset()
+    train.env._sp_length(3, 15)
+    assert train.sp_cache.stats()["misses"] == 1
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from src.envs import GraphContext
+from src.utils.graph_arrays import haversine_m
+
+
+def test_snap_matches_brute_force_haversine(small_graph):
+    context = GraphContext(small_graph)
+    arrays = context.arrays
+    rng = np.random.default_rng(0)
+    coords = np.column_stack([
+        rng.uniform(arrays.x.min() - 0.002, arrays.x.max() + 0.002, 200),
+        rng.uniform(arrays.y.min() - 0.002, arrays.y.max() + 0.002, 200),
+    ])
+    nodes, dist_m = context.node_snapper().snap(coords)
+
+    brute = haversine_m(coords[:, None, 0], coords[:, None, 1], arrays.x[None, :], arrays.y[None, :])
+    assert np.allclose(dist_m, brute.min(axis=1))
+    assert nodes == [arrays.nodes[i] for i in brute.argmin(axis=1)]
+    assert context.node_snapper() is context.node_snapper()
+
+
+def test_edge_snap_follows_osm_geometry(small_graph):
+    from shapely.geometry import LineString
+
+    # la calle 0 -> 1 hace una curva hacia el sur en lugar de ir recta
+    x0, y0 = small_graph.nodes[0]["x"], small_graph.nodes[0]["y"]
+    x1 = small_graph.nodes[1]["x"]
+    curve = LineString([(x0, y0), ((x0 + x1) / 2, y0 - 0.0005), (x1, y0)])
+    for data in small_graph.get_edge_data(0, 1).values():
+        data["geometry"] = curve
+    snapper = GraphContext(small_graph).edge_snapper()
+    snap = snapper.snap([[(x0 + x1) / 2, y0 - 0.0006]])
+
+    edge = snap.edge[0]
+    assert {int(snapper.tails[edge]), int(snapper.heads[edge])} == {0, 1}
+    assert snap.dist_m[0] < 15.0
+    assert snap.fraction[0] == pytest.approx(0.5, abs=1e-3)
+    assert snap.lat[0] == pytest.approx(y0 - 0.0005)
+
+
+def test_edges_are_paired_only_when_their_lines_coincide(small_graph):
+    from shapely.geometry import LineString
+
+    x0, y0 = small_graph.nodes[0]["x"], small_graph.nodes[0]["y"]
+    x1 = small_graph.nodes[1]["x"]
+    small_graph.add_edge(0, 1, length=870.0, geometry=LineString([(x0, y0), ((x0 + x1) / 2, y0 - 0.004), (x1, y0)]))
+    snapper = GraphContext(small_graph).edge_snapper()
+    tails, heads = snapper.tails, snapper.heads
+    straight, slow, curved = np.flatnonzero((tails == 0) & (heads == 1))
+    back = int(np.flatnonzero((tails == 1) & (heads == 0))[0])
+
+    assert snapper.coincident[[straight, slow, curved]].tolist() == [straight, straight, curved]
+    assert snapper.reverse_edge[[straight, slow, curved]].tolist() == [back, back, -1]
+    assert snapper.reverse_edge[back] == straight
@@ -0,0 +1,62 @@
+import networkx as nx
+import numpy as np
+
+from src.envs import GraphContext, TaskSampler, TaskSamplingWrapper, create_masked_waypoint_env
+from src.utils.graph_arrays import haversine_m
+
+
+def test_sampled_tasks_are_reachable_and_in_range(small_graph):
+    graph = nx.MultiDiGraph(small_graph)
+    # nodo sin salida: fuera de la componente fuertemente conexa
+    graph.add_node(16, x=-64.35, y=-33.0)
+    graph.add_edge(0, 16, length=10.0, travel_time=1.0)
+    context = GraphContext(graph)
+    sampler = TaskSampler(context, n_waypoints=(1, 2), min_distance_m=150, max_distance_m=600, seed=0)
+    assert 16 not in sampler.candidates
+
+    for _ in range(20):
+        task = sampler.sample()
+        nodes = [task["start"], *task["waypoints"], task["destination"]]
+        assert 1 <= len(task["waypoints"]) <= 2
+        assert len(set(nodes)) == len(nodes)
+        assert 16 not in nodes
+        a, b = graph.nodes[task["start"]], graph.nodes[task["destination"]]
+        assert 150 <= haversine_m(a["x"], a["y"], b["x"], b["y"]) <= 600
+        for u, v in zip(nodes, nodes[1:]):
+            assert nx.has_path(graph, u, v)
+
+
+def test_wrapper_resets_with_seeded_tasks(small_graph):
+    def make():
+        env = create_masked_waypoint_env(small_graph, [5], 0, 15, {"max_steps": 20}, {})
+        return TaskSamplingWrapper(env, TaskSampler(env.unwrapped.context, n_waypoints=(2, 2)))
+
+    first, second = make(), make()
+    obs, _ = first.reset(seed=3)
+    assert np.array_equal(obs, second.reset(seed=3)[0])
+    assert len(first.unwrapped.waypoints) == 2
+    # options explícitas tienen prioridad sobre el muestreo
+    first.reset(options={"start": 0, "waypoints": [5], "destination": 15})
+    assert first.unwrapped.waypoints == [5]
+
+
+def test_rewind_repeats_the_task_sequence(small_graph):
+    sampler = TaskSampler(GraphContext(small_graph), n_waypoints=(1, 2), seed=7)
+    first = [sampler.sample() for _ in range(3)]
+    sampler.rewind()
+    assert [sampler.sample() for _ in range(3)] == first
+
+
+def test_eval_tasks_do_not_replay_training_workers(small_graph):
+    from src.training.main import eval_task_seed
+
+    context = GraphContext(small_graph)
+
+    def first_tasks(seed):
+        sampler = TaskSampler(context, n_waypoints=(1, 2), seed=seed)
+        return [sampler.sample() for _ in range(5)]
+
+    evaluation = first_tasks(eval_task_seed(0))
+    # workers con ppo.seed = 0: semillas 0, 1, ...
+    assert all(evaluation != first_tasks(rank) for rank in range(4))
+    assert evaluation == first_tasks(eval_task_seed(0))
@@ -1,3 +1,4 @@
+import numpy as np
 import pytest
 import sys
 from pathlib import Path
@@ -46,4 +47,77 @@ def test_reward_calculation(city_graph):
     )
     env.reset()
     _, reward, _, _, _ = env.step(0)
-    assert reward != 0  
\ No newline at end of file
+    assert reward != 0
+
+
+def test_target_distance_vectors_match_networkx(small_graph):
+    import networkx as nx
+
+    for algorithm, weight in (("astar", None), ("dijkstra", "travel_time")):
+        env = WaypointNavigationEnv(
+            graph=small_graph,
+            start_node=0,
+            waypoints=[5, 10],
+            destination=15,
+            env_cfg={"shortest_path_algorithm": algorithm},
+            rew_cfg={"weight_name": "travel_time"},
+        )
+        env.reset()
+        for target in (5, 10, 15):
+            for node in small_graph.nodes:
+                expected = nx.shortest_path_length(small_graph, node, target, weight=weight)
+                assert env._sp_length(node, target) == pytest.approx(expected)
+
+
+def test_info_path_only_on_terminal_steps(small_graph):
+    for verbosity in ("terminal", "full"):
+        env = WaypointNavigationEnv(
+            graph=small_graph,
+            start_node=0,
+            waypoints=[5],
+            destination=15,
+            env_cfg={"max_steps": 4, "info_verbosity": verbosity},
+            rew_cfg={},
+        )
+        env.reset()
+        for step in range(4):
+            _, _, done, truncated, info = env.step(0)
+            if done or truncated or verbosity == "full":
+                assert info["path"] == env.path_history
+                assert len(info["path"]) == step + 2
+            else:
+                assert "path" not in info
+        assert done and truncated
+
+
+def test_reset_options_retarget_env(small_graph):
+    env = WaypointNavigationEnv(small_graph, 0, [5, 10], 15, {"max_steps": 50}, {})
+    env.reset()
+    kept = env._target_dist[10]
+
+    obs, info = env.reset(options={"start": 3, "waypoints": [10, 6], "destination": 12})
+    fresh = WaypointNavigationEnv(small_graph, 3, [10, 6], 12, {"max_steps": 50}, {})
+    fresh_obs, fresh_info = fresh.reset()
+    assert np.array_equal(obs, fresh_obs)
+    assert info["remaining_waypoints"] == fresh_info["remaining_waypoints"]
+    # el vector del objetivo que sigue en la tarea no se recalcula
+    assert env._target_dist[10] is kept
+    assert set(env._target_dist) == {10, 6, 12}
+
+    with pytest.raises(ValueError):
+        env.reset(options={"destination": 99})
+
+
+@pytest.mark.parametrize(
+    "algorithm, weight, vertical_cost", [("astar", "weight", 1.0), ("dijkstra", "travel_time", 8.0)]
+)
+def test_heuristic_never_overestimates(small_graph, algorithm, weight, vertical_cost):
+    import networkx as nx
+
+    env = WaypointNavigationEnv(small_graph, 0, [5], 15, {"shortest_path_algorithm": algorithm}, {})
+    for target in small_graph.nodes:
+        exact = nx.shortest_path_length(small_graph, target=target, weight=weight)
+        for node, dist in exact.items():
+            assert env._heuristic(node, target) <= dist + 1e-9
+    # en unidades del peso y ajustada en la arista más rápida (vertical: 1 hop / 8 s)
+    assert env._heuristic(0, 4) == pytest.approx(vertical_cost)